@@ -72,6 +72,75 @@ LOGOUT_REDIRECT_URL = '/login/'
 # Authentication toggles
 ENABLE_WEB_AUTH = True        # Require login for web views (/rules)
 ENABLE_POLICY_AUTH = False     # Require Basic Auth for policy endpoints
+POLICY_AUTH_CACHE_TTL = 60     # Seconds a verified Basic Auth header skips password hashing (0 = off)
+POLICY_AUTH_CACHE_MAX_SIZE = 1024  # Max cached verified headers per worker
+
+# Policy hot path
+POLICY_ASYNC_VIEWS = False              # Serve policy endpoints with async views (run under ASGI, e.g. uvicorn)
+POLICY_RULE_TABLE_CHECK_INTERVAL = 1.0  # Seconds between rule-change checks per worker (0 = every request)
+POLICY_USAGE_FLUSH_INTERVAL = 5.0       # Seconds between rule usage-counter flushes per worker (0 = write every match)
+POLICY_USAGE_FLUSH_MAX_PENDING = 1000   # Flush early once this many matches are buffered
+
+# Policy request logging
+POLICY_LOG_SINK = "policy_router.log_sink.QueuedLogSink"  # or "policy_router.log_sink.SyncLogSink"
+POLICY_LOG_QUEUE_SIZE = 10000           # Max records waiting for the writer thread
+POLICY_LOG_BATCH_SIZE = 200             # Records per bulk_create
+POLICY_LOG_FLUSH_INTERVAL = 1.0         # Seconds the writer waits for a full batch
+POLICY_LOG_OVERFLOW = "drop_oldest"     # When full: "drop_oldest", "block" or "sample"
+POLICY_LOG_BLOCK_TIMEOUT = 0.05         # "block": seconds to wait for room before dropping
+POLICY_LOG_SAMPLE_RATE = 10             # "sample": keep 1 in N records once the queue is half full
+POLICY_LOG_MAX_BODY_CHARS = 4096        # Truncate stored response bodies (0 = keep all)
+POLICY_LOG_PAGE_SIZE = 50               # Rows per log list page
+POLICY_LOG_COUNT_CAP = 10000            # Count at most this many filtered logs (0 = no count)
+POLICY_LOG_SOURCE_SCAN = 5000           # Source filter choices come from this many newest logs
+POLICY_LOG_SOURCE_CACHE_SECONDS = 60.0  # Seconds each worker caches the source filter choices
+POLICY_LOG_EXPORT_CHUNK_SIZE = 2000     # Rows fetched per round trip while streaming an export
+POLICY_LOG_RETENTION_DAYS = 30          # rotate_logs deletes logs older than this
+POLICY_LOG_DELETE_BATCH_SIZE = 5000     # rotate_logs: logs deleted per transaction
+POLICY_LOG_DELETE_SLEEP = 0.1           # rotate_logs: seconds between batches
+
+# Upstream policy servers
+POLICY_UPSTREAM_CONNECT_TIMEOUT = 3.0   # Default seconds to connect (per-rule override)
+POLICY_UPSTREAM_READ_TIMEOUT = 10.0     # Default seconds to wait for a response (per-rule override)
+POLICY_REQUEST_DEADLINE = 4.5           # Total seconds per policy request before the rule's fallback (per-rule override, None = off)
+POLICY_DEADLINE_RESERVE = 0.1           # Seconds of the deadline kept for logging and answering
+POLICY_UPSTREAM_MAX_CONNECTIONS = 100   # Per upstream origin, per worker
+POLICY_UPSTREAM_MAX_KEEPALIVE = 20      # Idle keep-alive connections kept per origin
+POLICY_UPSTREAM_KEEPALIVE_EXPIRY = 30.0 # Seconds an idle connection is kept open
+POLICY_UPSTREAM_HTTP2 = False           # Requires the optional 'h2' package (pip install httpx[http2])
+POLICY_UPSTREAM_VALIDATE_JSON = False   # True: wrap non-JSON upstream bodies as {"raw": ...} instead of relaying bytes
+POLICY_UPSTREAM_CACHE_MAX_ENTRIES = 10000   # Cached upstream responses per worker (rules with a cache TTL)
+POLICY_UPSTREAM_CACHE_NEGATIVE_TTL = 5      # Max seconds a 404 "no policy" answer is reused
+POLICY_UPSTREAM_EWMA_ALPHA = 0.3            # Weight of the newest latency sample for the "ewma" upstream strategy
+POLICY_UPSTREAM_SINGLE_FLIGHT = False       # Coalesce identical concurrent calls for all rules (always on for cached rules)
+
+# Hedged upstream requests (rules with a hedge percentile)
+POLICY_HEDGE_INITIAL_DELAY = 0.1        # Seconds before hedging until enough latencies are measured
+POLICY_HEDGE_MIN_DELAY = 0.01           # Never hedge sooner than this
+POLICY_HEDGE_MIN_SAMPLES = 20           # Successful calls measured per target before the percentile is used
+POLICY_HEDGE_WINDOW = 200               # Recent latencies kept per target
+POLICY_HEDGE_MAX_WORKERS = 64           # Threads per worker for hedged calls from sync views
+
+# Prometheus metrics at /metrics (in memory per worker)
+POLICY_METRICS_ENABLED = True
+POLICY_METRICS_DIR = None               # Shared directory for multi-worker servers (empty it at startup)
+POLICY_METRICS_FLUSH_INTERVAL = 5.0     # Seconds between per-worker snapshots in POLICY_METRICS_DIR
+POLICY_METRICS_TOKEN = None             # Bearer token for scrapers; otherwise /metrics needs a web login
+
+# Active upstream health checks (per worker, background thread)
+POLICY_HEALTH_CHECK_INTERVAL = 10.0     # Seconds between probes of each upstream origin (0 = off)
+POLICY_HEALTH_CHECK_PATH = "/"          # Probed with GET; any answer below 500 counts as up
+POLICY_HEALTH_CHECK_TIMEOUT = 2.0       # Seconds before a probe counts as failed
+POLICY_HEALTH_CHECK_FAILURES = 2        # Consecutive failed probes before an origin is marked down
+
+# Per-upstream circuit breakers (fallback answer is chosen per rule)
+POLICY_BREAKER_ENABLED = True
+POLICY_BREAKER_WINDOW = 20              # Recent calls considered per upstream origin
+POLICY_BREAKER_MIN_CALLS = 5            # Calls needed in the window before the breaker can open
+POLICY_BREAKER_FAILURE_RATE = 0.5       # Failing fraction (errors, 5xx, slow calls) that opens it
+POLICY_BREAKER_SLOW_CALL_SECONDS = None # Calls this slow count as failures (None = 3/4 of POLICY_REQUEST_DEADLINE)
+POLICY_BREAKER_OPEN_SECONDS = 30.0      # Fail fast this long before trying the upstream again
+POLICY_BREAKER_HALF_OPEN_CALLS = 1      # Trial calls allowed while half-open
 
 # Logging config - https://docs.djangoproject.com/en/5.2/topics/logging/
 LOGGING = {
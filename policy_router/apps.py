@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class PolicyRouterConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "policy_router"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,7 +1,96 @@
 from django.conf import settings
 from django.http import HttpResponse
-from django.contrib.auth import authenticate
+from django.contrib.auth import aauthenticate, authenticate
+from django.utils.crypto import salted_hmac
+from collections import OrderedDict
 import base64
+import threading
+import time
+
+# -----------------------------
+# Verified-credential cache
+# -----------------------------
+# Pexip Conferencing Nodes send the same Authorization header on every policy
+# request, and authenticate() costs a full PBKDF2 hash each time. Successful
+# verifications are remembered for POLICY_AUTH_CACHE_TTL seconds, keyed by an
+# HMAC of the header (the raw credentials are never kept). Saving or deleting
+# the user drops their entries in this process (see signals.py); other workers
+# catch up within the TTL.
+_verified = OrderedDict()  # header HMAC -> (user, expires_at)
+_verified_lock = threading.Lock()
+
+
+def _cache_key(auth_header):
+    return salted_hmac("policy_router.auth.verified", auth_header).hexdigest()
+
+
+def _cache_ttl():
+    return getattr(settings, "POLICY_AUTH_CACHE_TTL", 60)
+
+
+def _cached_user(key):
+    now = time.monotonic()
+    with _verified_lock:
+        entry = _verified.get(key)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at <= now:
+            del _verified[key]
+            return None
+        _verified.move_to_end(key)
+        return user
+
+
+def _remember(key, user):
+    ttl = _cache_ttl()
+    if ttl <= 0:
+        return
+    max_size = getattr(settings, "POLICY_AUTH_CACHE_MAX_SIZE", 1024)
+    with _verified_lock:
+        _verified[key] = (user, time.monotonic() + ttl)
+        _verified.move_to_end(key)
+        while len(_verified) > max_size:
+            _verified.popitem(last=False)
+
+
+def forget_user(user_id):
+    """Drop every cached verification for ``user_id``."""
+    with _verified_lock:
+        for key in [k for k, (user, _) in _verified.items() if user.pk == user_id]:
+            del _verified[key]
+
+
+def clear_auth_cache():
+    with _verified_lock:
+        _verified.clear()
+
+
+def cached_authenticate(auth_header, username, password):
+    """authenticate(), skipping the password hash for recently verified headers."""
+    if _cache_ttl() <= 0:
+        return authenticate(username=username, password=password)
+    key = _cache_key(auth_header)
+    user = _cached_user(key)
+    if user is None:
+        user = authenticate(username=username, password=password)
+        if user is not None and user.is_active:
+            _remember(key, user)
+    return user
+
+
+async def acached_authenticate(auth_header, username, password):
+    """Async cached_authenticate; a cache hit never leaves the event loop."""
+    if _cache_ttl() <= 0:
+        return await aauthenticate(username=username, password=password)
+    key = _cache_key(auth_header)
+    user = _cached_user(key)
+    if user is None:
+        user = await aauthenticate(username=username, password=password)
+        if user is not None and user.is_active:
+            _remember(key, user)
+    return user
+
 
 def basic_auth_django_user(view_func):
     def wrapper(request, *args, **kwargs):
@@ -21,7 +110,7 @@ def basic_auth_django_user(view_func):
         except Exception:
             return HttpResponse("Invalid Authorization header", status=400)
 
-        user = authenticate(username=username, password=password)
+        user = cached_authenticate(auth_header, username, password)
         if user and user.is_active:
             request.user = user
             return view_func(request, *args, **kwargs)
@@ -0,0 +1,165 @@
+"""
+Spreading policy requests over a rule's upstream targets.
+
+A rule's targets are its primary ``*_target_url`` followed by its
+``*_additional_urls``. ``order()`` returns them in the order a request should
+try them, according to the rule's ``upstream_strategy``:
+
+* failover          - as configured: primary first, then the others in order.
+* round_robin       - rotate the starting target on every request.
+* least_outstanding - fewest requests currently in flight first.
+* ewma              - lowest exponentially weighted moving average latency
+                      first, scaled by in-flight requests (unmeasured targets
+                      are tried first so they get a measurement).
+
+Whatever the strategy, targets whose circuit breaker is open, or that health
+checks have marked down, go last. The
+view moves on to the next target when a call fails or its breaker is open.
+
+Target state (in-flight count, latency EWMA, recent latencies for request
+hedging) is shared by every thread and event loop of the worker process.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import circuit_breaker, health
+from .deadline import DeadlineExceeded
+from .upstream import origin_of
+
+# A failed call counts as at least this slow in the latency average
+FAILURE_LATENCY = 1.0  # seconds
+
+_targets = {}  # target URL -> TargetStats
+_rotations = {}  # (rule id, kind) -> itertools.count
+_lock = threading.Lock()
+
+
+class TargetStats:
+    __slots__ = ("outstanding", "ewma", "requests", "failures", "latencies")
+
+    def __init__(self):
+        self.outstanding = 0
+        self.ewma = None  # seconds; None until the first call completes
+        self.requests = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=getattr(settings, "POLICY_HEDGE_WINDOW", 200))  # successful calls
+
+
+def _stats_for(url):
+    stats = _targets.get(url)
+    if stats is None:
+        with _lock:
+            stats = _targets.setdefault(url, TargetStats())
+    return stats
+
+
+def _ewma_score(url):
+    stats = _stats_for(url)
+    if stats.ewma is None:
+        return 0.0
+    return stats.ewma * (stats.outstanding + 1)
+
+
+def order(rule, kind):
+    """The rule's upstream targets for ``kind``, in the order to try them."""
+    targets = rule.target_urls(kind)
+    if len(targets) < 2:
+        return list(targets)
+
+    strategy = rule.upstream_strategy
+    if strategy == "round_robin":
+        with _lock:
+            counter = _rotations.setdefault((rule.id, kind), itertools.count())
+        start = next(counter) % len(targets)
+        ordered = list(targets[start:] + targets[:start])
+    elif strategy == "least_outstanding":
+        ordered = sorted(targets, key=lambda url: _stats_for(url).outstanding)
+    elif strategy == "ewma":
+        ordered = sorted(targets, key=_ewma_score)
+    else:
+        ordered = list(targets)
+
+    breakers = circuit_breaker.states() if circuit_breaker.enabled() else {}
+
+    def unavailable(url):
+        origin = origin_of(url)
+        return health.is_down(origin) or breakers.get(origin, {}).get("state") == circuit_breaker.OPEN
+
+    ordered.sort(key=unavailable)
+    return ordered
+
+
+@contextmanager
+def track(url):
+    """Count an in-flight call to ``url`` and fold its latency into the EWMA."""
+    stats = _stats_for(url)
+    with _lock:
+        stats.outstanding += 1
+        stats.requests += 1
+    start = time.monotonic()
+    outcome = "ok"
+    try:
+        yield
+    except circuit_breaker.CircuitOpenError:
+        outcome = "skipped"  # never reached the upstream
+        raise
+    except (asyncio.CancelledError, DeadlineExceeded):
+        outcome = "skipped"  # abandoned: the losing side of a hedged request, or out of time
+        raise
+    except BaseException:
+        outcome = "failed"
+        raise
+    finally:
+        elapsed = time.monotonic() - start
+        alpha = getattr(settings, "POLICY_UPSTREAM_EWMA_ALPHA", 0.3)
+        with _lock:
+            stats.outstanding -= 1
+            if outcome == "skipped":
+                stats.requests -= 1
+            else:
+                if outcome == "failed":
+                    stats.failures += 1
+                    elapsed = max(elapsed, FAILURE_LATENCY)
+                else:
+                    stats.latencies.append(elapsed)
+                stats.ewma = elapsed if stats.ewma is None else alpha * elapsed + (1 - alpha) * stats.ewma
+
+
+def latency_percentile(url, percentile):
+    """Seconds under which ``percentile``% of recent successful calls to ``url`` finished.
+
+    None until ``POLICY_HEDGE_MIN_SAMPLES`` calls have been measured.
+    """
+    stats = _stats_for(url)
+    with _lock:
+        latencies = sorted(stats.latencies)
+    if not latencies or len(latencies) < getattr(settings, "POLICY_HEDGE_MIN_SAMPLES", 20):
+        return None
+    index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+    return latencies[index]
+
+
+def snapshot():
+    """{target URL: {"outstanding", "ewma_ms", "requests", "failures"}} for this process."""
+    with _lock:
+        return {
+            url: {
+                "outstanding": s.outstanding,
+                "ewma_ms": None if s.ewma is None else round(s.ewma * 1000, 1),
+                "requests": s.requests,
+                "failures": s.failures,
+            }
+            for url, s in _targets.items()
+        }
+
+
+def reset():
+    with _lock:
+        _targets.clear()
+        _rotations.clear()
@@ -0,0 +1,165 @@
+"""
+Per-upstream circuit breakers.
+
+A hung or failing upstream policy server used to cost every matched request
+the full read timeout. Each upstream origin now has a breaker, shared by all
+threads (and event loops) of the worker process:
+
+* closed    - calls go through; the last ``POLICY_BREAKER_WINDOW`` outcomes are
+              kept. Once at least ``POLICY_BREAKER_MIN_CALLS`` are recorded and
+              the failure rate reaches ``POLICY_BREAKER_FAILURE_RATE`` it opens.
+              Transport errors, 5xx responses and calls slower than
+              ``slow_call_seconds()`` count as failures.
+* open      - calls fail fast with CircuitOpenError for
+              ``POLICY_BREAKER_OPEN_SECONDS``.
+* half_open - up to ``POLICY_BREAKER_HALF_OPEN_CALLS`` trial calls go through;
+              a success closes the breaker, a failure opens it again.
+
+What a request gets instead of the upstream answer is chosen per rule (see
+``PolicyProxyRule.upstream_fallback``).
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_breakers = {}  # origin -> CircuitBreaker
+_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """The upstream's breaker is open; the call was not attempted."""
+
+    def __init__(self, origin):
+        super().__init__(f"Circuit open for {origin}")
+        self.origin = origin
+
+
+def _setting(name, default):
+    return getattr(settings, f"POLICY_BREAKER_{name}", default)
+
+
+def slow_call_seconds():
+    """Calls at least this slow count as failures.
+
+    ``POLICY_BREAKER_SLOW_CALL_SECONDS``, or when that is None three quarters
+    of ``POLICY_REQUEST_DEADLINE`` (5s without a deadline). A threshold at or
+    above the deadline could never be reached: the deadline ends the call first.
+    """
+    seconds = _setting("SLOW_CALL_SECONDS", None)
+    if seconds is None:
+        deadline = getattr(settings, "POLICY_REQUEST_DEADLINE", None)
+        seconds = deadline * 0.75 if deadline else 5.0
+    return seconds
+
+
+class CircuitBreaker:
+    def __init__(self, origin):
+        self.origin = origin
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=_setting("WINDOW", 20))  # True = failure
+        self.opened_at = 0.0
+        self.trial_calls = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go through now (claims a half-open trial slot)."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < _setting("OPEN_SECONDS", 30.0):
+                    return False
+                self.state = HALF_OPEN
+                self.trial_calls = 0
+            if self.state == HALF_OPEN:
+                if self.trial_calls >= _setting("HALF_OPEN_CALLS", 1):
+                    return False
+                self.trial_calls += 1
+            return True
+
+    def record(self, failed):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                return
+            if self.state == OPEN:
+                return  # a call that started before the breaker opened
+            self.outcomes.append(failed)
+            if (
+                len(self.outcomes) >= _setting("MIN_CALLS", 5)
+                and sum(self.outcomes) / len(self.outcomes) >= _setting("FAILURE_RATE", 0.5)
+            ):
+                self._open()
+
+    def release(self):
+        """Give back the trial slot of a call abandoned before it finished."""
+        with self._lock:
+            if self.state == HALF_OPEN and self.trial_calls:
+                self.trial_calls -= 1
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "calls": len(self.outcomes),
+                "failures": sum(self.outcomes),
+            }
+
+
+def enabled():
+    return _setting("ENABLED", True)
+
+
+def breaker_for(origin):
+    breaker = _breakers.get(origin)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(origin, CircuitBreaker(origin))
+    return breaker
+
+
+def before_call(origin):
+    """Raise CircuitOpenError unless a call to ``origin`` may go through."""
+    if enabled() and not breaker_for(origin).allow():
+        raise CircuitOpenError(origin)
+
+
+def record(origin, failed=False, elapsed=0.0, status_code=None):
+    """Record the outcome of a call to ``origin``."""
+    if not enabled():
+        return
+    failed = (
+        failed
+        or (status_code is not None and status_code >= 500)
+        or elapsed >= slow_call_seconds()
+    )
+    breaker_for(origin).record(failed)
+
+
+def cancelled(origin):
+    """A call to ``origin`` was cancelled (e.g. a losing hedged request); not an outcome."""
+    if enabled():
+        breaker_for(origin).release()
+
+
+def states():
+    """{origin: {"state", "calls", "failures"}} for this process."""
+    with _lock:
+        breakers = list(_breakers.values())
+    return {b.origin: b.snapshot() for b in breakers}
+
+
+def reset():
+    with _lock:
+        _breakers.clear()
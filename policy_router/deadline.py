@@ -0,0 +1,79 @@
+"""
+Request deadlines for the policy endpoints.
+
+Pexip only waits so long for a policy answer. Each policy request has one
+time budget, counted from when the view is entered (before Basic Auth): the
+``POLICY_REQUEST_DEADLINE`` setting, or the matched rule's
+``upstream_deadline``. Auth, rule matching, every upstream attempt (connect
+and read timeouts are capped to what is left) and waiting on a coalesced call
+all spend it, and ``POLICY_DEADLINE_RESERVE`` seconds are kept back for
+logging and writing the answer.
+
+Once the budget is spent the upstream call fails with DeadlineExceeded, an
+``httpx.TimeoutException``, so the view answers with the rule's fallback
+instead of leaving Pexip to time out.
+"""
+import time
+
+import httpx
+from django.conf import settings
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """The request's time budget ran out before the upstream answered."""
+
+    def __init__(self, message="Request deadline exceeded"):
+        super().__init__(message)
+
+
+class Deadline:
+    """Time budget of one policy request. ``seconds=None`` means no deadline."""
+
+    __slots__ = ("started_at", "seconds")
+
+    def __init__(self, seconds=None, started_at=None):
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self.seconds = seconds or None
+
+    @classmethod
+    def for_request(cls, request):
+        """The global deadline, counted from when the policy view was entered."""
+        return cls(getattr(settings, "POLICY_REQUEST_DEADLINE", None), getattr(request, "policy_started_at", None))
+
+    def for_rule(self, rule):
+        """Same start time, with the rule's own deadline if it has one."""
+        if rule.deadline is None:
+            return self
+        return Deadline(rule.deadline, self.started_at)
+
+    def remaining(self):
+        """Seconds left for upstream work (reserve excluded), or None without a deadline."""
+        if self.seconds is None:
+            return None
+        reserve = getattr(settings, "POLICY_DEADLINE_RESERVE", 0.1)
+        return self.seconds - reserve - (time.monotonic() - self.started_at)
+
+    def check(self):
+        """Raise DeadlineExceeded if no budget is left."""
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.seconds}s exceeded")
+
+    def cap(self, seconds):
+        """``seconds`` (a timeout, may be None), shortened to the budget left."""
+        remaining = self.remaining()
+        if remaining is None:
+            return seconds
+        remaining = max(remaining, 0.0)
+        return remaining if seconds is None else min(seconds, remaining)
+
+    def cap_timeout(self, timeout):
+        """httpx.Timeout with every phase shortened to the budget left."""
+        if self.seconds is None:
+            return timeout
+        return httpx.Timeout(
+            connect=self.cap(timeout.connect),
+            read=self.cap(timeout.read),
+            write=self.cap(timeout.write),
+            pool=self.cap(timeout.pool),
+        )
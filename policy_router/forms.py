@@ -1,8 +1,30 @@
 import json
 from django import forms
+from django.core.validators import URLValidator
 from .models import PolicyProxyRule
 
 
+class URLListField(forms.CharField):
+    """One URL per line, stored as a list."""
+    widget = forms.Textarea(attrs={"rows": 2, "placeholder": "https://upstream2.example.com"})
+
+    def prepare_value(self, value):
+        if isinstance(value, (list, tuple)):
+            return "\n".join(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        return [line.strip() for line in (value or "").splitlines() if line.strip()]
+
+    def validate(self, value):
+        super().validate(value)
+        validate_url = URLValidator()
+        for url in value:
+            validate_url(url)
+
+
 class CSVImportForm(forms.Form):
     csv_file = forms.FileField(label="Select CSV file")
 
@@ -22,6 +44,18 @@ class PolicyProxyRuleForm(forms.ModelForm):
         help_text="Leave empty to match any call direction."
     )
 
+    service_additional_urls = URLListField(
+        required=False,
+        label="Additional service targets",
+        help_text="One URL per line.",
+    )
+
+    participant_additional_urls = URLListField(
+        required=False,
+        label="Additional participant targets",
+        help_text="One URL per line.",
+    )
+
     class Meta:
         model = PolicyProxyRule
         fields = [
@@ -41,6 +75,16 @@ class PolicyProxyRuleForm(forms.ModelForm):
             "override_participant_response",
             "basic_auth_username",
             "basic_auth_password",
+            "upstream_connect_timeout",
+            "upstream_read_timeout",
+            "upstream_deadline",
+            "service_additional_urls",
+            "participant_additional_urls",
+            "upstream_strategy",
+            "upstream_hedge_percentile",
+            "upstream_fallback",
+            "upstream_cache_ttl",
+            "upstream_cache_key_params",
         ]
         labels = {
             "always_continue_service": "Custom response (Service)",
@@ -60,6 +104,14 @@ class PolicyProxyRuleForm(forms.ModelForm):
             "source_match": forms.TextInput(attrs={
                 "placeholder": "e.g. 10.0.0.14 or mgr1.example.com"}
             ),
+            "upstream_connect_timeout": forms.NumberInput(attrs={"step": "0.1", "min": "0", "placeholder": "3.0"}),
+            "upstream_read_timeout": forms.NumberInput(attrs={"step": "0.1", "min": "0", "placeholder": "10.0"}),
+            "upstream_deadline": forms.NumberInput(attrs={"step": "0.1", "min": "0", "placeholder": "Global default"}),
+            "upstream_strategy": forms.Select(attrs={"class": "form-select"}),
+            "upstream_fallback": forms.Select(attrs={"class": "form-select"}),
+            "upstream_hedge_percentile": forms.NumberInput(attrs={"min": "50", "max": "99", "placeholder": "Off"}),
+            "upstream_cache_ttl": forms.NumberInput(attrs={"min": "0", "placeholder": "Off"}),
+            "upstream_cache_key_params": forms.TextInput(attrs={"placeholder": "local_alias,protocol,call_direction"}),
         }
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,202 @@
+"""
+Active health checks for upstream policy servers.
+
+A background thread in each worker probes every distinct upstream origin
+referenced by the active rules, every ``POLICY_HEALTH_CHECK_INTERVAL``
+seconds (0 disables it), with a GET to ``POLICY_HEALTH_CHECK_PATH``. Any
+HTTP answer below 500 within ``POLICY_HEALTH_CHECK_TIMEOUT`` counts as up;
+after ``POLICY_HEALTH_CHECK_FAILURES`` consecutive failed probes the origin is
+marked down, and one successful probe marks it up again.
+
+While an origin is down, proxied calls to it fail fast with
+UpstreamDownError (a CircuitOpenError, so the rule's next target or fallback
+applies) and the balancer tries it last. Results are also stored in
+``UpstreamHealth`` for the rules list.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+import httpx
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 10.0  # seconds
+
+_state = {}  # origin -> latest result dict
+_lock = threading.Lock()
+_checker = None
+_checker_pid = None
+_stop = threading.Event()
+
+
+class UpstreamDownError(CircuitOpenError):
+    """The origin failed its recent health checks; the call was not attempted."""
+
+    def __init__(self, origin):
+        super().__init__(origin)
+        self.args = (f"{origin} is marked down by health checks",)
+
+
+def is_down(origin):
+    state = _state.get(origin)
+    return state is not None and not state["is_up"]
+
+
+def before_call(origin):
+    """Raise UpstreamDownError if health checks have marked ``origin`` down."""
+    if is_down(origin):
+        raise UpstreamDownError(origin)
+
+
+def probe(origin, client=None):
+    """Probe one origin. Returns {"is_up", "latency_ms", "status_code", "error"}."""
+    url = origin + getattr(settings, "POLICY_HEALTH_CHECK_PATH", "/")
+    timeout = getattr(settings, "POLICY_HEALTH_CHECK_TIMEOUT", 2.0)
+    start = time.monotonic()
+    try:
+        if client is None:
+            resp = httpx.get(url, timeout=timeout)
+        else:
+            resp = client.get(url, timeout=timeout)
+    except httpx.HTTPError as e:
+        return {
+            "is_up": False,
+            "latency_ms": None,
+            "status_code": None,
+            "error": str(e)[:255] or type(e).__name__,
+        }
+    latency_ms = round((time.monotonic() - start) * 1000, 1)
+    ok = resp.status_code < 500
+    return {
+        "is_up": ok,
+        "latency_ms": latency_ms,
+        "status_code": resp.status_code,
+        "error": "" if ok else f"HTTP {resp.status_code}",
+    }
+
+
+def _record(origin, result):
+    """Fold a probe result into the in-memory state; returns the new state."""
+    threshold = getattr(settings, "POLICY_HEALTH_CHECK_FAILURES", 2)
+    with _lock:
+        previous = _state.get(origin)
+        failures = 0 if result["is_up"] else (previous["consecutive_failures"] if previous else 0) + 1
+        was_up = previous["is_up"] if previous else True
+        state = dict(
+            result,
+            is_up=result["is_up"] or (failures < threshold and was_up),
+            consecutive_failures=failures,
+        )
+        _state[origin] = state
+    if was_up and not state["is_up"]:
+        logger.warning(f"Upstream {origin} marked down: {result['error']}")
+    elif not was_up and state["is_up"]:
+        logger.info(f"Upstream {origin} is back up")
+    return state
+
+
+def target_origins():
+    """Distinct upstream origins referenced by the active rules."""
+    from .rule_table import get_rule_table
+    from .upstream import origin_of
+
+    return sorted({
+        origin_of(url)
+        for rule in get_rule_table().rules
+        for url in rule.service_target_urls + rule.participant_target_urls
+    })
+
+
+def check_all():
+    """Probe every referenced origin now; returns {origin: state}."""
+    from .models import UpstreamHealth
+
+    origins = target_origins()
+    results = {}
+    with httpx.Client() as client:
+        for origin in origins:
+            results[origin] = _record(origin, probe(origin, client))
+
+    with _lock:
+        for origin in [o for o in _state if o not in results]:
+            del _state[origin]
+
+    now = timezone.now()
+    for origin, state in results.items():
+        UpstreamHealth.objects.update_or_create(
+            origin=origin,
+            defaults={
+                "is_up": state["is_up"],
+                "latency_ms": state["latency_ms"],
+                "status_code": state["status_code"],
+                "error": state["error"],
+                "consecutive_failures": state["consecutive_failures"],
+                "checked_at": now,
+            },
+        )
+    UpstreamHealth.objects.exclude(origin__in=origins).delete()
+    return results
+
+
+def states():
+    """{origin: state} as seen by this process."""
+    with _lock:
+        return {origin: dict(state) for origin, state in _state.items()}
+
+
+def reset():
+    with _lock:
+        _state.clear()
+
+
+# -----------------------------
+# Background checker
+# -----------------------------
+def ensure_checker():
+    """Start the background checker once per process (and again after fork)."""
+    global _checker, _checker_pid
+
+    interval = getattr(settings, "POLICY_HEALTH_CHECK_INTERVAL", DEFAULT_INTERVAL)
+    if interval <= 0:
+        return
+
+    pid = os.getpid()
+    if _checker_pid == pid and _checker is not None and _checker.is_alive():
+        return
+
+    with _lock:
+        if _checker_pid == pid and _checker is not None and _checker.is_alive():
+            return
+        if _checker_pid != pid:
+            _state.clear()  # inherited from the parent process
+        _checker = threading.Thread(
+            target=_run_checker, args=(interval,), name="policy-health-checker", daemon=True
+        )
+        _checker_pid = pid
+        _checker.start()
+
+
+def _run_checker(interval):
+    while True:
+        close_old_connections()
+        try:
+            check_all()
+        except Exception:
+            logger.exception("Upstream health check failed")
+        finally:
+            close_old_connections()
+        if _stop.wait(interval):
+            return
+
+
+@atexit.register
+def _stop_at_exit():
+    _stop.set()
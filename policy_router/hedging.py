@@ -0,0 +1,198 @@
+"""
+Hedged upstream policy requests.
+
+Pexip gives the policy server little time to answer, so a single slow upstream
+call can cost a whole call setup. For rules with an
+``upstream_hedge_percentile``, if the first upstream call has not answered
+after that percentile of the target's recent successful latencies (see
+``balancer.latency_percentile``), one identical request is sent to the rule's
+next target (or to the same target when the rule has only one: policy
+requests are idempotent GETs) and whichever answers first is used.
+
+Until ``POLICY_HEDGE_MIN_SAMPLES`` latencies have been measured the delay is
+``POLICY_HEDGE_INITIAL_DELAY``; it is never shorter than
+``POLICY_HEDGE_MIN_DELAY``. At most one hedge is sent per request, so the
+extra load is roughly (100 - percentile)% of the rule's upstream calls.
+
+A call that fails with a transport error or an open circuit moves on to the
+next target right away, as without hedging. Sync views run both calls on a
+small per-process thread pool and leave the losing call to finish in the
+background; async views cancel it. Waiting stops with DeadlineExceeded once
+the request's deadline (see deadline.py) is spent.
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from django.conf import settings
+
+from . import balancer
+from .circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Failures that move a request on to the next target
+FAILOVER_ERRORS = (httpx.RequestError, CircuitOpenError)
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+_stats = {"hedged": 0, "hedge_wins": 0}
+
+
+def delay_for(rule, target):
+    """Seconds to wait for ``target`` before hedging, or None if the rule doesn't hedge."""
+    if not rule.hedge_percentile:
+        return None
+    delay = balancer.latency_percentile(target, rule.hedge_percentile)
+    if delay is None:
+        delay = getattr(settings, "POLICY_HEDGE_INITIAL_DELAY", 0.1)
+    return max(delay, getattr(settings, "POLICY_HEDGE_MIN_DELAY", 0.01))
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "POLICY_HEDGE_MAX_WORKERS", 64),
+                    thread_name_prefix="policy-hedge",
+                )
+                _executor_pid = pid
+    return _executor
+
+
+class _Attempts:
+    """Which target to try next, shared by the sync and async loops."""
+
+    def __init__(self, targets):
+        self.first = targets[0]
+        self.remaining = list(targets[1:])
+        self.single = len(targets) == 1
+        self.hedged = False
+
+    def hedge_target(self):
+        """Target for the hedged request, or None if there is none left."""
+        self.hedged = True
+        if self.remaining:
+            return self.remaining.pop(0)
+        return self.first if self.single else None
+
+    def next_target(self):
+        """Target to fail over to, or None."""
+        return self.remaining.pop(0) if self.remaining else None
+
+
+def _wait_timeout(attempts, delay, deadline):
+    timeout = None if attempts.hedged else delay
+    return timeout if deadline is None else deadline.cap(timeout)
+
+
+def fetch(rule, targets, call, deadline=None):
+    """Run ``call(target)`` for ``targets`` in order, hedging the first call."""
+    attempts = _Attempts(targets)
+    delay = delay_for(rule, attempts.first)
+    executor = _get_executor()
+    pending = {executor.submit(call, attempts.first)}
+    hedge = None
+    error = None
+    while True:
+        done, pending = wait(pending, timeout=_wait_timeout(attempts, delay, deadline), return_when=FIRST_COMPLETED)
+        if not done:
+            if deadline is not None:
+                deadline.check()
+            if attempts.hedged:
+                continue
+            target = attempts.hedge_target()
+            if target is not None:
+                logger.info(f"No upstream answer after {delay * 1000:.0f} ms, hedging to {target}")
+                _count("hedged")
+                hedge = executor.submit(call, target)
+                pending.add(hedge)
+            continue
+        for future in done:
+            try:
+                resp = future.result()
+            except FAILOVER_ERRORS as e:
+                logger.warning(f"Upstream call failed: {e}")
+                error = e
+                continue
+            if future is hedge:
+                _count("hedge_wins")
+            return resp
+        if not pending:
+            target = attempts.next_target()
+            if target is None:
+                raise error
+            if deadline is not None:
+                deadline.check()
+            pending.add(executor.submit(call, target))
+
+
+async def afetch(rule, targets, call, deadline=None):
+    """Async fetch(): ``call(target)`` returns a coroutine; the losing call is cancelled."""
+    attempts = _Attempts(targets)
+    delay = delay_for(rule, attempts.first)
+    pending = {asyncio.ensure_future(call(attempts.first))}
+    hedge = None
+    error = None
+    try:
+        while True:
+            done, pending = await asyncio.wait(
+                pending, timeout=_wait_timeout(attempts, delay, deadline), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                if deadline is not None:
+                    deadline.check()
+                if attempts.hedged:
+                    continue
+                target = attempts.hedge_target()
+                if target is not None:
+                    logger.info(f"No upstream answer after {delay * 1000:.0f} ms, hedging to {target}")
+                    _count("hedged")
+                    hedge = asyncio.ensure_future(call(target))
+                    pending.add(hedge)
+                continue
+            for task in done:
+                try:
+                    resp = task.result()
+                except FAILOVER_ERRORS as e:
+                    logger.warning(f"Upstream call failed: {e}")
+                    error = e
+                    continue
+                if task is hedge:
+                    _count("hedge_wins")
+                return resp
+            if not pending:
+                target = attempts.next_target()
+                if target is None:
+                    raise error
+                if deadline is not None:
+                    deadline.check()
+                pending.add(asyncio.ensure_future(call(target)))
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def stats():
+    """{"hedged": requests that sent a hedge, "hedge_wins": hedges that answered first}."""
+    with _lock:
+        return dict(_stats)
+
+
+def reset():
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
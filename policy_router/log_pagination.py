@@ -0,0 +1,167 @@
+"""
+Keyset (cursor) pagination for the request log.
+
+``Paginator`` pages with ``OFFSET``, so the database reads and discards every
+row before the page, and it runs a ``COUNT(*)`` over the whole filtered set.
+With tens of millions of log rows both grow with the table. Log pages are
+instead addressed by the (created_at, id) of the row they start after (or
+before). Every log index ends in (created_at, id), so a page is read in order
+from the cursor's position and page 10,000 costs the same as page 1.
+
+The total is only estimated: from PostgreSQL's ``reltuples`` statistics for
+the unfiltered log, otherwise by counting at most ``POLICY_LOG_COUNT_CAP``
+matching rows (0 disables counting).
+
+The source filter's choices come from the newest ``POLICY_LOG_SOURCE_SCAN``
+logs only, and are cached per worker for ``POLICY_LOG_SOURCE_CACHE_SECONDS``.
+"""
+import base64
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_COUNT_CAP = 10000
+DEFAULT_SOURCE_SCAN = 5000
+DEFAULT_SOURCE_CACHE_SECONDS = 60.0
+
+_sources = None  # (expires_at, sorted source hosts)
+_sources_lock = threading.Lock()
+
+
+def encode_cursor(log):
+    """Opaque cursor for the position of ``log``."""
+    raw = f"{log.created_at.isoformat()}|{log.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _older_than(queryset, position):
+    created_at, pk = position
+    return queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, pk__gte=pk)
+
+
+def _newer_than(queryset, position):
+    created_at, pk = position
+    return queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, pk__lte=pk)
+
+
+@dataclass
+class KeysetPage:
+    """One page of logs, newest first; iterate it like a Paginator page."""
+    object_list: list = field(default_factory=list)
+    has_next: bool = False
+    has_previous: bool = False
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.has_previous else None
+
+
+def paginate(queryset, after=None, before=None, per_page=None):
+    """The page of ``queryset`` (newest first) after or before a cursor."""
+    per_page = per_page or getattr(settings, "POLICY_LOG_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    newest_first = queryset.order_by("-created_at", "-pk")
+
+    position = decode_cursor(before)
+    if position is not None:
+        rows = list(_newer_than(queryset, position).order_by("created_at", "pk")[:per_page + 1])
+        has_previous = len(rows) > per_page
+        return KeysetPage(list(reversed(rows[:per_page])), has_next=True, has_previous=has_previous)
+
+    position = decode_cursor(after)
+    if position is not None:
+        newest_first = _older_than(newest_first, position)
+    rows = list(newest_first[:per_page + 1])
+    return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_previous=position is not None)
+
+
+@dataclass(frozen=True)
+class LogCount:
+    value: int
+    approximate: bool = False  # estimated from table statistics
+    capped: bool = False  # at least ``value`` rows
+
+    def __str__(self):
+        if self.capped:
+            return f"more than {self.value:,} logs"
+        if self.approximate:
+            return f"about {self.value:,} logs"
+        return f"{self.value:,} log{'' if self.value == 1 else 's'}"
+
+
+def _estimated_rows(model):
+    """PostgreSQL's row estimate for ``model``'s table, or None."""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:  # -1: never analysed
+        return None
+    return row[0]
+
+
+def approximate_count(queryset, filtered=True):
+    """Cheap LogCount for ``queryset``, or None when counting is disabled."""
+    cap = getattr(settings, "POLICY_LOG_COUNT_CAP", DEFAULT_COUNT_CAP)
+    if not cap:
+        return None
+    if not filtered:
+        estimate = _estimated_rows(queryset.model)
+        if estimate is not None:
+            return LogCount(estimate, approximate=True)
+    count = queryset.order_by()[:cap + 1].count()
+    if count > cap:
+        return LogCount(cap, capped=True)
+    return LogCount(count)
+
+
+def recent_sources(model):
+    """Sorted distinct ``source_host`` values of the newest logs (cached)."""
+    global _sources
+
+    with _sources_lock:
+        if _sources is not None and _sources[0] > time.monotonic():
+            return _sources[1]
+
+    scan = getattr(settings, "POLICY_LOG_SOURCE_SCAN", DEFAULT_SOURCE_SCAN)
+    newest = model.objects.order_by("-created_at", "-pk").values_list("source_host", flat=True)[:scan]
+    sources = sorted({host for host in newest if host})
+    ttl = getattr(settings, "POLICY_LOG_SOURCE_CACHE_SECONDS", DEFAULT_SOURCE_CACHE_SECONDS)
+    with _sources_lock:
+        _sources = (time.monotonic() + ttl, sources)
+    return sources
+
+
+def reset():
+    """Forget the cached source choices (tests)."""
+    global _sources
+
+    with _sources_lock:
+        _sources = None
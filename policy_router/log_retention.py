@@ -0,0 +1,77 @@
+"""
+Chunked deletion of old request logs.
+
+A single ``filter(created_at__lt=cutoff).delete()`` removes every expired row
+in one statement: it holds its locks and grows the transaction log for as long
+as that takes, and blocks the log writer meanwhile. ``purge`` instead deletes
+the oldest ``POLICY_LOG_DELETE_BATCH_SIZE`` rows at a time, each batch its own
+short transaction found through the created_at index, pausing
+``POLICY_LOG_DELETE_SLEEP`` seconds between batches so inserts and other
+queries keep flowing.
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PolicyRequestLog
+
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_SLEEP = 0.1
+
+
+@dataclass
+class PurgeProgress:
+    """Passed to the ``progress`` callback after each batch."""
+    deleted: int
+    batches: int
+    elapsed: float
+
+    @property
+    def rate(self):
+        return self.deleted / self.elapsed if self.elapsed else 0.0
+
+
+def cutoff_for(days=None):
+    """Logs created before this time are expired."""
+    if days is None:
+        days = getattr(settings, "POLICY_LOG_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def expired(cutoff):
+    return PolicyRequestLog.objects.filter(created_at__lt=cutoff)
+
+
+def purge(cutoff, batch_size=None, sleep=None, dry_run=False, progress=None):
+    """Delete logs created before ``cutoff`` in batches; returns how many.
+
+    With ``dry_run`` nothing is deleted and the number of expired logs is
+    returned instead.
+    """
+    if dry_run:
+        return expired(cutoff).count()
+    batch_size = max(1, batch_size or getattr(settings, "POLICY_LOG_DELETE_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    if sleep is None:
+        sleep = getattr(settings, "POLICY_LOG_DELETE_SLEEP", DEFAULT_SLEEP)
+
+    started = time.monotonic()
+    deleted = batches = 0
+    while True:
+        # Oldest first, so each batch reads the front of the created_at index
+        ids = list(expired(cutoff).order_by("created_at").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        count, _ = PolicyRequestLog.objects.filter(pk__in=ids).delete()
+        deleted += count
+        batches += 1
+        if progress is not None:
+            progress(PurgeProgress(deleted, batches, time.monotonic() - started))
+        if len(ids) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+    return deleted
@@ -0,0 +1,254 @@
+"""
+Pluggable sinks for PolicyRequestLog records.
+
+The policy views build a compact record (a dict of ``PolicyRequestLog`` field
+values, with the response body truncated) and hand it to the configured sink
+instead of inserting it before the response goes back to the Conferencing
+Node.
+
+``QueuedLogSink`` (the default) pushes records onto a bounded in-memory queue
+drained by a writer thread with ``bulk_create``. When the queue is full the
+``POLICY_LOG_OVERFLOW`` policy decides what gives:
+
+* ``drop_oldest`` - evict the oldest queued record to make room.
+* ``block``       - wait up to ``POLICY_LOG_BLOCK_TIMEOUT`` seconds, then drop.
+* ``sample``      - once the queue is half full keep only 1 in
+                    ``POLICY_LOG_SAMPLE_RATE`` records; drop when full.
+
+``SyncLogSink`` writes each record immediately, as the views used to.
+Select a sink with ``POLICY_LOG_SINK`` (a dotted path).
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SINK = "policy_router.log_sink.QueuedLogSink"
+OVERFLOW_POLICIES = ("drop_oldest", "block", "sample")
+
+_sink = None
+_sink_pid = None
+_sink_lock = threading.Lock()
+
+
+class SyncLogSink:
+    """Insert every record inside the request (no buffering)."""
+    blocking = True  # emit() does database I/O
+
+    def __init__(self, **kwargs):
+        self.flushed = 0
+        self.failed = 0
+
+    def emit(self, record):
+        from .models import PolicyRequestLog
+
+        try:
+            PolicyRequestLog.objects.create(**record)
+            self.flushed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("Failed to write policy request log")
+
+    def flush(self):
+        return 0
+
+    def close(self, discard=False):
+        pass
+
+    def stats(self):
+        return {"queued": 0, "flushed": self.flushed, "dropped": 0, "failed": self.failed}
+
+
+class QueuedLogSink:
+    """Bounded queue of log records, bulk-inserted by a background writer."""
+
+    def __init__(
+        self,
+        max_size=10000,
+        batch_size=200,
+        flush_interval=1.0,
+        overflow="drop_oldest",
+        sample_rate=10,
+        block_timeout=0.05,
+        start=True,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown log overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}")
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.sample_rate = max(1, sample_rate)
+        self.block_timeout = block_timeout
+
+        self.blocking = overflow == "block"  # emit() may wait for room
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._sampled = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._writer = None
+        if start:
+            self._writer = threading.Thread(target=self._run, name="policy-log-writer", daemon=True)
+            self._writer.start()
+
+    # --- Request side ---
+    def emit(self, record):
+        """Queue a record without touching the database. Never raises."""
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return False
+
+            if self.overflow == "sample" and len(self._queue) >= self.max_size // 2:
+                self._sampled += 1
+                if self._sampled % self.sample_rate:
+                    self.dropped += 1
+                    return False
+
+            if len(self._queue) >= self.max_size:
+                if self.overflow == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.overflow == "block":
+                    self._cond.wait_for(
+                        lambda: len(self._queue) < self.max_size or self._closed,
+                        timeout=self.block_timeout,
+                    )
+                    if len(self._queue) >= self.max_size or self._closed:
+                        self.dropped += 1
+                        return False
+                else:
+                    self.dropped += 1
+                    return False
+
+            self._queue.append(record)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    # --- Writer side ---
+    def flush(self):
+        """Write everything queued so far in the calling thread. Returns rows written."""
+        written = 0
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def close(self, discard=False):
+        """Stop the writer and flush what is left (or drop it if ``discard``)."""
+        with self._cond:
+            self._closed = True
+            if discard:
+                self._queue.clear()
+            self._cond.notify_all()
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join(timeout=5.0)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._queue)
+        return {"queued": queued, "flushed": self.flushed, "dropped": self.dropped, "failed": self.failed}
+
+    def _take(self, limit):
+        with self._cond:
+            batch = [self._queue.popleft() for _ in range(min(limit, len(self._queue)))]
+            if batch:
+                self._cond.notify_all()  # wake producers blocked on a full queue
+            return batch
+
+    def _write(self, batch):
+        from .models import PolicyRequestLog
+
+        try:
+            PolicyRequestLog.objects.bulk_create([PolicyRequestLog(**record) for record in batch])
+        except Exception:
+            with self._cond:
+                self.failed += len(batch)
+            logger.exception(f"Failed to write {len(batch)} policy request logs")
+            return 0
+        with self._cond:
+            self.flushed += len(batch)
+        return len(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._queue) >= self.batch_size or self._closed,
+                    timeout=self.flush_interval,
+                )
+                if self._closed:
+                    return
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+# -----------------------------
+# Process-wide sink
+# -----------------------------
+def build_log_sink():
+    """Instantiate the sink configured in settings."""
+    sink_class = import_string(getattr(settings, "POLICY_LOG_SINK", DEFAULT_SINK))
+    return sink_class(
+        max_size=getattr(settings, "POLICY_LOG_QUEUE_SIZE", 10000),
+        batch_size=getattr(settings, "POLICY_LOG_BATCH_SIZE", 200),
+        flush_interval=getattr(settings, "POLICY_LOG_FLUSH_INTERVAL", 1.0),
+        overflow=getattr(settings, "POLICY_LOG_OVERFLOW", "drop_oldest"),
+        sample_rate=getattr(settings, "POLICY_LOG_SAMPLE_RATE", 10),
+        block_timeout=getattr(settings, "POLICY_LOG_BLOCK_TIMEOUT", 0.05),
+    )
+
+
+def get_log_sink():
+    """Return this process' log sink, creating it on first use (and after fork)."""
+    global _sink, _sink_pid
+
+    pid = os.getpid()
+    if _sink is not None and _sink_pid == pid:
+        return _sink
+    with _sink_lock:
+        if _sink is None or _sink_pid != pid:
+            _sink = build_log_sink()
+            _sink_pid = pid
+        return _sink
+
+
+async def aemit(record):
+    """Emit from async code; hops to a thread only for sinks that may block."""
+    sink = get_log_sink()
+    if sink.blocking:
+        return await sync_to_async(sink.emit)(record)
+    return sink.emit(record)
+
+
+def reset_log_sink(flush=False):
+    """Close and forget the current sink (tests, settings changes)."""
+    global _sink, _sink_pid
+
+    with _sink_lock:
+        sink, _sink, _sink_pid = _sink, None, None
+    if sink is not None:
+        sink.close(discard=not flush)
+
+
+@atexit.register
+def _close_at_exit():
+    if _sink is not None and _sink_pid == os.getpid():
+        _sink.close()
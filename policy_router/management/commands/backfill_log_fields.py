@@ -0,0 +1,70 @@
+# policy_router/management/commands/backfill_log_fields.py
+import time
+
+from django.core.management.base import BaseCommand
+from policy_router.models import PolicyRequestLog
+
+FIELDS = list(PolicyRequestLog.STRUCTURED_PARAMS)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the local_alias, protocol and call_direction columns of existing "
+        "PolicyRequestLog rows from their stored request parameters. Walks the table "
+        "by id in chunks, so it can be stopped and resumed with --start-id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows read and updated per chunk (default: 1000)",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between chunks to spare the database (default: 0)",
+        )
+        parser.add_argument(
+            "--start-id",
+            type=int,
+            default=0,
+            help="Resume after this log id (default: start of the table)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        last_id = options["start_id"]
+        scanned = updated = 0
+
+        while True:
+            chunk = list(
+                PolicyRequestLog.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .only("pk", "request_params", *FIELDS)[:batch_size]
+            )
+            if not chunk:
+                break
+
+            changed = []
+            for log in chunk:
+                fields = PolicyRequestLog.structured_fields(log.request_params)
+                if any(getattr(log, name) != value for name, value in fields.items()):
+                    for name, value in fields.items():
+                        setattr(log, name, value)
+                    changed.append(log)
+            if changed:
+                PolicyRequestLog.objects.bulk_update(changed, FIELDS)
+
+            scanned += len(chunk)
+            updated += len(changed)
+            last_id = chunk[-1].pk
+            self.stdout.write(f"… {scanned} scanned, {updated} updated (last id {last_id})")
+            if len(chunk) < batch_size:
+                break
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Backfilled {updated} of {scanned} logs."))
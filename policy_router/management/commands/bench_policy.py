@@ -0,0 +1,270 @@
+# policy_router/management/commands/bench_policy.py
+import base64
+import json
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from policy_router import log_sink, response_cache, rule_table, usage, views
+from policy_router.log_sink import QueuedLogSink
+from policy_router.models import PolicyProxyRule, PolicyRequestLog
+
+BENCH_USER = "bench-policy-node"
+BENCH_PASSWORD = "bench-policy-secret"
+
+
+class _StubUpstream(BaseHTTPRequestHandler):
+    """Minimal upstream policy server answering every GET with 'continue'."""
+    delay = 0.0
+    body = json.dumps({"status": "success", "action": "continue", "result": {}}).encode()
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the policy hot path end to end: seeds N synthetic rules, replays an alias "
+        "mix through the policy views against a local stub upstream and reports req/s, "
+        "latency percentiles and DB queries per request. All data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rules", type=int, default=200, help="Synthetic rules to seed (default: 200)")
+        parser.add_argument("--requests", type=int, default=2000, help="Requests to replay (default: 2000)")
+        parser.add_argument("--warmup", type=int, default=50, help="Unmeasured warm-up requests (default: 50)")
+        parser.add_argument(
+            "--override-ratio",
+            type=float,
+            default=0.5,
+            help="Fraction of rules answering with an override instead of proxying (default: 0.5)",
+        )
+        parser.add_argument("--miss-ratio", type=float, default=0.1, help="Fraction of aliases matching no rule")
+        parser.add_argument(
+            "--aliases-file",
+            help="Replay aliases from this file (one per line) instead of the synthetic mix",
+        )
+        parser.add_argument(
+            "--alias-pool",
+            type=int,
+            default=10000,
+            help="Distinct aliases per rule in the synthetic mix; lower it to model repeats (default: 10000)",
+        )
+        parser.add_argument("--upstream-delay", type=float, default=0.0, help="Stub upstream delay in ms")
+        parser.add_argument(
+            "--cache-ttl", type=int, default=None, help="Upstream response cache TTL for proxying rules"
+        )
+        parser.add_argument("--async", dest="use_async", action="store_true", help="Use the async views")
+        parser.add_argument("--auth", action="store_true", help="Enable policy Basic Auth for the run")
+        parser.add_argument(
+            "--view-log-level",
+            default="ERROR",
+            help="Level for the policy_router.views logger during the run (default: ERROR, "
+                 "so per-request console logging doesn't dominate the numbers)",
+        )
+        parser.add_argument("--seed", type=int, default=1234)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        server = ThreadingHTTPServer(("127.0.0.1", 0), type(
+            "StubUpstream", (_StubUpstream,), {"delay": options["upstream_delay"] / 1000.0}
+        ))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        upstream_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        # Keep background writers idle so every DB write happens inside the
+        # rolled-back transaction on this thread.
+        bench_settings = override_settings(
+            POLICY_USAGE_FLUSH_INTERVAL=3600,
+            POLICY_USAGE_FLUSH_MAX_PENDING=10 ** 9,
+            POLICY_RULE_TABLE_CHECK_INTERVAL=3600,
+            POLICY_HEALTH_CHECK_INTERVAL=0,
+            ENABLE_POLICY_AUTH=options["auth"],
+        )
+        view_logger = logging.getLogger("policy_router.views")
+        view_log_level = view_logger.level
+        view_logger.setLevel(options["view_log_level"].upper())
+        sink = QueuedLogSink(max_size=options["requests"] + options["warmup"] + 1, start=False)
+        try:
+            with bench_settings, transaction.atomic():
+                # Requests only enqueue; the batch write is timed separately below.
+                log_sink._sink, log_sink._sink_pid = sink, os.getpid()
+                self._seed(options, upstream_url, rng)
+                requests = self._requests(options, rng)
+                results, queries = self._replay(requests, options)
+                self._report(results, queries, options, sink)
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            view_logger.setLevel(view_log_level)
+            server.shutdown()
+            log_sink.reset_log_sink()
+            usage.reset()
+            response_cache.clear()
+            rule_table.invalidate()
+
+    # -----------------------------
+    # Setup
+    # -----------------------------
+    def _seed(self, options, upstream_url, rng):
+        count = options["rules"]
+        if count < 1:
+            raise CommandError("--rules must be at least 1")
+        rules = []
+        for i in range(count):
+            override = rng.random() < options["override_ratio"]
+            rules.append(PolicyProxyRule(
+                name=f"bench-{i}",
+                regex=rf"^room{i}\-\d+(@example\.com)?$",
+                priority=i + 1,
+                protocols=rng.choices([["sip"], ["webrtc"], []], weights=[5, 3, 2])[0],
+                always_continue_service=override,
+                override_service_response={"status": "success", "action": "continue"} if override else None,
+                always_continue_participant=override,
+                override_participant_response={"status": "success", "action": "continue"} if override else None,
+                service_target_url=None if override else upstream_url,
+                participant_target_url=None if override else upstream_url,
+                upstream_cache_ttl=options["cache_ttl"],
+            ))
+        # bulk_create skips the O(N) overlap validation in save()
+        PolicyProxyRule.objects.bulk_create(rules)
+        rule_table.bump_rule_table_version()
+
+        if options["auth"]:
+            get_user_model().objects.create_user(BENCH_USER, password=BENCH_PASSWORD)
+
+    def _requests(self, options, rng):
+        total = options["requests"] + options["warmup"]
+        if options["aliases_file"]:
+            with open(options["aliases_file"], encoding="utf-8") as f:
+                aliases = [line.strip() for line in f if line.strip()]
+            if not aliases:
+                raise CommandError(f"No aliases in {options['aliases_file']}")
+        else:
+            aliases = None
+
+        headers = {"REMOTE_ADDR": "10.0.0.10"}
+        if options["auth"]:
+            token = base64.b64encode(f"{BENCH_USER}:{BENCH_PASSWORD}".encode()).decode()
+            headers["HTTP_AUTHORIZATION"] = f"Basic {token}"
+
+        factory = RequestFactory()
+        requests = []
+        for n in range(total):
+            if aliases:
+                alias = aliases[n % len(aliases)]
+            elif rng.random() < options["miss_ratio"]:
+                alias = f"unknown-{rng.randrange(10000)}@example.com"
+            else:
+                alias = f"room{rng.randrange(options['rules'])}-{rng.randrange(options['alias_pool'])}@example.com"
+            kind = rng.choice(["service", "participant"])
+            path = f"/policy/v1/{views.POLICY_PATHS[kind]}"
+            requests.append((kind, factory.get(path, {
+                "local_alias": alias,
+                "protocol": rng.choice(["sip", "webrtc"]),
+                "call_direction": "dial_in",
+            }, **headers)))
+        return requests
+
+    # -----------------------------
+    # Run
+    # -----------------------------
+    def _replay(self, requests, options):
+        """Run the warm-up, then the measured requests; returns (results, queries)."""
+        if options["use_async"]:
+            view_for = {
+                "service": views.proxy_service_policy_async,
+                "participant": views.proxy_participant_policy_async,
+            }
+            run = async_to_sync(self._arun)
+        else:
+            view_for = {"service": views.proxy_service_policy, "participant": views.proxy_participant_policy}
+            run = self._run
+
+        warmup = options["warmup"]
+        run(requests[:warmup], view_for)
+        # The async views reach the DB through sync_to_async on this thread,
+        # so one capture here sees the queries of both modes.
+        with CaptureQueriesContext(connection) as queries:
+            results = run(requests[warmup:], view_for)
+        return results, len(queries)
+
+    def _run(self, requests, view_for):
+        results = []
+        for kind, request in requests:
+            start = time.perf_counter()
+            response = view_for[kind](request)
+            results.append((time.perf_counter() - start, response.status_code))
+        return results
+
+    async def _arun(self, requests, view_for):
+        results = []
+        for kind, request in requests:
+            start = time.perf_counter()
+            response = await view_for[kind](request)
+            results.append((time.perf_counter() - start, response.status_code))
+        return results
+
+    # -----------------------------
+    # Report
+    # -----------------------------
+    def _report(self, results, queries, options, sink):
+        latencies = sorted(r[0] * 1000 for r in results)
+        total_time = sum(r[0] for r in results)
+        statuses = {}
+        for _, status in results:
+            statuses[status] = statuses.get(status, 0) + 1
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+        flush_start = time.perf_counter()
+        written = sink.flush()
+        flush_ms = (time.perf_counter() - flush_start) * 1000
+        usage_rules = usage.flush()
+
+        mode = "async" if options["use_async"] else "sync"
+        self.stdout.write(f"Policy hot path ({mode}, {options['rules']} rules, auth={'on' if options['auth'] else 'off'})")
+        self.stdout.write(f"  requests        {len(results)}")
+        self.stdout.write(f"  throughput      {len(results) / total_time:,.0f} req/s (serial)")
+        self.stdout.write(
+            f"  latency ms      p50={pct(50):.3f}  p95={pct(95):.3f}  p99={pct(99):.3f}  "
+            f"mean={statistics.fmean(latencies):.3f}"
+        )
+        self.stdout.write(f"  DB queries/req  {queries / len(results):.2f}")
+        self.stdout.write(f"  status codes    {dict(sorted(statuses.items()))}")
+        self.stdout.write(
+            f"  log sink        {written} rows in {flush_ms:.1f} ms "
+            f"({PolicyRequestLog.objects.count()} in table), dropped={sink.stats()['dropped']}"
+        )
+        self.stdout.write(f"  usage flush     {usage_rules} rules updated")
+        if options["cache_ttl"]:
+            cache = response_cache.stats()
+            self.stdout.write(
+                f"  response cache  hits={cache['hits'] + cache['negative_hits']} misses={cache['misses']}"
+            )
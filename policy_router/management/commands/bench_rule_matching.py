@@ -0,0 +1,104 @@
+# policy_router/management/commands/bench_rule_matching.py
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from policy_router.models import PolicyProxyRule
+from policy_router.rule_table import CompiledRule, RuleTable
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark rule matching latency against synthetic rule tables "
+        "(indexed vs linear scan). Uses no database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rules",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000, 10000],
+            help="Rule counts to benchmark (default: 10 100 1000 10000)",
+        )
+        parser.add_argument(
+            "--lookups",
+            type=int,
+            default=2000,
+            help="Aliases matched per table (default: 2000)",
+        )
+        parser.add_argument(
+            "--unanchored",
+            type=float,
+            default=0.05,
+            help="Fraction of rules with no literal prefix (default: 0.05)",
+        )
+        parser.add_argument("--seed", type=int, default=1234)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self.stdout.write(
+            f"{'rules':>7} {'mode':>8} {'p50 µs':>9} {'p99 µs':>9} {'mean µs':>9} {'candidates':>11}"
+        )
+        for count in options["rules"]:
+            rules = self._synthetic_rules(count, options["unanchored"], rng)
+            aliases = self._aliases(count, options["lookups"], rng)
+            for indexed in (False, True):
+                table = RuleTable(rules, version=0, indexed=indexed)
+                timings, evaluated = self._run(table, aliases)
+                mode = "indexed" if indexed else "linear"
+                self.stdout.write(
+                    f"{count:>7} {mode:>8} "
+                    f"{self._pct(timings, 50):>9.1f} {self._pct(timings, 99):>9.1f} "
+                    f"{statistics.fmean(timings):>9.1f} {evaluated / len(aliases):>11.1f}"
+                )
+
+    def _synthetic_rules(self, count, unanchored, rng):
+        rules = []
+        for i in range(count):
+            if rng.random() < unanchored:
+                regex = rf"(sip:)?vmr{i}\d*@example\.com"
+            else:
+                regex = rf"^room{i}\-\d+(@example\.com)?$"
+            # Mostly single-protocol rules, as in a typical deployment
+            protocols = rng.choices([["sip"], ["webrtc"], []], weights=[5, 3, 2])[0]
+            rule = PolicyProxyRule(
+                id=i + 1,
+                name=f"rule-{i}",
+                regex=regex,
+                priority=i,
+                protocols=protocols,
+                call_directions=rng.choice([["dial_in"], []]),
+                always_continue_service=True,
+            )
+            rules.append(CompiledRule.from_model(rule))
+        return rules
+
+    def _aliases(self, count, lookups, rng):
+        requests = []
+        for _ in range(lookups):
+            if rng.random() < 0.8:
+                alias = f"room{rng.randrange(count)}-{rng.randrange(10000)}@example.com"
+            else:
+                alias = f"unknown-{rng.randrange(10000)}@example.com"  # miss
+            requests.append({
+                "local_alias": alias,
+                "protocol": rng.choice(["sip", "webrtc", "h323"]),
+                "call_direction": rng.choice(["dial_in", "dial_out"]),
+                "client_ip": "10.0.0.10",
+            })
+        return requests
+
+    def _run(self, table, requests):
+        timings = []
+        evaluated = 0
+        for attrs in requests:
+            start = time.perf_counter()
+            next(table.match(**attrs), None)
+            timings.append((time.perf_counter() - start) * 1e6)
+            evaluated += len(table.candidates(**attrs))
+        return timings, evaluated
+
+    def _pct(self, values, pct):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
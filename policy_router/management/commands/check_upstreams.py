@@ -0,0 +1,21 @@
+# policy_router/management/commands/check_upstreams.py
+from django.core.management.base import BaseCommand
+from policy_router import health
+
+class Command(BaseCommand):
+    help = (
+        "Probe every upstream policy server referenced by the active rules now and store the "
+        "results shown on the rules list. Web workers also probe in the background every "
+        "POLICY_HEALTH_CHECK_INTERVAL seconds."
+    )
+
+    def handle(self, *args, **options):
+        results = health.check_all()
+        if not results:
+            self.stdout.write("No upstream targets are referenced by active rules.")
+            return
+        for origin, state in results.items():
+            if state["is_up"]:
+                self.stdout.write(self.style.SUCCESS(f"✅ {origin} up ({state['latency_ms']} ms)"))
+            else:
+                self.stdout.write(self.style.ERROR(f"❌ {origin} down: {state['error']}"))
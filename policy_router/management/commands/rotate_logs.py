@@ -1,21 +1,80 @@
 # policy_router/management/commands/rotate_logs.py
+import os
+import time
+
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from policy_router.models import PolicyRequestLog
+from policy_router import log_retention
 
 class Command(BaseCommand):
-    help = "Deletes PolicyRequestLog entries older than N days"
+    help = (
+        "Deletes PolicyRequestLog entries older than N days, a batch at a time. "
+        "With --interval it keeps running and purges again every INTERVAL seconds."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--days",
             type=int,
-            default=30,
-            help="Number of days to keep logs (default: 30)",
+            default=None,
+            help="Number of days to keep logs (default: POLICY_LOG_RETENTION_DAYS, 30)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Logs deleted per batch (default: POLICY_LOG_DELETE_BATCH_SIZE, 5000)",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=None,
+            help="Seconds to pause between batches (default: POLICY_LOG_DELETE_SLEEP, 0.1)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many logs would be deleted",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Run continuously, purging every INTERVAL seconds (default: run once)",
+        )
+        parser.add_argument(
+            "--nice",
+            type=int,
+            default=0,
+            help="Lower this process's CPU priority by N (Unix only)",
         )
 
     def handle(self, *args, **options):
-        cutoff = timezone.now() - timedelta(days=options["days"])
-        deleted, _ = PolicyRequestLog.objects.filter(created_at__lt=cutoff).delete()
+        if options["nice"] and hasattr(os, "nice"):
+            os.nice(options["nice"])
+
+        try:
+            while True:
+                self.rotate(options)
+                if not options["interval"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
+
+    def rotate(self, options):
+        cutoff = log_retention.cutoff_for(options["days"])
+        if options["dry_run"]:
+            count = log_retention.purge(cutoff, dry_run=True)
+            self.stdout.write(f"Would delete {count} logs created before {cutoff:%Y-%m-%d %H:%M:%S}")
+            return
+
+        def progress(p):
+            self.stdout.write(f"… {p.deleted} deleted in {p.batches} batches ({p.rate:,.0f}/s)")
+
+        deleted = log_retention.purge(
+            cutoff,
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            progress=progress if options["verbosity"] >= 1 else None,
+        )
         self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} old logs"))
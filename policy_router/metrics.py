@@ -0,0 +1,361 @@
+"""
+Prometheus metrics for the policy endpoints.
+
+Counters and latency histograms are kept in memory per worker process (no
+database writes) and served in the Prometheus text format at ``/metrics``:
+
+* ``policy_requests_total``            - by kind, outcome (override, proxy,
+                                         fallback, error, no_match), rule,
+                                         protocol, call direction and the
+                                         rule's source match.
+* ``policy_request_duration_seconds``  - by kind and phase: auth, match,
+                                         upstream, log and total.
+* ``policy_upstream_responses_total``  - by upstream origin and status code (or
+                                         timeout, deadline, circuit_open, down,
+                                         cancelled, error).
+* ``policy_upstream_cache_total``      - response cache hits and misses.
+* ``policy_log_records_total`` / ``policy_log_queue_depth`` - request log sink.
+
+With several worker processes (gunicorn), set ``POLICY_METRICS_DIR`` to a
+directory shared by the workers and emptied when the server starts. Each
+worker then writes its own snapshot there every
+``POLICY_METRICS_FLUSH_INTERVAL`` seconds (and at exit), and ``/metrics`` adds
+up the snapshots of all workers. Counters of exited workers keep counting, so
+totals never go backwards; gauges only include live workers.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+
+from . import log_sink, response_cache
+from .circuit_breaker import CircuitOpenError
+from .deadline import DeadlineExceeded
+from .health import UpstreamDownError
+from .models import PolicyProxyRule
+from .upstream import origin_of
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_FLUSH_INTERVAL = 5.0  # seconds
+
+# name -> (type, help)
+METRICS = {
+    "policy_requests_total": ("counter", "Policy requests answered, by outcome and matched rule."),
+    "policy_request_duration_seconds": ("histogram", "Time spent per policy request, by phase."),
+    "policy_upstream_responses_total": ("counter", "Upstream policy server calls, by origin and status."),
+    "policy_upstream_cache_total": ("counter", "Upstream response cache lookups, by result."),
+    "policy_log_records_total": ("counter", "Policy request log records, by result."),
+    "policy_log_queue_depth": ("gauge", "Policy request log records waiting to be written."),
+}
+
+_counters = {}    # (name, labels) -> float
+_histograms = {}  # (name, labels) -> [count per bucket..., sum, count]
+_lock = threading.Lock()
+_writer = None
+_writer_pid = None
+_stop = threading.Event()
+
+
+def enabled():
+    return getattr(settings, "POLICY_METRICS_ENABLED", True)
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add ``value`` to a counter."""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Record one observation in a histogram."""
+    key = (name, _labels(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(DEFAULT_BUCKETS) + 2)
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+                break
+        hist[-2] += seconds
+        hist[-1] += 1
+
+
+def upstream_result(url, status_code=None, error=None):
+    """Count one upstream call by origin and status code (or kind of failure)."""
+    if not enabled():
+        return
+    if error is None:
+        status = str(status_code)
+    elif isinstance(error, DeadlineExceeded):
+        status = "deadline"
+    elif isinstance(error, httpx.TimeoutException):
+        status = "timeout"
+    elif isinstance(error, UpstreamDownError):
+        status = "down"
+    elif isinstance(error, CircuitOpenError):
+        status = "circuit_open"
+    elif isinstance(error, asyncio.CancelledError):
+        status = "cancelled"
+    else:
+        status = "error"
+    inc("policy_upstream_responses_total", origin=origin_of(url), status=status)
+
+
+class RequestTimer:
+    """Phase timings of one policy request; ``finish()`` records them."""
+
+    __slots__ = ("kind", "started_at", "view_at", "phases")
+
+    def __init__(self, kind, request):
+        self.kind = kind
+        self.view_at = time.monotonic()
+        # Stamped by the policy view decorator before Basic Auth
+        self.started_at = getattr(request, "policy_started_at", None) or self.view_at
+        self.phases = {}
+        _ensure_writer()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.monotonic() - start
+
+    def finish(self, response, outcome, attrs, rule=None):
+        """Record the request and return ``response``."""
+        if not enabled():
+            return response
+        total = time.monotonic() - self.started_at
+        auth = self.view_at - self.started_at
+        phases = dict(self.phases, auth=auth, total=total)
+        phases["match"] = max(total - auth - sum(self.phases.values()), 0.0)
+        for phase, seconds in phases.items():
+            observe("policy_request_duration_seconds", seconds, kind=self.kind, phase=phase)
+        inc(
+            "policy_requests_total",
+            kind=self.kind,
+            outcome=outcome,
+            rule=rule.name if rule is not None else "",
+            protocol=_bounded(attrs.get("protocol"), _PROTOCOLS),
+            call_direction=_bounded(attrs.get("call_direction"), _CALL_DIRECTIONS),
+            source=(rule.source_match or "") if rule is not None else "",
+        )
+        return response
+
+
+# Label values come from the request, so anything outside the known choices is
+# folded into "other" to keep the number of series bounded.
+_PROTOCOLS = frozenset(value for value, _ in PolicyProxyRule.PROTOCOL_CHOICES)
+_CALL_DIRECTIONS = frozenset(value for value, _ in PolicyProxyRule.CALL_DIRECTION_CHOICES)
+
+
+def _bounded(value, allowed):
+    if not value:
+        return ""
+    value = value.lower()
+    return value if value in allowed else "other"
+
+
+# -----------------------------
+# Snapshots and exposition
+# -----------------------------
+def _sampled():
+    """Counters and gauges read from the other hot-path modules at collection time."""
+    cache = response_cache.stats()
+    sink = log_sink.get_log_sink().stats()
+    counters = [
+        ("policy_upstream_cache_total", (("result", "hit"),), cache["hits"]),
+        ("policy_upstream_cache_total", (("result", "negative_hit"),), cache["negative_hits"]),
+        ("policy_upstream_cache_total", (("result", "miss"),), cache["misses"]),
+    ] + [
+        ("policy_log_records_total", (("result", result),), sink[result])
+        for result in ("flushed", "dropped", "failed")
+    ]
+    gauges = [("policy_log_queue_depth", (), sink["queued"])]
+    return counters, gauges
+
+
+def snapshot():
+    """This process' metrics as a JSON-serialisable dict."""
+    counters, gauges = _sampled()
+    with _lock:
+        counters += [(name, labels, value) for (name, labels), value in _counters.items()]
+        histograms = [(name, labels, list(hist)) for (name, labels), hist in _histograms.items()]
+    return {
+        "pid": os.getpid(),
+        "counters": counters,
+        "histograms": histograms,
+        "gauges": gauges,
+    }
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f"policy-metrics-{pid}.json")
+
+
+def write_snapshot():
+    """Write this process' snapshot to ``POLICY_METRICS_DIR`` (no-op if unset)."""
+    directory = getattr(settings, "POLICY_METRICS_DIR", None)
+    if not directory:
+        return
+    path = _snapshot_path(directory, os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _snapshots():
+    """Snapshots of every worker sharing ``POLICY_METRICS_DIR``, or just this one."""
+    directory = getattr(settings, "POLICY_METRICS_DIR", None)
+    if not directory:
+        return [snapshot()]
+    write_snapshot()
+    snapshots = []
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith("policy-metrics-") and filename.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            logger.warning(f"Skipping unreadable metrics snapshot {filename}")
+    return snapshots
+
+
+def _merge(snapshots):
+    counters, histograms, gauges = {}, {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, hist in snap["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(hist))
+            for i, value in enumerate(hist):
+                merged[i] += value
+        if snap["pid"] == os.getpid() or _pid_alive(snap["pid"]):
+            for name, labels, value in snap["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    counters, histograms, gauges = _merge(_snapshots())
+    by_name = {}
+    for store in (counters, gauges):
+        for (name, labels), value in store.items():
+            by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), hist in histograms.items():
+        by_name.setdefault(name, []).append((labels, hist))
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in sorted(by_name.get(name, [])):
+            if metric_type != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(value[-2]))}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop every recorded value (tests)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+# -----------------------------
+# Snapshot writer (multi-process mode)
+# -----------------------------
+def _ensure_writer():
+    """Start the snapshot writer once per process when POLICY_METRICS_DIR is set."""
+    global _writer, _writer_pid
+
+    if not getattr(settings, "POLICY_METRICS_DIR", None):
+        return
+    pid = os.getpid()
+    if _writer_pid == pid and _writer is not None and _writer.is_alive():
+        return
+    with _lock:
+        if _writer_pid == pid and _writer is not None and _writer.is_alive():
+            return
+        if _writer_pid != pid:
+            # Values inherited from the parent are in the parent's snapshot
+            _counters.clear()
+            _histograms.clear()
+        interval = getattr(settings, "POLICY_METRICS_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+        _writer = threading.Thread(target=_run_writer, args=(interval,), name="policy-metrics-writer", daemon=True)
+        _writer_pid = pid
+        _writer.start()
+
+
+def _run_writer(interval):
+    while not _stop.wait(interval):
+        try:
+            write_snapshot()
+        except Exception:
+            logger.exception("Writing metrics snapshot failed")
+
+
+@atexit.register
+def _write_at_exit():
+    _stop.set()
+    if _writer_pid == os.getpid():
+        try:
+            write_snapshot()
+        except Exception:
+            pass
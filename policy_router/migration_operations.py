@@ -0,0 +1,35 @@
+"""
+Migration operations shared by the request log migrations.
+
+The log table holds millions of rows, so its indexes are built without
+blocking inserts. ``django.contrib.postgres`` needs psycopg, which SQLite
+installs don't have, so it is only imported when migrating PostgreSQL.
+"""
+from django.db import migrations
+
+
+def _postgres_operation(operation):
+    from django.contrib.postgres.operations import AddIndexConcurrently as PostgresAddIndexConcurrently
+
+    return PostgresAddIndexConcurrently(operation.model_name, operation.index)
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex built with CREATE INDEX CONCURRENTLY on PostgreSQL.
+
+    Other databases build the index normally. The migration must set
+    ``atomic = False``.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return _postgres_operation(self).database_forwards(app_label, schema_editor, from_state, to_state)
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return _postgres_operation(self).database_backwards(app_label, schema_editor, from_state, to_state)
+        return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return f"{super().describe()} (concurrently on PostgreSQL)"
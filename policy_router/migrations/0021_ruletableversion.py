@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    RuleTableVersion = apps.get_model("policy_router", "RuleTableVersion")
+    RuleTableVersion.objects.get_or_create(pk=1, defaults={"version": 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0020_remove_policyrequestlog_request_body_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RuleTableVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
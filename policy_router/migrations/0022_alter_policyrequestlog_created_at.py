@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0021_ruletableversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='policyrequestlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
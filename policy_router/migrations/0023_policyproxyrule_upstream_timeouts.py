@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0022_alter_policyrequestlog_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='upstream_connect_timeout',
+            field=models.FloatField(blank=True, help_text='Seconds to wait for a connection to the upstream policy server', null=True),
+        ),
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='upstream_read_timeout',
+            field=models.FloatField(blank=True, help_text='Seconds to wait for the upstream policy server to respond', null=True),
+        ),
+    ]
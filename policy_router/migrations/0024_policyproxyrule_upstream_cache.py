@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0023_policyproxyrule_upstream_timeouts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='upstream_cache_key_params',
+            field=models.CharField(blank=True, help_text='Comma-separated query parameters that identify identical requests', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='upstream_cache_ttl',
+            field=models.PositiveIntegerField(blank=True, help_text='Seconds to reuse an upstream response for identical requests', null=True),
+        ),
+    ]
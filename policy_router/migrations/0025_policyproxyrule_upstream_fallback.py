@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0024_policyproxyrule_upstream_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='upstream_fallback',
+            field=models.CharField(choices=[('error', 'Return an error (502)'), ('continue', 'Fail open: continue'), ('reject', 'Fail closed: reject'), ('next', 'Try the next matching rule')], default='error', help_text='Response when the upstream policy server is unavailable', max_length=10),
+        ),
+    ]
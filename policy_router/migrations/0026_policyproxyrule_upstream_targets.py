@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0025_policyproxyrule_upstream_fallback'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='participant_additional_urls',
+            field=models.JSONField(blank=True, default=list, help_text='More participant policy servers; requests are spread over all targets by the upstream strategy'),
+        ),
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='service_additional_urls',
+            field=models.JSONField(blank=True, default=list, help_text='More service policy servers; requests are spread over all targets by the upstream strategy'),
+        ),
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='upstream_strategy',
+            field=models.CharField(choices=[('failover', 'Failover (primary, then additional in order)'), ('round_robin', 'Round robin'), ('least_outstanding', 'Least outstanding requests'), ('ewma', 'Lowest latency (EWMA)')], default='failover', help_text='How requests are spread over the upstream targets', max_length=20),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0026_policyproxyrule_upstream_targets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpstreamHealth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=255, unique=True)),
+                ('is_up', models.BooleanField(default=True)),
+                ('latency_ms', models.FloatField(blank=True, null=True)),
+                ('status_code', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('consecutive_failures', models.PositiveIntegerField(default=0)),
+                ('checked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:14
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0027_upstreamhealth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='upstream_hedge_percentile',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Send a second upstream request when the first is slower than this latency percentile', null=True, validators=[django.core.validators.MinValueValidator(50), django.core.validators.MaxValueValidator(99)]),
+        ),
+    ]
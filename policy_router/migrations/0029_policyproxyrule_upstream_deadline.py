@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0028_policyproxyrule_upstream_hedge_percentile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policyproxyrule',
+            name='upstream_deadline',
+            field=models.FloatField(blank=True, help_text="Seconds Pexip's request may take in total before the fallback answer is used", null=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from policy_router.migration_operations import AddIndexConcurrently
+
+# The local alias filter uses the local_alias column (0031), so request_path
+# gets no trigram index
+TRIGRAM_INDEXES = {
+    "policylog_source_trgm_idx": "source_host",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # icontains filters can only use an index through pg_trgm; other
+    # databases keep scanning for substring searches.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+            f"ON policy_router_policyrequestlog USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and keeps the
+    # log writer inserting while the indexes are built on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('policy_router', '0029_policyproxyrule_upstream_deadline'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='policyrequestlog',
+            index=models.Index(fields=['created_at', 'id'], name='policylog_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='policyrequestlog',
+            index=models.Index(fields=['rule', 'created_at', 'id'], name='policylog_rule_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='policyrequestlog',
+            index=models.Index(fields=['source_host', 'created_at', 'id'], name='policylog_source_created_idx'),
+        ),
+        # The (rule, created_at) index serves rule_id lookups, so the FK's own index goes
+        migrations.AlterField(
+            model_name='policyrequestlog',
+            name='rule',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='policy_router.policyproxyrule'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:24
+
+from django.db import migrations, models
+
+from policy_router.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('policy_router', '0030_policyrequestlog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policyrequestlog',
+            name='local_alias',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='policyrequestlog',
+            index=models.Index(fields=['local_alias', 'created_at', 'id'], name='policylog_alias_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='policyrequestlog',
+            index=models.Index(fields=['protocol', 'created_at', 'id'], name='policylog_proto_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='policyrequestlog',
+            index=models.Index(fields=['call_direction', 'created_at', 'id'], name='policylog_dir_created_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:52
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0031_policyrequestlog_structured_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='policyproxyrule',
+            name='upstream_connect_timeout',
+            field=models.FloatField(blank=True, help_text='Seconds to wait for a connection to the upstream policy server', null=True, validators=[django.core.validators.MinValueValidator(0.001)]),
+        ),
+        migrations.AlterField(
+            model_name='policyproxyrule',
+            name='upstream_read_timeout',
+            field=models.FloatField(blank=True, help_text='Seconds to wait for the upstream policy server to respond', null=True, validators=[django.core.validators.MinValueValidator(0.001)]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:52
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_router', '0032_upstream_timeouts_positive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='policyproxyrule',
+            name='upstream_deadline',
+            field=models.FloatField(blank=True, help_text="Seconds Pexip's request may take in total before the fallback answer is used", null=True, validators=[django.core.validators.MinValueValidator(0.001)]),
+        ),
+    ]
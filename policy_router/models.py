@@ -1,5 +1,7 @@
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 import json
 import re
 import random
@@ -21,6 +23,25 @@ class PolicyProxyRule(models.Model):
         ("non_dial", "Non Dial"),
     ]
 
+    # How requests are spread over a rule's upstream targets (see policy_router.balancer)
+    STRATEGY_CHOICES = [
+        ("failover", "Failover (primary, then additional in order)"),
+        ("round_robin", "Round robin"),
+        ("least_outstanding", "Least outstanding requests"),
+        ("ewma", "Lowest latency (EWMA)"),
+    ]
+
+    # What to answer when the upstream fails or its circuit breaker is open
+    FALLBACK_CHOICES = [
+        ("error", "Return an error (502)"),
+        ("continue", "Fail open: continue"),
+        ("reject", "Fail closed: reject"),
+        ("next", "Try the next matching rule"),
+    ]
+
+    # Fields written by hot-path usage accounting (see policy_router.usage)
+    USAGE_FIELDS = frozenset({"match_count", "last_matched_at"})
+
     name = models.CharField(max_length=100, help_text="Friendly name for this routing rule")
 
     # Filters
@@ -32,6 +53,22 @@ class PolicyProxyRule(models.Model):
     # Upstream targets
     service_target_url = models.URLField(blank=True, null=True)
     participant_target_url = models.URLField(blank=True, null=True)
+    service_additional_urls = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="More service policy servers; requests are spread over all targets by the upstream strategy",
+    )
+    participant_additional_urls = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="More participant policy servers; requests are spread over all targets by the upstream strategy",
+    )
+    upstream_strategy = models.CharField(
+        max_length=20,
+        choices=STRATEGY_CHOICES,
+        default="failover",
+        help_text="How requests are spread over the upstream targets",
+    )
 
     # Overrides
     always_continue_service = models.BooleanField(default=False, help_text="Always return continue for service policy")
@@ -44,6 +81,55 @@ class PolicyProxyRule(models.Model):
     basic_auth_username = models.CharField(max_length=255, blank=True, null=True)
     basic_auth_password = models.CharField(max_length=255, blank=True, null=True)
 
+    # Upstream timeouts (blank = use the POLICY_UPSTREAM_*_TIMEOUT settings)
+    upstream_connect_timeout = models.FloatField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(0.001)],
+        help_text="Seconds to wait for a connection to the upstream policy server",
+    )
+    upstream_read_timeout = models.FloatField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(0.001)],
+        help_text="Seconds to wait for the upstream policy server to respond",
+    )
+    upstream_deadline = models.FloatField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(0.001)],
+        help_text="Seconds Pexip's request may take in total before the fallback answer is used",
+    )
+
+    # Request hedging (blank = off, see policy_router.hedging)
+    upstream_hedge_percentile = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(50), MaxValueValidator(99)],
+        help_text="Send a second upstream request when the first is slower than this latency percentile",
+    )
+
+    # Response when the upstream fails or its circuit breaker is open
+    upstream_fallback = models.CharField(
+        max_length=10,
+        choices=FALLBACK_CHOICES,
+        default="error",
+        help_text="Response when the upstream policy server is unavailable",
+    )
+
+    # Upstream response cache (blank TTL = every request goes upstream)
+    upstream_cache_ttl = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text="Seconds to reuse an upstream response for identical requests",
+    )
+    upstream_cache_key_params = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+        help_text="Comma-separated query parameters that identify identical requests",
+    )
+
     # Management
     priority = models.IntegerField(default=100, help_text="Lower numbers match first")
     is_active = models.BooleanField(default=True)
@@ -169,13 +255,30 @@ class PolicyProxyRule(models.Model):
             self.source_match = None
 
     def save(self, *args, **kwargs):
-        self.full_clean()
+        # Usage counters never affect routing, so a counter-only save skips
+        # the (O(N) overlap-scanning) validation in clean().
+        update_fields = kwargs.get("update_fields")
+        if not (update_fields and set(update_fields) <= self.USAGE_FIELDS):
+            self.full_clean()
         super().save(*args, **kwargs)
 
 
+class RuleTableVersion(models.Model):
+    """Single-row version stamp bumped whenever the policy rules change.
+
+    Every worker process compares this against the version of its in-memory
+    compiled rule table (see ``policy_router.rule_table``) and rebuilds when
+    they differ.
+    """
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Rule table v{self.version}"
+
 
 class PolicyRequestLog(models.Model):
-    rule = models.ForeignKey(PolicyProxyRule, on_delete=models.SET_NULL, null=True, blank=True)
+    # Indexed by policylog_rule_created_idx (see Meta), which also serves rule lookups
+    rule = models.ForeignKey(PolicyProxyRule, on_delete=models.SET_NULL, null=True, blank=True, db_index=False)
     request_method = models.CharField(max_length=10)
     request_path = models.TextField()
     request_params = models.JSONField(null=True, blank=True)
@@ -211,8 +314,63 @@ class PolicyRequestLog(models.Model):
         null=True,
         help_text="Source IP or FQDN of the requesting Infinity node",
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    local_alias = models.CharField(max_length=255, blank=True, null=True)
+    # Set when the request is handled, not when the (batched) insert happens
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        # The log list always orders by (-created_at, -id), newest first, and
+        # pages by that key; each index ends in it so a filtered page is read
+        # in order from the cursor without sorting. On PostgreSQL, migration
+        # 0030 also adds a trigram GIN index for the substring (icontains)
+        # filter on source_host.
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="policylog_created_idx"),
+            models.Index(fields=["rule", "created_at", "id"], name="policylog_rule_created_idx"),
+            models.Index(fields=["source_host", "created_at", "id"], name="policylog_source_created_idx"),
+            models.Index(fields=["local_alias", "created_at", "id"], name="policylog_alias_created_idx"),
+            models.Index(fields=["protocol", "created_at", "id"], name="policylog_proto_created_idx"),
+            models.Index(fields=["call_direction", "created_at", "id"], name="policylog_dir_created_idx"),
+        ]
+
+    # Request parameters copied into their own indexed columns at log time
+    STRUCTURED_PARAMS = ("local_alias", "protocol", "call_direction")
+
+    @classmethod
+    def structured_fields(cls, params):
+        """Column values for STRUCTURED_PARAMS taken from request ``params``.
+
+        Values are clipped to the column length: a batched insert fails as a
+        whole, so one oversized parameter must not lose its neighbours.
+        """
+        params = params or {}
+        fields = {}
+        for name in cls.STRUCTURED_PARAMS:
+            value = params.get(name)
+            if isinstance(value, str) and value:
+                fields[name] = value[:cls._meta.get_field(name).max_length]
+            else:
+                fields[name] = None
+        return fields
 
     def __str__(self):
         return f"[{self.created_at}] {self.request_method} {self.request_path}"
 
+
+
+class UpstreamHealth(models.Model):
+    """Latest active health check result for one upstream origin.
+
+    Written by the background checker in ``policy_router.health`` and shown
+    on the rules list.
+    """
+    origin = models.CharField(max_length=255, unique=True)
+    is_up = models.BooleanField(default=True)
+    latency_ms = models.FloatField(null=True, blank=True)
+    status_code = models.PositiveIntegerField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True, default="")
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    checked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.origin} ({'up' if self.is_up else 'down'})"
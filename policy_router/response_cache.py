@@ -0,0 +1,109 @@
+"""
+Opt-in cache of upstream policy responses.
+
+Pexip frequently repeats the same policy question within seconds (retries,
+several Conferencing Nodes, participant re-queries). A rule with
+``upstream_cache_ttl`` set reuses the upstream answer for identical requests
+instead of making another round trip. Requests are identical when they come
+from the same caller (Authorization header, which is forwarded upstream) and
+agree on every query parameter, or only on the rule's
+``upstream_cache_key_params`` when it names them. Participant requests to one
+alias differ in remote_alias, participant_uuid and so on, and by default each
+gets its own answer.
+
+Only 200 responses are cached for the full TTL; 404s are cached for at most
+``POLICY_UPSTREAM_CACHE_NEGATIVE_TTL`` seconds. The cache is per worker
+process, bounded by ``POLICY_UPSTREAM_CACHE_MAX_ENTRIES`` (least recently used
+entries are evicted first) and cleared whenever the rule table is rebuilt, so
+rule edits take effect immediately.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.utils.crypto import salted_hmac
+
+from .rule_table import rule_table_rebuilt
+
+_entries = OrderedDict()  # key -> (httpx.Response, expires_at)
+_lock = threading.Lock()
+_stats = {"hits": 0, "negative_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def cache_key(rule, kind, params, identity=None):
+    """Normalised key for a request's query parameters (a QueryDict) and caller.
+
+    ``identity`` is the Authorization header; only an HMAC of it is kept.
+    """
+    names = rule.cache_key_params or sorted(params.keys())
+    caller = salted_hmac("policy_router.response_cache.caller", identity).hexdigest() if identity else None
+    return (
+        rule.id,
+        kind,
+        caller,
+        tuple((name, tuple(v.strip() for v in params.getlist(name))) for name in names),
+    )
+
+
+def lookup(rule, kind, params, identity=None):
+    """Return the cached upstream response for this request, or None."""
+    if not rule.cache_ttl:
+        return None
+    key = cache_key(rule, kind, params, identity)
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[1] <= now:
+            del _entries[key]
+            entry = None
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        response = entry[0]
+        _stats["negative_hits" if response.status_code == 404 else "hits"] += 1
+        return response
+
+
+def store(rule, kind, params, response, identity=None):
+    """Remember a 200 (or, briefly, a 404) upstream response."""
+    ttl = rule.cache_ttl
+    if not ttl:
+        return
+    if response.status_code == 404:
+        ttl = min(ttl, getattr(settings, "POLICY_UPSTREAM_CACHE_NEGATIVE_TTL", 5))
+    elif response.status_code != 200:
+        return
+    if ttl <= 0:
+        return
+
+    key = cache_key(rule, kind, params, identity)
+    max_entries = getattr(settings, "POLICY_UPSTREAM_CACHE_MAX_ENTRIES", 10000)
+    with _lock:
+        _entries[key] = (response, time.monotonic() + ttl)
+        _entries.move_to_end(key)
+        _stats["stores"] += 1
+        while len(_entries) > max_entries:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def stats():
+    """Hit/miss counters for this process, plus the current entry count."""
+    with _lock:
+        return dict(_stats, entries=len(_entries))
+
+
+def clear(reset_stats=False):
+    with _lock:
+        _entries.clear()
+        if reset_stats:
+            for name in _stats:
+                _stats[name] = 0
+
+
+@receiver(rule_table_rebuilt)
+def _clear_on_rebuild(sender, table, **kwargs):
+    clear()
@@ -0,0 +1,456 @@
+"""
+In-process compiled rule table for the policy endpoints.
+
+The policy views used to query ``PolicyProxyRule`` and run ``re.search`` on the
+raw regex strings for every Pexip request. Instead, each worker process keeps
+an immutable ``RuleTable`` built from the active rules, with patterns
+pre-compiled and protocol/direction/source filters pre-normalised.
+
+The table is rebuilt only when the shared ``RuleTableVersion`` stamp changes.
+The stamp is bumped by the rule signals (save/delete) and explicitly by bulk
+updates such as drag-and-drop reordering, so every worker notices a change
+with one cheap primary-key lookup, at most once per
+``POLICY_RULE_TABLE_CHECK_INTERVAL`` seconds.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Sent with ``table=`` whenever a worker swaps in a freshly built RuleTable.
+rule_table_rebuilt = Signal()
+
+DEFAULT_CHECK_INTERVAL = 1.0  # seconds
+
+_REGEX_META = frozenset(".^$*+?{}[]()|\\")
+
+_table = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+DEFAULT_OVERRIDE_RESPONSE = {"status": "success", "action": "continue"}
+
+
+@dataclass(frozen=True)
+class StaticResponse:
+    """Pre-encoded JSON body an override rule answers with."""
+    body: bytes
+    text: str  # same JSON as str, for the request log
+    content_length: str
+
+    @classmethod
+    def encode(cls, data):
+        # Same encoder and separators as JsonResponse, so clients see identical bytes.
+        text = json.dumps(data or DEFAULT_OVERRIDE_RESPONSE, cls=DjangoJSONEncoder)
+        body = text.encode("utf-8")
+        return cls(body=body, text=text, content_length=str(len(body)))
+
+
+# Answers for the "continue" / "reject" upstream fallbacks
+FALLBACK_RESPONSES = {
+    "continue": StaticResponse.encode({"status": "success", "action": "continue"}),
+    "reject": StaticResponse.encode({"status": "success", "action": "reject"}),
+}
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """Read-only snapshot of a PolicyProxyRule, ready for matching."""
+    id: int
+    name: str
+    priority: int
+    pattern: re.Pattern
+    protocols: frozenset
+    call_directions: frozenset
+    source_match: str | None
+    service_target_url: str | None
+    participant_target_url: str | None
+    always_continue_service: bool
+    override_service_response: dict | None
+    always_continue_participant: bool
+    override_participant_response: dict | None
+    basic_auth: tuple | None
+    connect_timeout: float | None
+    read_timeout: float | None
+    prefix: str = ""  # literal text every match must start with ("" = unknown)
+    service_override: StaticResponse | None = None
+    participant_override: StaticResponse | None = None
+    cache_ttl: int | None = None  # upstream response cache (see response_cache.py)
+    cache_key_params: tuple = ()  # () = every query parameter
+    fallback: str = "error"  # when the upstream is unavailable: error/continue/reject/next
+    service_target_urls: tuple = ()  # primary target first, then the additional ones
+    participant_target_urls: tuple = ()
+    upstream_strategy: str = "failover"  # see balancer.py
+    hedge_percentile: int | None = None  # see hedging.py
+    deadline: float | None = None  # None = POLICY_REQUEST_DEADLINE (see deadline.py)
+
+    @classmethod
+    def from_model(cls, rule):
+        """Compile a model instance. Raises re.error for an invalid regex."""
+        source = (rule.source_match or "").strip().lower()
+        if source in ("none", "null"):
+            source = ""
+        return cls(
+            id=rule.id,
+            name=rule.name,
+            priority=rule.priority,
+            pattern=re.compile(rule.regex),
+            protocols=frozenset(rule.protocols or []),
+            call_directions=frozenset(rule.call_directions or []),
+            source_match=source or None,
+            service_target_url=(rule.service_target_url or "").rstrip("/") or None,
+            participant_target_url=(rule.participant_target_url or "").rstrip("/") or None,
+            always_continue_service=rule.always_continue_service,
+            override_service_response=rule.override_service_response,
+            always_continue_participant=rule.always_continue_participant,
+            override_participant_response=rule.override_participant_response,
+            basic_auth=(
+                (rule.basic_auth_username, rule.basic_auth_password)
+                if rule.basic_auth_username and rule.basic_auth_password
+                else None
+            ),
+            connect_timeout=rule.upstream_connect_timeout,
+            read_timeout=rule.upstream_read_timeout,
+            deadline=rule.upstream_deadline or None,
+            prefix=literal_prefix(rule.regex),
+            service_override=(
+                StaticResponse.encode(rule.override_service_response)
+                if rule.always_continue_service
+                else None
+            ),
+            participant_override=(
+                StaticResponse.encode(rule.override_participant_response)
+                if rule.always_continue_participant
+                else None
+            ),
+            fallback=rule.upstream_fallback or "error",
+            service_target_urls=_target_urls(rule.service_target_url, rule.service_additional_urls),
+            participant_target_urls=_target_urls(rule.participant_target_url, rule.participant_additional_urls),
+            upstream_strategy=rule.upstream_strategy or "failover",
+            hedge_percentile=rule.upstream_hedge_percentile or None,
+            cache_ttl=rule.upstream_cache_ttl or None,
+            cache_key_params=tuple(sorted({
+                name.strip() for name in (rule.upstream_cache_key_params or "").split(",") if name.strip()
+            })),
+        )
+
+    def target_urls(self, kind):
+        """Upstream targets for "service" / "participant" (primary first)."""
+        return self.service_target_urls if kind == "service" else self.participant_target_urls
+
+    def override_for(self, kind):
+        """Pre-encoded override for "service" / "participant", or None if the rule proxies."""
+        return self.service_override if kind == "service" else self.participant_override
+
+    def matches(self, local_alias, protocol=None, call_direction=None, client_ip=None, client_host=None):
+        """Apply the alias, protocol, call direction and source filters."""
+        if not self.pattern.search(local_alias or ""):
+            return False
+        if self.protocols and protocol and protocol not in self.protocols:
+            return False
+        if self.call_directions and call_direction and call_direction not in self.call_directions:
+            return False
+        if self.source_match and not source_matches(self.source_match, client_ip, client_host):
+            return False
+        return True
+
+
+def _target_urls(primary, additional):
+    urls = []
+    for url in [primary, *(additional or [])]:
+        url = (url or "").strip().rstrip("/")
+        if url and url not in urls:
+            urls.append(url)
+    return tuple(urls)
+
+
+def source_matches(source, client_ip, client_host):
+    """True if a normalised source_match selects this client IP or host."""
+    return (
+        client_ip == source
+        or client_host == source
+        or (source in (client_ip or ""))
+        or (source in (client_host or ""))
+    )
+
+
+def _has_top_level_alternation(pattern):
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            in_class = True
+            if pattern[i + 1:i + 2] == "]":
+                i += 1  # "[]...]": a leading ] is a literal
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def literal_prefix(pattern):
+    """Return the literal text any match of a ``^``-anchored pattern starts with.
+
+    Conservative: stops at the first metacharacter, and drops a literal that
+    is made optional by a following ``?``, ``*`` or ``{``. Returns "" when no
+    prefix can be proven (unanchored patterns, top-level alternation, ...).
+    """
+    if not pattern.startswith("^") or _has_top_level_alternation(pattern):
+        return ""
+
+    prefix = []
+    i = 1
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            escaped = pattern[i + 1:i + 2]
+            if not escaped or escaped.isalnum():
+                break  # \d, \w, backreferences, ...
+            literal, step = escaped, 2
+        elif c in _REGEX_META:
+            break
+        else:
+            literal, step = c, 1
+
+        following = pattern[i + step:i + step + 1]
+        if following in ("?", "*", "{"):
+            break
+        prefix.append(literal)
+        if following == "+":
+            break
+        i += step
+    return "".join(prefix)
+
+
+def _positions(mask):
+    """Set bit positions of ``mask``, lowest (= highest priority) first."""
+    positions = []
+    while mask:
+        low = mask & -mask
+        positions.append(low.bit_length() - 1)
+        mask ^= low
+    return positions
+
+
+class RuleTable:
+    """Immutable, priority-ordered collection of compiled active rules.
+
+    Each rule is a bit (its priority position) in a set of index masks:
+
+    * alias: rules anchored with a literal prefix (``^room-\\d+``) are keyed
+      by that prefix; rules with no provable prefix are always candidates.
+    * protocol / call_direction: one mask per value, each including the
+      wildcard rules (empty list). A request without the attribute skips it.
+    * source: one mask per distinct ``source_match`` plus the wildcard mask
+      for rules with no source.
+
+    A lookup ANDs the masks and only runs the regexes of the surviving rules,
+    in priority order. The result is identical to a linear scan.
+    """
+
+    def __init__(self, rules, version, indexed=True):
+        self.rules = tuple(rules)
+        self.version = version
+        self.indexed = indexed
+        self._all = (1 << len(self.rules)) - 1
+
+        by_prefix = {}
+        unprefixed = 0
+        any_protocol = any_direction = any_source = 0
+        by_protocol, by_direction, by_source = {}, {}, {}
+        for position, rule in enumerate(self.rules):
+            bit = 1 << position
+            if rule.prefix:
+                by_prefix[rule.prefix] = by_prefix.get(rule.prefix, 0) | bit
+            else:
+                unprefixed |= bit
+            if rule.protocols:
+                for protocol in rule.protocols:
+                    by_protocol[protocol] = by_protocol.get(protocol, 0) | bit
+            else:
+                any_protocol |= bit
+            if rule.call_directions:
+                for direction in rule.call_directions:
+                    by_direction[direction] = by_direction.get(direction, 0) | bit
+            else:
+                any_direction |= bit
+            if rule.source_match:
+                by_source[rule.source_match] = by_source.get(rule.source_match, 0) | bit
+            else:
+                any_source |= bit
+
+        self._by_prefix = by_prefix
+        self._prefix_lengths = tuple(sorted({len(prefix) for prefix in by_prefix}))
+        self._unprefixed = unprefixed
+        self._any_protocol = any_protocol
+        self._by_protocol = {k: v | any_protocol for k, v in by_protocol.items()}
+        self._any_direction = any_direction
+        self._by_direction = {k: v | any_direction for k, v in by_direction.items()}
+        self._any_source = any_source
+        self._by_source = by_source
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _alias_mask(self, local_alias):
+        if not self._by_prefix:
+            return self._all
+        alias = local_alias or ""
+        mask = self._unprefixed
+        for length in self._prefix_lengths:
+            if length > len(alias):
+                break
+            mask |= self._by_prefix.get(alias[:length], 0)
+        return mask
+
+    def _source_mask(self, client_ip, client_host):
+        mask = self._any_source
+        for source, bits in self._by_source.items():
+            if source_matches(source, client_ip, client_host):
+                mask |= bits
+        return mask
+
+    def candidates(self, local_alias, protocol=None, call_direction=None, client_ip=None, client_host=None):
+        """Positions of rules that could match the request, in priority order.
+
+        Every filter except the regex itself is already satisfied by the
+        returned rules.
+        """
+        if not self.indexed:
+            return range(len(self.rules))
+
+        mask = self._alias_mask(local_alias)
+        if protocol:
+            mask &= self._by_protocol.get(protocol, self._any_protocol)
+        if call_direction:
+            mask &= self._by_direction.get(call_direction, self._any_direction)
+        if mask:
+            mask &= self._source_mask(client_ip, client_host)
+        return _positions(mask)
+
+    def match(self, local_alias, protocol=None, call_direction=None, client_ip=None, client_host=None):
+        """Yield every matching rule in priority order."""
+        rules = self.rules
+        if not self.indexed:
+            for rule in rules:
+                if rule.matches(local_alias, protocol, call_direction, client_ip, client_host):
+                    yield rule
+            return
+
+        alias = local_alias or ""
+        for position in self.candidates(local_alias, protocol, call_direction, client_ip, client_host):
+            rule = rules[position]
+            if rule.pattern.search(alias):
+                yield rule
+
+
+# -----------------------------
+# Version stamp
+# -----------------------------
+def current_version():
+    """Return the shared rule table version stamp (0 if never bumped)."""
+    from .models import RuleTableVersion
+
+    return RuleTableVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+
+def bump_rule_table_version():
+    """Mark the rule table stale in every worker process."""
+    from .models import RuleTableVersion
+
+    updated = RuleTableVersion.objects.filter(pk=1).update(version=F("version") + 1)
+    if not updated:
+        RuleTableVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+
+    # Drop our own copy now, and again once the change is visible to other
+    # connections, so a concurrent rebuild can't pin pre-commit rules.
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def invalidate():
+    """Discard this process' compiled table; the next lookup rebuilds it."""
+    global _table, _checked_at
+    _table = None
+    _checked_at = 0.0
+
+
+# -----------------------------
+# Build / lookup
+# -----------------------------
+def build_rule_table(version=None):
+    """Compile all active rules into a new RuleTable."""
+    from .models import PolicyProxyRule
+
+    if version is None:
+        version = current_version()
+
+    compiled = []
+    rules = PolicyProxyRule.objects.filter(is_active=True).order_by("priority", "-updated_at")
+    for rule in rules:
+        try:
+            compiled.append(CompiledRule.from_model(rule))
+        except re.error as e:
+            logger.error(f"Regex error in rule {rule.name}: {e}")
+
+    logger.debug(f"Compiled rule table v{version} with {len(compiled)} rules")
+    return RuleTable(compiled, version)
+
+
+def get_rule_table():
+    """Return the current compiled rule table, rebuilding it if stale."""
+    global _table, _checked_at
+
+    interval = getattr(settings, "POLICY_RULE_TABLE_CHECK_INTERVAL", DEFAULT_CHECK_INTERVAL)
+    now = time.monotonic()
+    table = _table
+    if table is not None and now - _checked_at < interval:
+        return table
+
+    version = current_version()
+    if table is not None and table.version == version:
+        _checked_at = now
+        return table
+
+    rebuilt = None
+    with _lock:
+        if _table is None or _table.version != version:
+            _table = rebuilt = build_rule_table(version)
+        _checked_at = now
+        table = _table
+
+    if rebuilt is not None:
+        rule_table_rebuilt.send(sender=RuleTable, table=rebuilt)
+    return table
+
+
+async def aget_rule_table():
+    """Async get_rule_table: no thread hop unless a version check is due."""
+    interval = getattr(settings, "POLICY_RULE_TABLE_CHECK_INTERVAL", DEFAULT_CHECK_INTERVAL)
+    table = _table
+    if table is not None and time.monotonic() - _checked_at < interval:
+        return table
+    return await sync_to_async(get_rule_table)()
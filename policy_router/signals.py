@@ -0,0 +1,29 @@
+# policy_router/signals.py
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import forget_user
+from .models import PolicyProxyRule
+from .rule_table import bump_rule_table_version
+
+
+@receiver(post_save, sender=PolicyProxyRule)
+def rule_saved(sender, instance, update_fields=None, **kwargs):
+    # Usage counters change on every matched request and never affect routing.
+    if update_fields and set(update_fields) <= PolicyProxyRule.USAGE_FIELDS:
+        return
+    bump_rule_table_version()
+
+
+@receiver(post_delete, sender=PolicyProxyRule)
+def rule_deleted(sender, instance, **kwargs):
+    bump_rule_table_version()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def policy_user_changed(sender, instance, **kwargs):
+    # Password and is_active changes both go through save(); drop any cached
+    # Basic-Auth verification for this user.
+    forget_user(instance.pk)
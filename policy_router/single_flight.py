@@ -0,0 +1,138 @@
+"""
+Single-flight coalescing of identical concurrent upstream policy calls.
+
+When a large meeting starts, many participant requests for the same alias
+arrive together. Instead of each one calling the upstream, the first caller
+for a key (the leader) makes the call and every concurrent caller with the
+same key waits for, and shares, its response or exception.
+
+Requests are identical when they share a response cache key (see
+``response_cache.cache_key``): same caller, and the same query parameters or
+the rule's explicit ``upstream_cache_key_params``.
+Coalescing applies to rules with an upstream cache TTL and to every
+proxying rule when ``POLICY_UPSTREAM_SINGLE_FLIGHT`` is on.
+
+Sync callers (threads) and async callers (per event loop) are coalesced
+separately. A caller with a request deadline (see deadline.py) stops waiting
+for the leader with DeadlineExceeded once it is spent.
+"""
+import asyncio
+import threading
+import weakref
+
+from django.conf import settings
+
+from .deadline import DeadlineExceeded
+from .response_cache import cache_key
+
+_calls = {}  # key -> _Call
+_async_calls = weakref.WeakKeyDictionary()  # event loop -> {key: asyncio.Future}
+_lock = threading.Lock()
+_stats = {"leaders": 0, "coalesced": 0}
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def key_for(rule, kind, params, identity=None):
+    """Coalescing key for a request, or None if it must go upstream on its own.
+
+    ``identity`` is the caller's credentials (the Authorization header), which
+    are forwarded upstream and may change its answer.
+    """
+    if not (rule.cache_ttl or getattr(settings, "POLICY_UPSTREAM_SINGLE_FLIGHT", False)):
+        return None
+    return cache_key(rule, kind, params, identity)
+
+
+def do(key, fn, deadline=None):
+    """Run ``fn()`` once for all concurrent callers with the same ``key``."""
+    if key is None:
+        return fn()
+
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+            _stats["leaders"] += 1
+        else:
+            _stats["coalesced"] += 1
+
+    if not leader:
+        if not call.done.wait(deadline.cap(None) if deadline is not None else None):
+            raise DeadlineExceeded("Request deadline reached waiting for a coalesced upstream call")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fn()
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _calls[key]
+        call.done.set()
+
+
+async def ado(key, fn, deadline=None):
+    """Async do(): ``fn`` is a coroutine function awaited once per key.
+
+    The call runs in its own task, so cancelling the caller that started it
+    (Django cancels a view whose client disconnected) leaves it running for
+    the callers still waiting on it.
+    """
+    if key is None:
+        return await fn()
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        calls = _async_calls.setdefault(loop, {})
+        task = calls.get(key)
+        leader = task is None
+        if leader:
+            task = calls[key] = loop.create_task(fn())
+            task.add_done_callback(lambda done: _async_call_done(calls, key, done))
+            _stats["leaders"] += 1
+        else:
+            _stats["coalesced"] += 1
+
+    if leader:
+        # fn() already stops at the deadline; shield() keeps a cancelled leader from cancelling it
+        return await asyncio.shield(task)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), deadline.cap(None) if deadline is not None else None)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Request deadline reached waiting for a coalesced upstream call") from None
+
+
+def _async_call_done(calls, key, task):
+    with _lock:
+        if calls.get(key) is task:
+            del calls[key]
+    if not task.cancelled():
+        # Retrieved here so a failure nobody waited for isn't reported as "never retrieved"
+        task.exception()
+
+
+def stats():
+    with _lock:
+        return dict(_stats, in_flight=len(_calls) + sum(len(c) for c in _async_calls.values()))
+
+
+def reset():
+    """Forget in-flight bookkeeping and counters (tests)."""
+    with _lock:
+        _calls.clear()
+        _async_calls.clear()
+        for name in _stats:
+            _stats[name] = 0
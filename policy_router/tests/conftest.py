@@ -0,0 +1,90 @@
+# policy_router/tests/conftest.py
+from unittest import mock
+
+import httpx
+import pytest
+
+from policy_router import auth, balancer, circuit_breaker, health, hedging, log_pagination, log_sink, metrics, response_cache, rule_table, single_flight, upstream, usage
+from policy_router.models import PolicyProxyRule
+from policy_router.rule_table import CompiledRule
+
+
+@pytest.fixture(autouse=True)
+def reset_policy_state(settings):
+    """Drop per-process hot-path caches so tests never see another test's rules."""
+    # Write logs inline so tests can assert on them without a writer thread
+    settings.POLICY_LOG_SINK = "policy_router.log_sink.SyncLogSink"
+    # No background probes; tests call health.check_all() themselves
+    settings.POLICY_HEALTH_CHECK_INTERVAL = 0
+    rule_table.invalidate()
+    usage.reset()
+    log_sink.reset_log_sink()
+    upstream.close_all()
+    auth.clear_auth_cache()
+    response_cache.clear(reset_stats=True)
+    single_flight.reset()
+    circuit_breaker.reset()
+    balancer.reset()
+    health.reset()
+    hedging.reset()
+    metrics.reset()
+    log_pagination.reset()
+    yield
+    rule_table.invalidate()
+    usage.reset()
+    log_sink.reset_log_sink()
+    upstream.close_all()
+    auth.clear_auth_cache()
+    response_cache.clear(reset_stats=True)
+    single_flight.reset()
+    circuit_breaker.reset()
+    balancer.reset()
+    health.reset()
+    hedging.reset()
+    metrics.reset()
+    log_pagination.reset()
+
+
+@pytest.fixture
+def compiled():
+    """Build a CompiledRule from unsaved model fields; by default rule 1, "room", matching room-<n>."""
+    def compile_rule(**fields):
+        fields = {"id": 1, "name": "room", "regex": r"^room-\d+$", **fields}
+        return CompiledRule.from_model(PolicyProxyRule(**fields))
+    return compile_rule
+
+
+@pytest.fixture
+def upstream_origins():
+    """Origins the pooled upstream clients were built for (with ``upstream_calls``)."""
+    return []
+
+
+@pytest.fixture
+def upstream_calls(upstream_origins):
+    """Route pooled clients to an in-memory transport and record requests.
+
+    Aliases starting with "missing" get a 404; everything else a continue
+    answer naming the upstream host and the call number.
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if request.url.params.get("local_alias", "").startswith("missing"):
+            return httpx.Response(404, json={"error": "not found"})
+        return httpx.Response(
+            200, json={"status": "success", "action": "continue", "host": request.url.host, "call": len(calls)}
+        )
+
+    def build_client(origin):
+        upstream_origins.append(origin)
+        return httpx.Client(transport=httpx.MockTransport(handler))
+
+    def build_async_client(origin):
+        upstream_origins.append(origin)
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    with mock.patch.object(upstream, "build_client", side_effect=build_client), \
+            mock.patch.object(upstream, "build_async_client", side_effect=build_async_client):
+        yield calls
@@ -0,0 +1,88 @@
+"""
+Run: pytest -v policy_router/tests/test_async_views.py
+"""
+import base64
+import json
+from unittest import mock
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+
+from policy_router import upstream
+from policy_router.models import PolicyProxyRule, PolicyRequestLog
+from policy_router.views import proxy_participant_policy_async, proxy_service_policy_async
+
+
+@pytest.mark.django_db
+class TestAsyncPolicyViews:
+    def make_request(self, path="/policy/v1/service/configuration", local_alias="room-1", **extra):
+        return RequestFactory().get(path, {"local_alias": local_alias, "protocol": "sip"}, REMOTE_ADDR="10.0.0.10", **extra)
+
+    def test_override_rule(self, db):
+        PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            always_continue_participant=True,
+            override_participant_response={"action": "async-override"},
+        )
+        response = async_to_sync(proxy_participant_policy_async)(
+            self.make_request("/policy/v1/participant/properties")
+        )
+        assert response.status_code == 200
+        assert json.loads(response.content)["action"] == "async-override"
+        assert PolicyRequestLog.objects.get().is_override
+
+    def test_upstream_via_async_client(self, db):
+        seen = []
+
+        async def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json={"status": "success", "action": "reject"})
+
+        PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            service_target_url="https://policy-a.example.com",
+            basic_auth_username="pexip",
+            basic_auth_password="secret",
+        )
+        with mock.patch.object(
+            upstream,
+            "build_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        ):
+            response = async_to_sync(proxy_service_policy_async)(self.make_request())
+
+        assert json.loads(response.content)["action"] == "reject"
+        assert seen[0].url.path == "/policy/v1/service/configuration"
+        assert seen[0].headers["authorization"].startswith("Basic ")
+
+    def test_no_match_returns_404(self, db):
+        response = async_to_sync(proxy_service_policy_async)(self.make_request(local_alias="nope"))
+        assert response.status_code == 404
+
+    def test_rejects_non_get(self, db):
+        request = RequestFactory().post("/policy/v1/service/configuration")
+        assert async_to_sync(proxy_service_policy_async)(request).status_code == 405
+
+    def test_basic_auth(self, db, settings):
+        settings.ENABLE_POLICY_AUTH = True
+        settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+        User.objects.create_user("node", password="s3cret")
+        PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            always_continue_service=True,
+            override_service_response={"action": "continue"},
+        )
+
+        assert async_to_sync(proxy_service_policy_async)(self.make_request()).status_code == 401
+
+        token = base64.b64encode(b"node:s3cret").decode()
+        response = async_to_sync(proxy_service_policy_async)(
+            self.make_request(HTTP_AUTHORIZATION=f"Basic {token}")
+        )
+        assert response.status_code == 200
@@ -0,0 +1,97 @@
+"""
+Run: pytest -v policy_router/tests/test_auth_cache.py
+"""
+import base64
+from unittest import mock
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+
+from policy_router import auth
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_service_policy, proxy_service_policy_async
+
+
+def basic(username, password):
+    return "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()
+
+
+@pytest.mark.django_db
+class TestBasicAuthCache:
+    @pytest.fixture(autouse=True)
+    def policy_auth(self, db, settings):
+        settings.ENABLE_POLICY_AUTH = True
+        settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]  # keep tests fast
+        self.user = User.objects.create_user("node", password="s3cret")
+        PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            always_continue_service=True,
+            override_service_response={"action": "continue"},
+        )
+
+    def call(self, header, view=proxy_service_policy):
+        request = RequestFactory().get(
+            "/policy/v1/service/configuration", {"local_alias": "room-1"}, HTTP_AUTHORIZATION=header
+        )
+        if view is proxy_service_policy_async:
+            return async_to_sync(view)(request)
+        return view(request)
+
+    def test_repeat_calls_skip_password_hash(self):
+        with mock.patch.object(auth, "authenticate", wraps=auth.authenticate) as authenticate:
+            for _ in range(3):
+                assert self.call(basic("node", "s3cret")).status_code == 200
+        assert authenticate.call_count == 1
+
+    def test_async_view_uses_cache(self):
+        assert self.call(basic("node", "s3cret")).status_code == 200
+        with mock.patch.object(auth, "aauthenticate") as aauthenticate:
+            assert self.call(basic("node", "s3cret"), proxy_service_policy_async).status_code == 200
+        aauthenticate.assert_not_called()
+
+    def test_failures_are_not_cached(self):
+        with mock.patch.object(auth, "authenticate", wraps=auth.authenticate) as authenticate:
+            assert self.call(basic("node", "wrong")).status_code == 401
+            assert self.call(basic("node", "wrong")).status_code == 401
+        assert authenticate.call_count == 2
+
+    def test_password_change_invalidates(self):
+        assert self.call(basic("node", "s3cret")).status_code == 200
+        self.user.set_password("rotated")
+        self.user.save()
+        assert self.call(basic("node", "s3cret")).status_code == 401
+        assert self.call(basic("node", "rotated")).status_code == 200
+
+    def test_deactivation_invalidates(self):
+        assert self.call(basic("node", "s3cret")).status_code == 200
+        self.user.is_active = False
+        self.user.save()
+        assert self.call(basic("node", "s3cret")).status_code == 401
+
+    def test_ttl_expiry(self, settings):
+        settings.POLICY_AUTH_CACHE_TTL = 30
+        with mock.patch.object(auth, "authenticate", wraps=auth.authenticate) as authenticate:
+            self.call(basic("node", "s3cret"))
+            with mock.patch.object(auth.time, "monotonic", return_value=auth.time.monotonic() + 31):
+                self.call(basic("node", "s3cret"))
+        assert authenticate.call_count == 2
+
+    def test_max_size_evicts_least_recently_used(self, settings):
+        settings.POLICY_AUTH_CACHE_MAX_SIZE = 2
+        User.objects.create_user("node2", password="pw2")
+        User.objects.create_user("node3", password="pw3")
+        self.call(basic("node", "s3cret"))
+        self.call(basic("node2", "pw2"))
+        self.call(basic("node", "s3cret"))  # refresh
+        self.call(basic("node3", "pw3"))
+
+        assert len(auth._verified) == 2
+        assert auth._cache_key(basic("node2", "pw2")) not in auth._verified
+        assert auth._cache_key(basic("node", "s3cret")) in auth._verified
+
+    def test_cache_keys_are_not_raw_credentials(self):
+        self.call(basic("node", "s3cret"))
+        assert basic("node", "s3cret") not in auth._verified
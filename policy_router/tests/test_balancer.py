@@ -0,0 +1,133 @@
+"""
+Run: pytest -v policy_router/tests/test_balancer.py
+"""
+import json
+from unittest import mock
+
+import httpx
+import pytest
+from django.core.exceptions import ValidationError
+from django.test import RequestFactory
+
+from policy_router import balancer, circuit_breaker, upstream
+from policy_router.forms import PolicyProxyRuleForm
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_service_policy
+
+A, B, C = "https://a.example.com", "https://b.example.com", "https://c.example.com"
+
+
+@pytest.fixture
+def pool(compiled):
+    """A rule spreading service requests over A, B and C with ``strategy``."""
+    def make(strategy, rule_id=1):
+        return compiled(
+            id=rule_id,
+            name="pool",
+            service_target_url=A + "/",
+            service_additional_urls=[B, C, A],
+            upstream_strategy=strategy,
+        )
+    return make
+
+
+class TestTargetOrder:
+    def test_targets_are_normalised_and_deduplicated(self, pool):
+        assert pool("failover").target_urls("service") == (A, B, C)
+        assert pool("failover").target_urls("participant") == ()
+
+    def test_failover_keeps_configured_order(self, pool):
+        rule = pool("failover")
+        assert balancer.order(rule, "service") == [A, B, C]
+        assert balancer.order(rule, "service") == [A, B, C]
+
+    def test_round_robin_rotates_per_rule(self, pool):
+        rule = pool("round_robin")
+        firsts = [balancer.order(rule, "service")[0] for _ in range(4)]
+        assert firsts == [A, B, C, A]
+        assert balancer.order(pool("round_robin", rule_id=2), "service")[0] == A
+
+    def test_least_outstanding(self, pool):
+        rule = pool("least_outstanding")
+        with balancer.track(A), balancer.track(A), balancer.track(B):
+            assert balancer.order(rule, "service") == [C, B, A]
+        assert balancer.snapshot()[A]["outstanding"] == 0
+
+    def test_ewma_prefers_fast_and_unmeasured_targets(self, pool):
+        rule = pool("ewma")
+        for url, seconds in ((A, 0.5), (B, 0.1)):
+            with mock.patch("policy_router.balancer.time.monotonic", side_effect=[0.0, seconds]):
+                with balancer.track(url):
+                    pass
+        assert balancer.order(rule, "service") == [C, B, A]
+        assert balancer.snapshot()[B]["ewma_ms"] == 100.0
+
+    def test_open_breakers_go_last(self, pool):
+        for _ in range(5):
+            circuit_breaker.record(A, failed=True)
+        assert balancer.order(pool("failover"), "service") == [B, C, A]
+
+
+@pytest.mark.django_db
+class TestUpstreamFailover:
+    @pytest.fixture
+    def targets(self):
+        """Per-host behaviour: True = answer, False = refuse connections."""
+        up = {"a.example.com": False, "b.example.com": True, "c.example.com": True}
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.host)
+            if not up[request.url.host]:
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200, json={"host": request.url.host})
+
+        with mock.patch.object(
+            upstream, "build_client", side_effect=lambda o: httpx.Client(transport=httpx.MockTransport(handler))
+        ):
+            yield up, calls
+
+    def make_rule(self, **kwargs):
+        return PolicyProxyRule.objects.create(
+            name="pool",
+            regex=r"^room-\d+$",
+            service_target_url=A,
+            service_additional_urls=[B, C],
+            **kwargs,
+        )
+
+    def make_request(self):
+        return RequestFactory().get("/policy/v1/service/configuration", {"local_alias": "room-1"})
+
+    def test_failed_target_is_skipped(self, db, targets):
+        up, calls = targets
+        self.make_rule()
+        response = proxy_service_policy(self.make_request())
+        assert json.loads(response.content) == {"host": "b.example.com"}
+        assert calls == ["a.example.com", "b.example.com"]
+        assert balancer.snapshot()[A]["failures"] == 1
+
+    def test_all_targets_down_uses_fallback(self, db, targets):
+        up, calls = targets
+        up.update({"b.example.com": False, "c.example.com": False})
+        self.make_rule(upstream_fallback="continue")
+        assert json.loads(proxy_service_policy(self.make_request()).content)["action"] == "continue"
+        assert calls == ["a.example.com", "b.example.com", "c.example.com"]
+
+    def test_round_robin_spreads_requests(self, db, targets):
+        up, calls = targets
+        up["a.example.com"] = True
+        self.make_rule(upstream_strategy="round_robin")
+        for _ in range(3):
+            proxy_service_policy(self.make_request())
+        assert calls == ["a.example.com", "b.example.com", "c.example.com"]
+
+
+class TestAdditionalTargetsForm:
+    def test_one_url_per_line(self):
+        form = PolicyProxyRuleForm()
+        field = form.fields["service_additional_urls"]
+        assert field.clean(f"{B}\n\n  {C}  \n") == [B, C]
+        assert field.prepare_value([B, C]) == f"{B}\n{C}"
+        with pytest.raises(ValidationError):
+            field.clean("not a url")
@@ -0,0 +1,26 @@
+"""
+Run: pytest -v policy_router/tests/test_bench_policy.py
+"""
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from policy_router.models import PolicyProxyRule, PolicyRequestLog
+
+
+@pytest.mark.django_db
+class TestBenchPolicyCommand:
+    @pytest.mark.parametrize("extra", [[], ["--async"], ["--auth"]])
+    def test_reports_and_rolls_back(self, extra, settings):
+        settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+        out = StringIO()
+        call_command("bench_policy", "--rules", "20", "--requests", "40", "--warmup", "5", *extra, stdout=out)
+
+        report = out.getvalue()
+        assert "req/s" in report
+        assert "p99=" in report
+        assert "DB queries/req" in report
+        assert "401" not in report
+        assert PolicyProxyRule.objects.count() == 0
+        assert PolicyRequestLog.objects.count() == 0
@@ -0,0 +1,140 @@
+"""
+Run: pytest -v policy_router/tests/test_circuit_breaker.py
+"""
+import json
+from unittest import mock
+
+import httpx
+import pytest
+from django.test import RequestFactory
+
+from policy_router import circuit_breaker, upstream
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_service_policy
+
+ORIGIN = "https://flaky.example.com"
+
+
+@pytest.fixture
+def breaker_settings(settings):
+    settings.POLICY_BREAKER_WINDOW = 4
+    settings.POLICY_BREAKER_MIN_CALLS = 2
+    settings.POLICY_BREAKER_FAILURE_RATE = 0.5
+    settings.POLICY_BREAKER_OPEN_SECONDS = 30
+    return settings
+
+
+@pytest.fixture
+def flaky_upstream():
+    """Upstream whose behaviour tests switch with state["mode"]: ok, down or error."""
+    state = {"mode": "down", "calls": 0}
+
+    def handler(request):
+        state["calls"] += 1
+        if state["mode"] == "down":
+            raise httpx.ConnectError("connection refused", request=request)
+        if state["mode"] == "error":
+            return httpx.Response(503, json={"error": "overloaded"})
+        return httpx.Response(200, json={"status": "success", "action": "continue", "from": request.url.host})
+
+    with mock.patch.object(
+        upstream, "build_client", side_effect=lambda origin: httpx.Client(transport=httpx.MockTransport(handler))
+    ):
+        yield state
+
+
+class TestCircuitBreaker:
+    def test_opens_on_failure_rate_then_half_opens(self, breaker_settings):
+        breaker = circuit_breaker.breaker_for(ORIGIN)
+        circuit_breaker.record(ORIGIN, failed=False)
+        circuit_breaker.record(ORIGIN, status_code=502)
+        assert breaker.state == circuit_breaker.OPEN
+        with pytest.raises(circuit_breaker.CircuitOpenError):
+            circuit_breaker.before_call(ORIGIN)
+
+        with mock.patch("policy_router.circuit_breaker.time.monotonic", return_value=breaker.opened_at + 31):
+            circuit_breaker.before_call(ORIGIN)  # the one trial call
+            assert breaker.state == circuit_breaker.HALF_OPEN
+            with pytest.raises(circuit_breaker.CircuitOpenError):
+                circuit_breaker.before_call(ORIGIN)
+            circuit_breaker.record(ORIGIN, elapsed=0.1, status_code=200)
+        assert breaker.state == circuit_breaker.CLOSED
+
+    def test_failed_trial_reopens(self, breaker_settings):
+        breaker = circuit_breaker.breaker_for(ORIGIN)
+        for _ in range(2):
+            circuit_breaker.record(ORIGIN, failed=True)
+        with mock.patch("policy_router.circuit_breaker.time.monotonic", return_value=breaker.opened_at + 31):
+            circuit_breaker.before_call(ORIGIN)
+            circuit_breaker.record(ORIGIN, failed=True)
+        assert breaker.state == circuit_breaker.OPEN
+
+    def test_slow_calls_count_as_failures(self, breaker_settings):
+        breaker_settings.POLICY_BREAKER_SLOW_CALL_SECONDS = 1.0
+        for _ in range(2):
+            circuit_breaker.record(ORIGIN, elapsed=2.5, status_code=200)
+        assert circuit_breaker.states()[ORIGIN]["state"] == circuit_breaker.OPEN
+
+    def test_slow_call_threshold_defaults_below_the_deadline(self, breaker_settings):
+        breaker_settings.POLICY_BREAKER_SLOW_CALL_SECONDS = None
+        breaker_settings.POLICY_REQUEST_DEADLINE = 4.0
+        assert circuit_breaker.slow_call_seconds() == 3.0
+        breaker_settings.POLICY_REQUEST_DEADLINE = None
+        assert circuit_breaker.slow_call_seconds() == 5.0
+
+    def test_disabled(self, breaker_settings):
+        breaker_settings.POLICY_BREAKER_ENABLED = False
+        for _ in range(5):
+            circuit_breaker.record(ORIGIN, failed=True)
+        circuit_breaker.before_call(ORIGIN)
+        assert circuit_breaker.states() == {}
+
+
+@pytest.mark.django_db
+class TestUpstreamFallback:
+    def make_rule(self, fallback, **kwargs):
+        return PolicyProxyRule.objects.create(
+            name=f"flaky-{fallback}",
+            regex=r"^room-\d+$",
+            priority=1,
+            service_target_url=ORIGIN,
+            upstream_fallback=fallback,
+            **kwargs,
+        )
+
+    def make_request(self):
+        return RequestFactory().get("/policy/v1/service/configuration", {"local_alias": "room-1"})
+
+    def test_open_breaker_fails_fast(self, db, breaker_settings, flaky_upstream):
+        self.make_rule("error")
+        for _ in range(2):
+            assert proxy_service_policy(self.make_request()).status_code == 502
+        assert proxy_service_policy(self.make_request()).status_code == 502
+        assert flaky_upstream["calls"] == 2
+
+    @pytest.mark.parametrize("fallback, action", [("continue", "continue"), ("reject", "reject")])
+    def test_static_fallbacks(self, db, breaker_settings, flaky_upstream, fallback, action):
+        self.make_rule(fallback)
+        response = proxy_service_policy(self.make_request())
+        assert response.status_code == 200
+        assert json.loads(response.content) == {"status": "success", "action": action}
+
+    def test_next_rule_fallback(self, db, breaker_settings, flaky_upstream):
+        self.make_rule("next")
+        PolicyProxyRule.objects.create(
+            name="backup",
+            regex=r"^room-\d+$",
+            priority=2,
+            always_continue_service=True,
+            override_service_response={"action": "backup"},
+        )
+        assert json.loads(proxy_service_policy(self.make_request()).content) == {"action": "backup"}
+
+    def test_server_errors_trip_breaker_but_are_relayed(self, db, breaker_settings, flaky_upstream):
+        flaky_upstream["mode"] = "error"
+        self.make_rule("continue")
+        assert proxy_service_policy(self.make_request()).status_code == 503
+        assert proxy_service_policy(self.make_request()).status_code == 503
+        response = proxy_service_policy(self.make_request())
+        assert json.loads(response.content)["action"] == "continue"
+        assert flaky_upstream["calls"] == 2
@@ -0,0 +1,221 @@
+"""
+Run: pytest -v policy_router/tests/test_deadline.py
+"""
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from policy_router import balancer, circuit_breaker, single_flight, upstream
+from policy_router.deadline import Deadline, DeadlineExceeded
+from policy_router.forms import PolicyProxyRuleForm
+from policy_router.models import PolicyProxyRule, PolicyRequestLog
+from policy_router.rule_table import CompiledRule
+from policy_router.views import proxy_service_policy, proxy_service_policy_async
+
+SLOW = 1.0
+
+
+class _SlowUpstream(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(SLOW)
+        body = json.dumps({"status": "success", "action": "continue"}).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            pass  # the proxy gave up at its deadline
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowUpstream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def service_request(**extra):
+    return RequestFactory().get("/policy/v1/service/configuration", {"local_alias": "room-1"}, **extra)
+
+
+class TestDeadline:
+    def test_no_deadline(self, settings):
+        settings.POLICY_REQUEST_DEADLINE = None
+        deadline = Deadline.for_request(service_request())
+        assert deadline.remaining() is None
+        assert deadline.cap(3.0) == 3.0
+        deadline.check()
+
+    def test_rule_deadline_overrides_global(self, settings):
+        settings.POLICY_REQUEST_DEADLINE = 5.0
+        settings.POLICY_DEADLINE_RESERVE = 0.5
+        request = service_request()
+        request.policy_started_at = time.monotonic()
+        rule = CompiledRule.from_model(PolicyProxyRule(id=1, name="r", regex="x", upstream_deadline=2.0))
+
+        deadline = Deadline.for_request(request).for_rule(rule)
+        assert deadline.started_at == request.policy_started_at
+        assert 1.4 < deadline.remaining() <= 1.5
+        timeout = deadline.cap_timeout(httpx.Timeout(10.0, connect=1.0))
+        assert timeout.connect == 1.0
+        assert timeout.read <= 1.5
+
+    def test_check_raises_once_spent(self, settings):
+        settings.POLICY_DEADLINE_RESERVE = 0.1
+        deadline = Deadline(1.0, started_at=time.monotonic() - 0.95)
+        with pytest.raises(DeadlineExceeded):
+            deadline.check()
+        assert deadline.cap(3.0) == 0.0
+
+    def test_rule_deadline_must_be_positive(self, db):
+        for value in ("0", "-0.5"):
+            assert "upstream_deadline" in PolicyProxyRuleForm(data=QueryDict(f"upstream_deadline={value}")).errors
+        assert "upstream_deadline" not in PolicyProxyRuleForm(data=QueryDict("upstream_deadline=1.5")).errors
+
+    def test_coalesced_follower_gives_up_at_its_deadline(self):
+        started, release = threading.Event(), threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait(5)
+            return "response"
+
+        leader = threading.Thread(target=single_flight.do, args=("k", fetch))
+        leader.start()
+        assert started.wait(5)
+        try:
+            with pytest.raises(DeadlineExceeded):
+                single_flight.do("k", fetch, Deadline(0.2))
+        finally:
+            release.set()
+            leader.join(5)
+
+
+@pytest.mark.django_db
+class TestDeadlineFallback:
+    def test_slow_upstream_gets_the_rule_fallback(self, slow_upstream):
+        PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            service_target_url=slow_upstream,
+            upstream_deadline=0.3,
+            upstream_fallback="reject",
+        )
+
+        start = time.monotonic()
+        response = proxy_service_policy(service_request())
+        elapsed = time.monotonic() - start
+
+        assert elapsed < SLOW
+        assert json.loads(response.content)["action"] == "reject"
+        assert PolicyRequestLog.objects.get().is_override
+        # The upstream had the whole budget and didn't answer: its breaker counts it
+        assert circuit_breaker.states()[slow_upstream]["failures"] == 1
+        assert balancer.snapshot()[slow_upstream]["failures"] == 0
+
+    def test_async_slow_upstream_gets_504_without_fallback(self, slow_upstream):
+        PolicyProxyRule.objects.create(
+            name="room", regex=r"^room-\d+$", service_target_url=slow_upstream, upstream_deadline=0.3
+        )
+
+        start = time.monotonic()
+        response = async_to_sync(proxy_service_policy_async)(service_request())
+
+        assert time.monotonic() - start < SLOW
+        assert response.status_code == 504
+
+    @pytest.mark.parametrize("view", [proxy_service_policy, async_to_sync(proxy_service_policy_async)])
+    def test_spent_deadline_does_not_fall_through_to_next_rule(self, slow_upstream, settings, view):
+        settings.POLICY_REQUEST_DEADLINE = 0.3
+        for priority in (1, 2):
+            PolicyProxyRule.objects.create(
+                name=f"room-{priority}",
+                regex=r"^room-\d+$",
+                priority=priority,
+                service_target_url=slow_upstream,
+                upstream_fallback="next",
+            )
+
+        response = view(service_request())
+
+        assert response.status_code == 504
+
+    def test_hung_upstream_opens_its_breaker_with_default_settings(self):
+        PolicyProxyRule.objects.create(
+            name="room", regex=r"^room-\d+$", service_target_url="https://hung.example.com"
+        )
+        clock = [1000.0]
+
+        def hung(request):
+            # Wait out the (deadline-capped) read timeout, then time out
+            clock[0] += request.extensions["timeout"]["read"]
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        with mock.patch("time.monotonic", side_effect=lambda: clock[0]), mock.patch.object(
+            upstream, "build_client", side_effect=lambda origin: httpx.Client(transport=httpx.MockTransport(hung))
+        ):
+            statuses = [proxy_service_policy(service_request()).status_code for _ in range(6)]
+
+        assert statuses == [504] * 5 + [502]
+        assert circuit_breaker.states()["https://hung.example.com"]["state"] == circuit_breaker.OPEN
+
+    def test_call_started_late_is_not_held_against_the_upstream(self, settings):
+        settings.POLICY_REQUEST_DEADLINE = 4.0
+        settings.POLICY_DEADLINE_RESERVE = 0.0
+        rule = CompiledRule.from_model(
+            PolicyProxyRule(id=1, name="r", regex="x", service_target_url="https://late.example.com")
+        )
+        clock = [1000.0]
+
+        def hung(request):
+            clock[0] += request.extensions["timeout"]["read"]
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        # 3.5s of the 4s budget went on earlier work; the 0.5s left isn't a fair chance
+        deadline = Deadline(4.0, started_at=clock[0] - 3.5)
+        with mock.patch("time.monotonic", side_effect=lambda: clock[0]), mock.patch.object(
+            upstream, "build_client", side_effect=lambda origin: httpx.Client(transport=httpx.MockTransport(hung))
+        ):
+            with pytest.raises(DeadlineExceeded):
+                upstream.get(rule, "https://late.example.com/policy", deadline=deadline)
+
+        assert circuit_breaker.states()["https://late.example.com"]["failures"] == 0
+
+    def test_slow_auth_spends_the_budget(self, db, settings):
+        settings.ENABLE_POLICY_AUTH = True
+        PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            service_target_url="https://policy.example.com",
+            upstream_deadline=0.2,
+            upstream_fallback="continue",
+        )
+
+        def slow_authenticate(*args):
+            time.sleep(0.25)
+            return mock.Mock()
+
+        header = "Basic " + base64.b64encode(b"node:s3cret").decode()
+        with mock.patch("policy_router.views.cached_authenticate", side_effect=slow_authenticate), \
+                mock.patch("policy_router.upstream.get_client") as get_client:
+            response = proxy_service_policy(service_request(HTTP_AUTHORIZATION=header))
+
+        assert json.loads(response.content)["action"] == "continue"
+        get_client.assert_not_called()
@@ -0,0 +1,122 @@
+"""
+Run: pytest -v policy_router/tests/test_health.py
+"""
+import json
+from unittest import mock
+
+import httpx
+import pytest
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+
+from policy_router import health, upstream
+from policy_router.models import PolicyProxyRule, UpstreamHealth
+from policy_router.views import proxy_service_policy
+
+A, B = "https://a.example.com", "https://b.example.com"
+RealClient = httpx.Client
+
+
+@pytest.fixture
+def servers():
+    """Both the prober and the proxy talk to in-memory servers; up[host] toggles them."""
+    up = {"a.example.com": True, "b.example.com": True}
+    calls = []
+
+    def handler(request):
+        calls.append((request.url.host, request.url.path))
+        if not up[request.url.host]:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"host": request.url.host})
+
+    def client(*args, **kwargs):
+        return RealClient(transport=httpx.MockTransport(handler))
+
+    with mock.patch("policy_router.health.httpx.Client", side_effect=client), \
+            mock.patch.object(upstream, "build_client", side_effect=client):
+        yield up, calls
+
+
+def make_rule(**kwargs):
+    return PolicyProxyRule.objects.create(
+        name="pool", regex=r"^room-\d+$", service_target_url=A, service_additional_urls=[B], **kwargs
+    )
+
+
+def make_request():
+    return RequestFactory().get("/policy/v1/service/configuration", {"local_alias": "room-1"})
+
+
+class TestProbe:
+    def probe(self, response):
+        transport = httpx.MockTransport(lambda request: response)
+        return health.probe(A, httpx.Client(transport=transport))
+
+    def test_any_answer_below_500_is_up(self):
+        assert self.probe(httpx.Response(404))["is_up"] is True
+        result = self.probe(httpx.Response(503))
+        assert result["is_up"] is False
+        assert result["error"] == "HTTP 503"
+
+    def test_down_after_consecutive_failures(self, settings):
+        settings.POLICY_HEALTH_CHECK_FAILURES = 2
+        failed = {"is_up": False, "latency_ms": None, "status_code": None, "error": "refused"}
+        ok = {"is_up": True, "latency_ms": 3.0, "status_code": 200, "error": ""}
+
+        assert health._record(A, failed)["is_up"] is True
+        assert health._record(A, failed)["is_up"] is False
+        assert health.is_down(A)
+        assert health._record(A, ok)["is_up"] is True
+        assert not health.is_down(A)
+
+
+@pytest.mark.django_db
+class TestHealthChecks:
+    def test_check_all_probes_each_origin_and_stores_results(self, db, settings, servers):
+        settings.POLICY_HEALTH_CHECK_PATH = "/health"
+        settings.POLICY_HEALTH_CHECK_FAILURES = 1
+        up, calls = servers
+        up["b.example.com"] = False
+        UpstreamHealth.objects.create(origin="https://gone.example.com")
+        make_rule()
+
+        results = health.check_all()
+
+        assert sorted(calls) == [("a.example.com", "/health"), ("b.example.com", "/health")]
+        assert results[A]["is_up"] and not results[B]["is_up"]
+        assert {h.origin: h.is_up for h in UpstreamHealth.objects.all()} == {A: True, B: False}
+
+    def test_down_origin_is_skipped_by_live_requests(self, db, settings, servers):
+        settings.POLICY_HEALTH_CHECK_FAILURES = 1
+        up, calls = servers
+        up["a.example.com"] = False
+        make_rule()
+        health.check_all()
+        up["a.example.com"] = True  # recovered, but not re-probed yet
+        calls.clear()
+
+        response = proxy_service_policy(make_request())
+        assert json.loads(response.content) == {"host": "b.example.com"}
+        assert calls == [("b.example.com", "/policy/v1/service/configuration")]
+
+    def test_all_down_uses_fallback_without_waiting(self, db, settings, servers):
+        settings.POLICY_HEALTH_CHECK_FAILURES = 1
+        up, calls = servers
+        up.update({"a.example.com": False, "b.example.com": False})
+        make_rule(upstream_fallback="continue")
+        health.check_all()
+        calls.clear()
+
+        assert json.loads(proxy_service_policy(make_request()).content)["action"] == "continue"
+        assert calls == []
+
+    def test_rules_list_shows_health(self, db, client, settings, servers):
+        settings.POLICY_HEALTH_CHECK_FAILURES = 1
+        servers[0]["b.example.com"] = False
+        make_rule()
+        health.check_all()
+        client.force_login(User.objects.create_user("admin", password="x"))
+
+        html = client.get("/rules/").content.decode()
+        assert "bg-success" in html and "bg-danger" in html
+        assert B in html
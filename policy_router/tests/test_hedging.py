@@ -0,0 +1,170 @@
+"""
+Run: pytest -v policy_router/tests/test_hedging.py
+"""
+import asyncio
+import itertools
+import time
+from unittest import mock
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+
+from policy_router import balancer, circuit_breaker, hedging, upstream
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_service_policy, proxy_service_policy_async
+
+A, B = "https://a.example.com", "https://b.example.com"
+SLOW = 0.5
+
+
+def measure(url, *latencies):
+    for seconds in latencies:
+        with mock.patch("policy_router.balancer.time.monotonic", side_effect=[0.0, seconds]):
+            with balancer.track(url):
+                pass
+
+
+def answer(host):
+    return httpx.Response(200, json={"status": "success", "action": "continue", "result": {"host": host}})
+
+
+def service_request():
+    return RequestFactory().get("/policy/v1/service/configuration", {"local_alias": "room-1"})
+
+
+@pytest.fixture
+def hedged_rule(db, settings):
+    settings.POLICY_HEDGE_INITIAL_DELAY = 0.05
+    return PolicyProxyRule.objects.create(
+        name="room",
+        regex=r"^room-\d+$",
+        service_target_url=A,
+        service_additional_urls=[B],
+        upstream_hedge_percentile=95,
+    )
+
+
+class TestHedgeDelay:
+    def test_percentile_needs_enough_samples(self, settings):
+        settings.POLICY_HEDGE_MIN_SAMPLES = 4
+        measure(A, 0.1, 0.2, 0.3)
+        assert balancer.latency_percentile(A, 50) is None
+
+        measure(A, 0.4)
+        assert balancer.latency_percentile(A, 50) == 0.3
+        assert balancer.latency_percentile(A, 99) == 0.4
+
+    def test_failed_calls_are_not_sampled(self, settings):
+        settings.POLICY_HEDGE_MIN_SAMPLES = 1
+        with pytest.raises(httpx.ConnectError):
+            with balancer.track(A):
+                raise httpx.ConnectError("down")
+        assert balancer.latency_percentile(A, 95) is None
+
+    def test_delay_for(self, settings, compiled):
+        settings.POLICY_HEDGE_INITIAL_DELAY = 0.2
+        settings.POLICY_HEDGE_MIN_DELAY = 0.05
+        settings.POLICY_HEDGE_MIN_SAMPLES = 2
+        rule = compiled(upstream_hedge_percentile=95)
+        assert hedging.delay_for(compiled(), A) is None
+        assert hedging.delay_for(rule, A) == 0.2
+
+        measure(A, 0.01, 0.02)
+        assert hedging.delay_for(rule, A) == 0.05
+        measure(A, 0.3, 0.3)
+        assert hedging.delay_for(rule, A) == 0.3
+
+
+@pytest.mark.django_db
+class TestHedgedProxy:
+    def patch_clients(self, handler):
+        return mock.patch.object(
+            upstream, "build_client",
+            side_effect=lambda origin: httpx.Client(transport=httpx.MockTransport(handler)),
+        )
+
+    def test_slow_primary_is_hedged_to_next_target(self, hedged_rule):
+        def handler(request):
+            if request.url.host == "a.example.com":
+                time.sleep(SLOW)
+            return answer(request.url.host)
+
+        with self.patch_clients(handler):
+            start = time.monotonic()
+            response = proxy_service_policy(service_request())
+            elapsed = time.monotonic() - start
+
+        assert response.status_code == 200
+        assert b"b.example.com" in response.content
+        assert elapsed < SLOW
+        assert hedging.stats() == {"hedged": 1, "hedge_wins": 1}
+
+    def test_fast_primary_is_not_hedged(self, hedged_rule):
+        hosts = []
+
+        def handler(request):
+            hosts.append(request.url.host)
+            return answer(request.url.host)
+
+        with self.patch_clients(handler):
+            response = proxy_service_policy(service_request())
+
+        assert b"a.example.com" in response.content
+        assert hosts == ["a.example.com"]
+        assert hedging.stats() == {"hedged": 0, "hedge_wins": 0}
+
+    def test_single_target_hedges_to_itself(self, hedged_rule):
+        hedged_rule.service_additional_urls = []
+        hedged_rule.save()
+        calls = itertools.count()
+
+        def handler(request):
+            if next(calls) == 0:
+                time.sleep(SLOW)
+                return answer("slow")
+            return answer("fast")
+
+        with self.patch_clients(handler):
+            response = proxy_service_policy(service_request())
+
+        assert b"fast" in response.content
+        assert hedging.stats()["hedge_wins"] == 1
+
+    def test_failed_primary_fails_over_without_waiting(self, hedged_rule, settings):
+        settings.POLICY_HEDGE_INITIAL_DELAY = SLOW
+
+        def handler(request):
+            if request.url.host == "a.example.com":
+                raise httpx.ConnectError("refused")
+            return answer(request.url.host)
+
+        with self.patch_clients(handler):
+            start = time.monotonic()
+            response = proxy_service_policy(service_request())
+            elapsed = time.monotonic() - start
+
+        assert b"b.example.com" in response.content
+        assert elapsed < SLOW
+        assert hedging.stats()["hedged"] == 0
+
+    def test_async_hedge_cancels_the_loser(self, hedged_rule):
+        async def handler(request):
+            if request.url.host == "a.example.com":
+                await asyncio.sleep(SLOW)
+            return answer(request.url.host)
+
+        with mock.patch.object(
+            upstream, "build_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        ):
+            response = async_to_sync(proxy_service_policy_async)(service_request())
+
+        assert b"b.example.com" in response.content
+        assert hedging.stats() == {"hedged": 1, "hedge_wins": 1}
+        # The cancelled call is neither a failure nor a latency sample
+        stats = balancer.snapshot()[A]
+        assert stats["outstanding"] == 0
+        assert stats["failures"] == 0
+        assert circuit_breaker.states()[A]["failures"] == 0
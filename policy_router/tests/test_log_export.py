@@ -0,0 +1,111 @@
+"""
+Run: pytest -v policy_router/tests/test_log_export.py
+"""
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from policy_router.models import PolicyProxyRule, PolicyRequestLog
+
+BASE = timezone.now().replace(microsecond=0)
+
+
+@pytest.fixture
+def logs(db):
+    rule = PolicyProxyRule.objects.create(name="rooms", regex=r"^room-\d+$")
+    PolicyRequestLog.objects.bulk_create([
+        PolicyRequestLog(
+            rule=rule if i % 2 else None,
+            request_method="GET",
+            request_path="/policy/v1/service/configuration",
+            request_params={"local_alias": f"room-{i}", "protocol": "sip" if i % 2 else "webrtc"},
+            response_status=200,
+            local_alias=f"room-{i}",
+            protocol="sip" if i % 2 else "webrtc",
+            source_host="10.0.0.1",
+            created_at=BASE - timedelta(seconds=i),
+        )
+        for i in range(10)
+    ])
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user("admin", password="x")
+
+
+@pytest.fixture
+def export(client, user):
+    client.force_login(user)
+
+    def get(**params):
+        response = client.get("/logs/export/", params)
+        assert response.status_code == 200
+        assert response.streaming
+        return response, b"".join(response.streaming_content)
+    return get
+
+
+@pytest.mark.django_db
+class TestLogExport:
+    def test_text_export_keeps_the_log_line_format(self, logs, export):
+        response, body = export()
+        lines = body.decode().splitlines()
+        assert response["Content-Disposition"] == 'attachment; filename="policy_logs.log"'
+        assert len(lines) == 10
+        assert lines[0].endswith(
+            "GET /policy/v1/service/configuration (N/A) status=200 override=False source=10.0.0.1"
+        )
+        assert "(rooms)" in lines[1]
+
+    def test_csv_export_honours_log_list_filters(self, logs, export):
+        response, body = export(format="csv", protocols="sip")
+        assert response["Content-Type"] == "text/csv; charset=utf-8"
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        assert [row["local_alias"] for row in rows] == ["room-1", "room-3", "room-5", "room-7", "room-9"]
+        assert rows[0]["rule"] == "rooms"
+        assert json.loads(rows[0]["request_params"]) == {"local_alias": "room-1", "protocol": "sip"}
+
+    def test_gzipped_ndjson_export(self, logs, export):
+        response, body = export(format="ndjson", gzip="1", local_alias="room-4")
+        assert response["Content-Type"] == "application/gzip"
+        assert response["Content-Disposition"] == 'attachment; filename="policy_logs.ndjson.gz"'
+        records = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        assert len(records) == 1
+        assert records[0]["local_alias"] == "room-4"
+        assert records[0]["created_at"] == (BASE - timedelta(seconds=4)).isoformat()
+        assert records[0]["rule"] is None
+
+    def test_rows_are_read_in_one_query(self, logs, export, settings):
+        settings.POLICY_LOG_EXPORT_CHUNK_SIZE = 3
+        with CaptureQueriesContext(connection) as queries:
+            _, body = export(format="ndjson")
+        assert len(body.splitlines()) == 10
+        exports = [q["sql"] for q in queries if "policy_router_policyrequestlog" in q["sql"]]
+        assert len(exports) == 1
+        assert "OFFSET" not in exports[0].upper()
+
+    def test_unknown_format_is_rejected(self, client, user):
+        client.force_login(user)
+        assert client.get("/logs/export/", {"format": "xlsx"}).status_code == 400
+
+    def test_asgi_export_streams_asynchronously(self, logs, user):
+        client = AsyncClient()
+        async_to_sync(client.aforce_login)(user)
+        response = async_to_sync(client.get)("/logs/export/", {"format": "csv"})
+
+        async def read():
+            return b"".join([block async for block in response.streaming_content])
+
+        assert response.is_async
+        assert len(async_to_sync(read)().splitlines()) == 11
@@ -0,0 +1,95 @@
+"""
+Run: pytest -v policy_router/tests/test_log_fields.py
+"""
+import pytest
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from policy_router.models import PolicyProxyRule, PolicyRequestLog
+from policy_router.views import _filter_logs, proxy_participant_policy, proxy_service_policy
+
+
+@pytest.mark.django_db
+class TestStructuredLogFields:
+    def test_logged_requests_fill_alias_protocol_and_direction(self):
+        PolicyProxyRule.objects.create(name="rooms", regex=r"^room-\d+$", always_continue_service=True)
+        PolicyProxyRule.objects.create(name="people", regex=r"^room-\d+$", always_continue_participant=True)
+        factory = RequestFactory()
+
+        proxy_service_policy(factory.get(
+            "/policy/v1/service/configuration",
+            {"local_alias": "room-1", "protocol": "sip", "call_direction": "dial_in"},
+        ))
+        proxy_participant_policy(factory.get("/policy/v1/participant/properties", {"local_alias": "room-2"}))
+
+        assert list(
+            PolicyRequestLog.objects.order_by("pk").values_list("local_alias", "protocol", "call_direction")
+        ) == [("room-1", "sip", "dial_in"), ("room-2", None, None)]
+
+    def test_oversized_values_are_clipped(self):
+        fields = PolicyRequestLog.structured_fields({"local_alias": "a" * 300, "protocol": "x" * 30})
+        assert len(fields["local_alias"]) == 255
+        assert len(fields["protocol"]) == 20
+        assert fields["call_direction"] is None
+
+    def test_alias_filter_matches_the_column(self):
+        PolicyRequestLog.objects.create(
+            request_method="GET",
+            request_path="/policy/v1/service/configuration",
+            response_status=200,
+            local_alias="room-1",
+        )
+        PolicyRequestLog.objects.create(
+            request_method="GET",
+            request_path="/policy/v1/service/configuration",
+            response_status=200,
+            local_alias="room-10",
+        )
+        logs, filters = _filter_logs(QueryDict("local_alias=room-1"))
+        assert [log.local_alias for log in logs] == ["room-1"]
+        assert filters["local_alias"] == "room-1"
+
+
+@pytest.mark.django_db
+class TestBackfillLogFields:
+    def test_backfills_existing_rows_in_chunks(self, capsys):
+        PolicyRequestLog.objects.bulk_create([
+            PolicyRequestLog(
+                request_method="GET",
+                request_path="/policy/v1/service/configuration",
+                request_params={"local_alias": f"room-{i}", "protocol": "webrtc"},
+                response_status=200,
+            )
+            for i in range(5)
+        ] + [
+            PolicyRequestLog(request_method="GET", request_path="/", request_params=None, response_status=404)
+        ])
+
+        call_command("backfill_log_fields", batch_size=2)
+
+        assert PolicyRequestLog.objects.filter(protocol="webrtc").count() == 5
+        assert PolicyRequestLog.objects.get(request_params__local_alias="room-3").local_alias == "room-3"
+        out = capsys.readouterr().out
+        assert out.count("scanned") == 3
+        assert "Backfilled 5 of 6 logs" in out
+
+        # A second run finds nothing left to change
+        call_command("backfill_log_fields", batch_size=100)
+        assert "Backfilled 0 of 6 logs" in capsys.readouterr().out
+
+    def test_resumes_after_start_id(self):
+        PolicyRequestLog.objects.bulk_create([
+            PolicyRequestLog(
+                request_method="GET",
+                request_path="/",
+                request_params={"local_alias": f"room-{i}"},
+                response_status=200,
+            )
+            for i in range(3)
+        ])
+        first = PolicyRequestLog.objects.order_by("pk").first()
+
+        call_command("backfill_log_fields", start_id=first.pk)
+
+        assert PolicyRequestLog.objects.filter(local_alias__isnull=True).get().pk == first.pk
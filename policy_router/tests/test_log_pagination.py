@@ -0,0 +1,126 @@
+"""
+Run: pytest -v policy_router/tests/test_log_pagination.py
+"""
+import re
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from policy_router import log_pagination
+from policy_router.models import PolicyRequestLog
+
+BASE = timezone.now().replace(microsecond=0)
+
+
+def make_logs(count, same_time_every=1, **fields):
+    """``count`` logs, one per second, ``same_time_every`` sharing each timestamp."""
+    PolicyRequestLog.objects.bulk_create([
+        PolicyRequestLog(
+            request_method="GET",
+            request_path=f"/policy/v1/service/configuration?local_alias=room-{i}",
+            response_status=200,
+            created_at=BASE - timedelta(seconds=i // same_time_every),
+            **fields,
+        )
+        for i in range(count)
+    ])
+    return list(PolicyRequestLog.objects.order_by("-created_at", "-pk").values_list("pk", flat=True))
+
+
+def ids(page):
+    return [log.pk for log in page]
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    def test_walks_forward_and_back_through_timestamp_ties(self):
+        expected = make_logs(23, same_time_every=4)
+        logs = PolicyRequestLog.objects.all()
+
+        pages, page = [], log_pagination.paginate(logs, per_page=5)
+        pages.append(page)
+        while page.has_next:
+            page = log_pagination.paginate(logs, after=page.next_cursor, per_page=5)
+            pages.append(page)
+        assert [pk for p in pages for pk in ids(p)] == expected
+        assert not pages[0].has_previous and len(pages) == 5
+
+        back = log_pagination.paginate(logs, before=pages[-1].previous_cursor, per_page=5)
+        assert ids(back) == ids(pages[-2])
+        back = log_pagination.paginate(logs, before=pages[1].previous_cursor, per_page=5)
+        assert ids(back) == ids(pages[0])
+        assert not back.has_previous and back.has_next
+
+    def test_bad_cursor_shows_the_newest_page(self):
+        expected = make_logs(3)
+        page = log_pagination.paginate(PolicyRequestLog.objects.all(), after="not-a-cursor")
+        assert ids(page) == expected
+        assert not page.has_previous
+
+    def test_deep_pages_do_not_use_offset(self):
+        make_logs(30)
+        logs = PolicyRequestLog.objects.all()
+        page = log_pagination.paginate(logs, per_page=10)
+        page = log_pagination.paginate(logs, after=page.next_cursor, per_page=10)
+        with CaptureQueriesContext(connection) as queries:
+            log_pagination.paginate(logs, after=page.next_cursor, per_page=10)
+        assert len(queries) == 1
+        assert "OFFSET" not in queries[0]["sql"].upper()
+
+
+@pytest.mark.django_db
+class TestApproximateCount:
+    def test_small_sets_are_counted_exactly(self, settings):
+        settings.POLICY_LOG_COUNT_CAP = 100
+        make_logs(3)
+        count = log_pagination.approximate_count(PolicyRequestLog.objects.all())
+        assert (count.value, count.capped, str(count)) == (3, False, "3 logs")
+
+    def test_count_is_capped(self, settings):
+        settings.POLICY_LOG_COUNT_CAP = 10
+        make_logs(15)
+        count = log_pagination.approximate_count(PolicyRequestLog.objects.all())
+        assert count.capped
+        assert str(count) == "more than 10 logs"
+
+    def test_counting_can_be_disabled(self, settings):
+        settings.POLICY_LOG_COUNT_CAP = 0
+        assert log_pagination.approximate_count(PolicyRequestLog.objects.all()) is None
+
+
+@pytest.mark.django_db
+class TestLogListView:
+    def test_cursor_links_keep_filters(self, client, settings):
+        settings.POLICY_LOG_PAGE_SIZE = 5
+        make_logs(12, source_host="node1")
+        client.force_login(User.objects.create_user("admin", password="x"))
+
+        response = client.get("/logs/", {"source_host": "node1"})
+        assert response.status_code == 200
+        assert len(response.context["page_obj"]) == 5
+        assert response.context["previous_url"] is None
+        next_url = response.context["next_url"]
+        assert next_url.startswith("?source_host=node1&after=")
+        assert "12 logs" in response.content.decode()
+
+        response = client.get("/logs/" + next_url)
+        assert re.match(r"\?source_host=node1&before=", response.context["previous_url"])
+        assert response.context["newest_url"] == "?source_host=node1"
+
+    def test_source_choices_come_from_recent_logs_and_are_cached(self, client, settings):
+        settings.POLICY_LOG_SOURCE_SCAN = 3
+        make_logs(2, source_host="node1")
+        PolicyRequestLog.objects.update(created_at=BASE - timedelta(days=1))
+        make_logs(3, source_host="node2")
+        client.force_login(User.objects.create_user("admin", password="x"))
+
+        assert client.get("/logs/").context["distinct_sources"] == ["node2"]
+        # The selected source stays selectable even if it is no longer recent
+        assert client.get("/logs/", {"source_host": "node1"}).context["distinct_sources"] == ["node1", "node2"]
+
+        make_logs(1, source_host="node3")
+        assert client.get("/logs/").context["distinct_sources"] == ["node2"]
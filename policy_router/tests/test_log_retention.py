@@ -0,0 +1,93 @@
+"""
+Run: pytest -v policy_router/tests/test_log_retention.py
+"""
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from policy_router import log_retention
+from policy_router.models import PolicyRequestLog
+
+
+def make_logs(count, age_days):
+    now = timezone.now()
+    PolicyRequestLog.objects.bulk_create([
+        PolicyRequestLog(
+            request_method="GET",
+            request_path="/policy/v1/service/configuration",
+            response_status=200,
+            created_at=now - timedelta(days=age_days, seconds=i),
+        )
+        for i in range(count)
+    ])
+
+
+@pytest.mark.django_db
+class TestPurge:
+    def test_deletes_expired_logs_in_batches(self):
+        make_logs(25, age_days=40)
+        make_logs(5, age_days=1)
+        batches = []
+
+        with CaptureQueriesContext(connection) as queries:
+            deleted = log_retention.purge(
+                log_retention.cutoff_for(30), batch_size=10, sleep=0, progress=batches.append
+            )
+
+        assert deleted == 25
+        assert PolicyRequestLog.objects.count() == 5
+        assert [(p.deleted, p.batches) for p in batches] == [(10, 1), (20, 2), (25, 3)]
+        deletes = [q["sql"] for q in queries if q["sql"].startswith("DELETE")]
+        assert len(deletes) == 3
+
+    def test_sleeps_between_full_batches(self):
+        make_logs(20, age_days=40)
+        with mock.patch("policy_router.log_retention.time.sleep") as sleep:
+            log_retention.purge(log_retention.cutoff_for(30), batch_size=10, sleep=0.5)
+        # Full batches pause; the empty query that ends the run does not
+        assert sleep.call_args_list == [mock.call(0.5), mock.call(0.5)]
+
+    def test_dry_run_deletes_nothing(self):
+        make_logs(3, age_days=40)
+        assert log_retention.purge(log_retention.cutoff_for(30), dry_run=True) == 3
+        assert PolicyRequestLog.objects.count() == 3
+
+
+@pytest.mark.django_db
+class TestRotateLogsCommand:
+    def test_reports_progress(self, capsys, settings):
+        settings.POLICY_LOG_RETENTION_DAYS = 7
+        make_logs(4, age_days=10)
+        make_logs(2, age_days=3)
+
+        call_command("rotate_logs", batch_size=3, sleep=0)
+
+        out = capsys.readouterr().out
+        assert "… 3 deleted in 1 batches" in out
+        assert "… 4 deleted in 2 batches" in out
+        assert "Deleted 4 old logs" in out
+        assert PolicyRequestLog.objects.count() == 2
+
+    def test_dry_run(self, capsys):
+        make_logs(2, age_days=40)
+        call_command("rotate_logs", dry_run=True)
+        assert "Would delete 2 logs" in capsys.readouterr().out
+        assert PolicyRequestLog.objects.count() == 2
+
+    def test_interval_keeps_purging_until_stopped(self, capsys):
+        make_logs(2, age_days=40)
+        with mock.patch(
+            "policy_router.management.commands.rotate_logs.time.sleep",
+            side_effect=[None, KeyboardInterrupt],
+        ) as sleep:
+            call_command("rotate_logs", interval=60, sleep=0)
+
+        out = capsys.readouterr().out
+        assert out.count("Deleted") == 2
+        assert out.rstrip().endswith("Stopped.")
+        assert sleep.call_args_list == [mock.call(60), mock.call(60)]
@@ -0,0 +1,109 @@
+"""
+Run: pytest -v policy_router/tests/test_log_sink.py
+"""
+import json
+import threading
+
+import pytest
+from django.test import RequestFactory
+
+from policy_router import log_sink
+from policy_router.log_sink import QueuedLogSink
+from policy_router.models import PolicyProxyRule, PolicyRequestLog
+from policy_router.views import proxy_service_policy
+
+
+def record(n):
+    return {
+        "request_path": f"/policy/v1/service/configuration?n={n}",
+        "request_method": "GET",
+        "request_params": {"local_alias": f"room-{n}"},
+        "response_status": 200,
+    }
+
+
+@pytest.mark.django_db
+class TestQueuedLogSink:
+    def test_records_are_bulk_inserted_in_batches(self, db, django_assert_num_queries):
+        sink = QueuedLogSink(batch_size=3, start=False)
+        for n in range(7):
+            assert sink.emit(record(n))
+
+        with django_assert_num_queries(3):
+            assert sink.flush() == 7
+        assert PolicyRequestLog.objects.count() == 7
+        assert sink.stats() == {"queued": 0, "flushed": 7, "dropped": 0, "failed": 0}
+
+    def test_drop_oldest(self, db):
+        sink = QueuedLogSink(max_size=3, overflow="drop_oldest", start=False)
+        for n in range(5):
+            assert sink.emit(record(n))
+        sink.flush()
+
+        kept = sorted(PolicyRequestLog.objects.values_list("request_params__local_alias", flat=True))
+        assert kept == ["room-2", "room-3", "room-4"]
+        assert sink.stats()["dropped"] == 2
+
+    def test_block_waits_then_drops(self, db):
+        sink = QueuedLogSink(max_size=2, overflow="block", block_timeout=0.01, start=False)
+        assert sink.emit(record(0))
+        assert sink.emit(record(1))
+        assert not sink.emit(record(2))
+        assert sink.stats()["dropped"] == 1
+
+    def test_block_admits_once_drained(self, db):
+        sink = QueuedLogSink(max_size=1, overflow="block", block_timeout=2.0, start=False)
+        assert sink.emit(record(0))
+
+        drained = threading.Timer(0.05, sink._take, args=(1,))
+        drained.start()
+        assert sink.emit(record(1))
+        drained.join()
+        assert sink.stats()["dropped"] == 0
+
+    def test_sample_keeps_one_in_n_under_pressure(self, db):
+        sink = QueuedLogSink(max_size=100, overflow="sample", sample_rate=5, start=False)
+        for n in range(50):
+            assert sink.emit(record(n))
+        accepted = sum(sink.emit(record(n)) for n in range(50, 100))
+        assert accepted == 10
+        assert sink.stats()["dropped"] == 40
+
+    def test_unknown_overflow_policy(self):
+        with pytest.raises(ValueError):
+            QueuedLogSink(overflow="explode", start=False)
+
+    def test_failed_batch_is_counted(self, db):
+        sink = QueuedLogSink(start=False)
+        sink.emit({"request_method": "GET"})  # missing NOT NULL columns
+        assert sink.flush() == 0
+        assert sink.stats()["failed"] == 1
+
+    def test_policy_view_emits_compact_record(self, db, settings):
+        settings.POLICY_LOG_SINK = "policy_router.log_sink.QueuedLogSink"
+        settings.POLICY_LOG_FLUSH_INTERVAL = 60  # keep the writer thread out of the way
+        settings.POLICY_LOG_MAX_BODY_CHARS = 20
+        log_sink.reset_log_sink()
+        PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            always_continue_service=True,
+            override_service_response={"action": "continue", "padding": "x" * 50},
+        )
+        request = RequestFactory().get(
+            "/policy/v1/service/configuration", {"local_alias": "room-1"}, REMOTE_ADDR="10.0.0.10"
+        )
+
+        response = proxy_service_policy(request)
+        assert json.loads(response.content)["action"] == "continue"
+        assert PolicyRequestLog.objects.count() == 0
+
+        sink = log_sink.get_log_sink()
+        assert sink.stats()["queued"] == 1
+        log_sink.reset_log_sink(flush=True)
+
+        log = PolicyRequestLog.objects.get()
+        assert log.is_override
+        assert log.source_host == "10.0.0.10"
+        assert log.response_body.endswith("…[truncated]")
+        assert len(log.response_body) == 20 + len("…[truncated]")
@@ -0,0 +1,157 @@
+"""
+Run: pytest -v policy_router/tests/test_metrics.py
+"""
+import json
+import os
+import subprocess
+import sys
+from unittest import mock
+
+import httpx
+import pytest
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+
+from policy_router import metrics, upstream
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_participant_policy, proxy_service_policy
+
+
+def service_request(alias="room-1", **params):
+    return RequestFactory().get(
+        "/policy/v1/service/configuration",
+        {"local_alias": alias, **params},
+        REMOTE_ADDR="10.0.0.14",
+    )
+
+
+def sample(text, line_start):
+    """Value of the exposition line starting with ``line_start``."""
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+@pytest.mark.django_db
+class TestPolicyMetrics:
+    def test_override_request_is_counted_with_labels(self):
+        PolicyProxyRule.objects.create(
+            name="rooms",
+            regex=r"^room-\d+$",
+            always_continue_service=True,
+            protocols=["sip"],
+            source_match="10.0.0.",
+        )
+        proxy_service_policy(service_request(protocol="sip", call_direction="dial_in"))
+
+        text = metrics.render()
+        assert sample(text, (
+            'policy_requests_total{call_direction="dial_in",kind="service",outcome="override",'
+            'protocol="sip",rule="rooms",source="10.0.0."}'
+        )) == 1
+        for phase in ("auth", "match", "log", "total"):
+            assert sample(
+                text, f'policy_request_duration_seconds_count{{kind="service",phase="{phase}"}}'
+            ) == 1
+        assert 'phase="upstream"' not in text
+
+    def test_request_values_do_not_add_series(self):
+        for i in range(50):
+            request = RequestFactory().get(
+                "/policy/v1/service/configuration",
+                {"local_alias": "nobody", "protocol": f"proto-{i}", "call_direction": f"dir-{i}"},
+                REMOTE_ADDR=f"10.0.1.{i}",
+            )
+            proxy_service_policy(request)
+
+        lines = [line for line in metrics.render().splitlines() if line.startswith("policy_requests_total{")]
+        assert lines == [
+            'policy_requests_total{call_direction="other",kind="service",outcome="no_match",'
+            'protocol="other",rule="",source=""} 50'
+        ]
+
+    def test_no_match_and_upstream_status(self):
+        PolicyProxyRule.objects.create(
+            name="vmr",
+            regex=r"^vmr-\d+$",
+            participant_target_url="https://policy.example.com",
+            upstream_cache_ttl=30,
+        )
+
+        def handler(request):
+            return httpx.Response(200, json={"status": "success", "action": "continue"})
+
+        def request():
+            return RequestFactory().get("/policy/v1/participant/properties", {"local_alias": "vmr-1"})
+
+        with mock.patch.object(
+            upstream, "build_client", side_effect=lambda origin: httpx.Client(transport=httpx.MockTransport(handler))
+        ):
+            proxy_participant_policy(request())
+            proxy_participant_policy(request())
+        proxy_service_policy(service_request(alias="nobody"))
+
+        text = metrics.render()
+        assert sample(
+            text, 'policy_upstream_responses_total{origin="https://policy.example.com",status="200"}'
+        ) == 1
+        assert sample(text, 'policy_upstream_cache_total{result="hit"}') == 1
+        assert sample(text, 'policy_upstream_cache_total{result="miss"}') == 1
+        assert sample(text, 'policy_requests_total{call_direction="",kind="participant",outcome="proxy"') == 2
+        assert sample(text, 'policy_requests_total{call_direction="",kind="service",outcome="no_match"') == 1
+        assert sample(text, 'policy_request_duration_seconds_count{kind="participant",phase="upstream"}') == 1
+
+    def test_metrics_endpoint_needs_a_login(self, client):
+        assert client.get("/metrics").status_code == 401
+
+        client.force_login(User.objects.create_user("admin", password="x"))
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert b"# TYPE policy_request_duration_seconds histogram" in response.content
+        assert b"policy_log_queue_depth 0" in response.content
+
+    def test_metrics_endpoint_accepts_the_bearer_token(self, client, settings):
+        settings.POLICY_METRICS_TOKEN = "s3cret"
+        assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code == 200
+        assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code == 401
+        assert client.post("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code == 405
+
+
+class TestExposition:
+    def test_histogram_buckets_are_cumulative(self):
+        for seconds in (0.003, 0.2, 20.0):
+            metrics.observe("policy_request_duration_seconds", seconds, kind="service", phase="total")
+
+        text = metrics.render()
+        labels = 'kind="service",phase="total"'
+        assert sample(text, f'policy_request_duration_seconds_bucket{{{labels},le="0.001"}}') == 0
+        assert sample(text, f'policy_request_duration_seconds_bucket{{{labels},le="0.005"}}') == 1
+        assert sample(text, f'policy_request_duration_seconds_bucket{{{labels},le="0.25"}}') == 2
+        assert sample(text, f'policy_request_duration_seconds_bucket{{{labels},le="10.0"}}') == 2
+        assert sample(text, f'policy_request_duration_seconds_bucket{{{labels},le="+Inf"}}') == 3
+        assert sample(text, f"policy_request_duration_seconds_count{{{labels}}}") == 3
+        assert sample(text, f"policy_request_duration_seconds_sum{{{labels}}}") == pytest.approx(20.203)
+
+    def test_label_values_are_escaped(self):
+        metrics.inc("policy_requests_total", rule='say "hi"\\')
+        assert 'policy_requests_total{rule="say \\"hi\\"\\\\"} 1' in metrics.render()
+
+    def test_workers_are_aggregated_through_snapshot_dir(self, settings, tmp_path):
+        settings.POLICY_METRICS_DIR = str(tmp_path)
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        (tmp_path / f"policy-metrics-{exited.pid}.json").write_text(json.dumps({
+            "pid": exited.pid,
+            "counters": [["policy_requests_total", [["outcome", "proxy"]], 5]],
+            "histograms": [],
+            "gauges": [["policy_log_queue_depth", [], 7]],
+        }))
+        metrics.inc("policy_requests_total", outcome="proxy")
+
+        text = metrics.render()
+        assert (tmp_path / f"policy-metrics-{os.getpid()}.json").exists()
+        # Counters of exited workers still count; their gauges don't
+        assert sample(text, 'policy_requests_total{outcome="proxy"}') == 6
+        assert sample(text, "policy_log_queue_depth") == 0
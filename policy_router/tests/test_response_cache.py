@@ -0,0 +1,111 @@
+"""
+Run: pytest -v policy_router/tests/test_response_cache.py
+"""
+import json
+from unittest import mock
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+
+from policy_router import response_cache
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_service_policy, proxy_service_policy_async
+
+
+@pytest.mark.django_db
+class TestUpstreamResponseCache:
+    def make_rule(self, **kwargs):
+        defaults = {
+            "name": "room",
+            "regex": r"^(room|missing)-\d+$",
+            "service_target_url": "https://policy.example.com",
+            "upstream_cache_ttl": 30,
+        }
+        defaults.update(kwargs)
+        return PolicyProxyRule.objects.create(**defaults)
+
+    def make_request(self, local_alias="room-1", HTTP_AUTHORIZATION=None, **params):
+        extra = {"HTTP_AUTHORIZATION": HTTP_AUTHORIZATION} if HTTP_AUTHORIZATION else {}
+        return RequestFactory().get(
+            "/policy/v1/service/configuration",
+            {"local_alias": local_alias, "protocol": "sip", **params},
+            REMOTE_ADDR="10.0.0.10",
+            **extra,
+        )
+
+    def test_repeat_request_skips_upstream(self, db, upstream_calls):
+        self.make_rule()
+        first = proxy_service_policy(self.make_request(remote_alias="alice"))
+        second = proxy_service_policy(self.make_request(remote_alias="alice"))
+
+        assert len(upstream_calls) == 1
+        assert json.loads(second.content) == json.loads(first.content)
+        stats = response_cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    def test_requests_differing_in_any_parameter_or_caller_are_not_shared(self, db, upstream_calls):
+        self.make_rule()
+        alice = json.loads(proxy_service_policy(self.make_request(remote_alias="alice")).content)
+        bob = json.loads(proxy_service_policy(self.make_request(remote_alias="bob")).content)
+        proxy_service_policy(self.make_request(remote_alias="alice", HTTP_AUTHORIZATION="Basic bm9kZTI6eA=="))
+        assert alice != bob
+        assert len(upstream_calls) == 3
+        assert response_cache.stats()["hits"] == 0
+
+    def test_key_params_are_configurable(self, db, upstream_calls):
+        self.make_rule(upstream_cache_key_params="local_alias, remote_alias")
+        proxy_service_policy(self.make_request(remote_alias="alice"))
+        proxy_service_policy(self.make_request(remote_alias="bob"))
+        proxy_service_policy(self.make_request(remote_alias="alice", protocol="webrtc"))
+        assert len(upstream_calls) == 2
+
+    def test_rule_without_ttl_is_not_cached(self, db, upstream_calls):
+        self.make_rule(upstream_cache_ttl=None)
+        proxy_service_policy(self.make_request())
+        proxy_service_policy(self.make_request())
+        assert len(upstream_calls) == 2
+        assert response_cache.stats()["misses"] == 0
+
+    def test_not_found_is_negatively_cached(self, db, settings, upstream_calls):
+        self.make_rule()
+        for _ in range(2):
+            assert proxy_service_policy(self.make_request("missing-1")).status_code == 404
+        assert len(upstream_calls) == 1
+        assert response_cache.stats()["negative_hits"] == 1
+
+        settings.POLICY_UPSTREAM_CACHE_NEGATIVE_TTL = 0
+        proxy_service_policy(self.make_request("missing-2"))
+        proxy_service_policy(self.make_request("missing-2"))
+        assert len(upstream_calls) == 3
+
+    def test_expired_entries_are_refetched(self, db, upstream_calls):
+        self.make_rule()
+        proxy_service_policy(self.make_request())
+        with mock.patch("policy_router.response_cache.time.monotonic", return_value=10 ** 9):
+            proxy_service_policy(self.make_request())
+        assert len(upstream_calls) == 2
+
+    def test_lru_eviction(self, db, settings, upstream_calls):
+        settings.POLICY_UPSTREAM_CACHE_MAX_ENTRIES = 2
+        self.make_rule()
+        for alias in ["room-1", "room-2", "room-1", "room-3", "room-1", "room-2"]:
+            proxy_service_policy(self.make_request(alias))
+        # room-2 was least recently used when room-3 arrived
+        assert [c.url.params["local_alias"] for c in upstream_calls] == ["room-1", "room-2", "room-3", "room-2"]
+        assert response_cache.stats()["evictions"] == 2
+
+    def test_rule_edit_clears_cache(self, db, upstream_calls):
+        rule = self.make_rule()
+        proxy_service_policy(self.make_request())
+        rule.name = "renamed"
+        rule.save()
+        proxy_service_policy(self.make_request())
+        assert len(upstream_calls) == 2
+
+    def test_async_view_shares_cache(self, db, upstream_calls):
+        self.make_rule()
+        proxy_service_policy(self.make_request())
+        response = async_to_sync(proxy_service_policy_async)(self.make_request())
+        assert response.status_code == 200
+        assert len(upstream_calls) == 1
@@ -0,0 +1,192 @@
+"""
+Run: pytest -v policy_router/tests/test_rule_table.py
+"""
+import json
+import random
+from unittest import mock
+
+import pytest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.test import RequestFactory, override_settings
+
+from policy_router import rule_table, usage
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_service_policy
+
+
+def make_rule(name, regex, **kwargs):
+    defaults = {
+        "always_continue_service": True,
+        "override_service_response": {"action": name},
+    }
+    defaults.update(kwargs)
+    return PolicyProxyRule.objects.create(name=name, regex=regex, **defaults)
+
+
+@pytest.mark.django_db
+class TestCompiledRuleTable:
+    def make_request(self, local_alias="room-1", ip="10.0.0.10"):
+        rf = RequestFactory()
+        return rf.get("/policy/v1/service/configuration", {
+            "local_alias": local_alias,
+            "protocol": "sip",
+            "call_direction": "dial_in",
+        }, REMOTE_ADDR=ip)
+
+    def test_table_is_compiled_and_priority_ordered(self, db):
+        make_rule("second", r"^room-\d+$", priority=2, protocols=["sip"], source_match=" 10.0.0.10 ")
+        make_rule("first", r"^vmr-\d+$", priority=1, call_directions=["dial_out"])
+        make_rule("inactive", r".*", priority=0, is_active=False)
+
+        table = rule_table.get_rule_table()
+        assert [r.name for r in table.rules] == ["first", "second"]
+        assert table.rules[1].protocols == frozenset({"sip"})
+        assert table.rules[1].source_match == "10.0.0.10"
+        assert table.rules[1].pattern.pattern == r"^room-\d+$"
+
+    def test_table_is_reused_until_rules_change(self, db, django_assert_num_queries):
+        make_rule("room", r"^room-\d+$")
+        table = rule_table.get_rule_table()
+
+        with django_assert_num_queries(0):
+            assert rule_table.get_rule_table() is table
+
+        make_rule("vmr", r"^vmr-\d+$")
+        rebuilt = rule_table.get_rule_table()
+        assert rebuilt is not table
+        assert rebuilt.version > table.version
+        assert len(rebuilt) == 2
+
+    @override_settings(POLICY_RULE_TABLE_CHECK_INTERVAL=0)
+    def test_version_check_is_a_single_query(self, db, django_assert_num_queries):
+        make_rule("room", r"^room-\d+$")
+        table = rule_table.get_rule_table()
+
+        with django_assert_num_queries(1):
+            assert rule_table.get_rule_table() is table
+
+    def test_bulk_reorder_and_delete_invalidate(self, db):
+        a = make_rule("a", r"^room-\d+$", priority=1)
+        b = make_rule("b", r"^room-\d+$", priority=2, source_match="10.0.0.99")
+        assert json.loads(proxy_service_policy(self.make_request()).content)["action"] == "a"
+
+        PolicyProxyRule.objects.filter(pk=a.pk).update(priority=3)
+        rule_table.bump_rule_table_version()
+        assert [r.name for r in rule_table.get_rule_table().rules] == ["b", "a"]
+
+        a.delete()
+        assert [r.name for r in rule_table.get_rule_table().rules] == ["b"]
+        assert proxy_service_policy(self.make_request()).status_code == 404
+
+    def test_usage_counter_does_not_invalidate(self, db):
+        make_rule("room", r"^room-\d+$")
+        table = rule_table.get_rule_table()
+        version = rule_table.current_version()
+
+        proxy_service_policy(self.make_request())
+        usage.flush()
+
+        assert rule_table.current_version() == version
+        assert rule_table.get_rule_table() is table
+        assert PolicyProxyRule.objects.get(name="room").match_count == 1
+
+    def test_override_bodies_are_pre_encoded(self, db):
+        make_rule("room", r"^room-\d+$", priority=1, override_service_response={"action": "room", "name": "Café"})
+        make_rule(
+            "proxy", r"^vmr-\d+$", priority=2,
+            always_continue_service=False, service_target_url="http://upstream.example.com",
+        )
+        room, proxy = rule_table.get_rule_table().rules
+
+        expected = JsonResponse({"action": "room", "name": "Café"}).content
+        assert room.override_for("service").body == expected
+        assert room.override_for("service").content_length == str(len(expected))
+        assert room.override_for("participant") is None
+        assert proxy.override_for("service") is None
+
+    def test_override_hit_does_not_encode_json(self, db):
+        make_rule("room", r"^room-\d+$")
+        rule_table.get_rule_table()
+
+        with mock.patch.object(DjangoJSONEncoder, "encode") as encode:
+            response = proxy_service_policy(self.make_request())
+        encode.assert_not_called()
+        assert json.loads(response.content) == {"action": "room"}
+        assert response["Content-Length"] == str(len(response.content))
+
+
+@pytest.mark.parametrize("pattern, prefix", [
+    (r"^room\-\d+$", "room-"),
+    (r"^meet\.example\.com", "meet.example.com"),
+    (r"^ab?c", "a"),
+    (r"^a+b", "a"),
+    (r"^a(b|c)", "a"),
+    (r"^x{2}", ""),
+    (r"^(sip:)?99\d+", ""),
+    (r"^abc|^xyz", ""),
+    (r"^[x|y]abc", ""),
+    (r"^\w+", ""),
+    (r"room-\d+", ""),
+])
+def test_literal_prefix(pattern, prefix):
+    assert rule_table.literal_prefix(pattern) == prefix
+
+
+def test_prefix_index_matches_linear_scan():
+    patterns = [
+        r"^room-\d+$", r"^room-1", r"^vmr", r"(sip:)?99\d+", r"^ab?c", r"^a+b",
+        r"^abc|^xyz", r"^meet\.example\.com$", r"example\.com$", r"^x{2}", r"^room",
+    ]
+    rules = [
+        rule_table.CompiledRule.from_model(PolicyProxyRule(id=i + 1, name=f"r{i}", regex=p, priority=i))
+        for i, p in enumerate(patterns)
+    ]
+    indexed = rule_table.RuleTable(rules, version=0)
+    linear = rule_table.RuleTable(rules, version=0, indexed=False)
+
+    for alias in [
+        "room-1", "room-12", "room-x", "vmr-01", "sip:9912", "9912", "ac", "abc", "aab", "xyz",
+        "meet.example.com", "xx", "x", "", None, "bob@example.com", "room",
+    ]:
+        assert [r.id for r in indexed.match(alias)] == [r.id for r in linear.match(alias)], alias
+    assert len(indexed.candidates("zzz")) < len(rules)
+
+
+def test_attribute_buckets_match_linear_scan():
+    rng = random.Random(7)
+    rules = []
+    for i in range(200):
+        rules.append(rule_table.CompiledRule.from_model(PolicyProxyRule(
+            id=i + 1,
+            name=f"r{i}",
+            regex=rng.choice([rf"^room-{i % 10}", r"room-\d+", r"^vmr", r".*"]),
+            priority=i,
+            protocols=rng.choice([[], ["sip"], ["webrtc"], ["sip", "h323"]]),
+            call_directions=rng.choice([[], ["dial_in"], ["dial_out", "non_dial"]]),
+            source_match=rng.choice(["", "", "10.0.0.10", "node1.example.com", "10.0.0"]),
+        )))
+    indexed = rule_table.RuleTable(rules, version=0)
+    linear = rule_table.RuleTable(rules, version=0, indexed=False)
+
+    for _ in range(500):
+        attrs = {
+            "local_alias": rng.choice(["room-1", "room-42", "vmr-7", "other", None]),
+            "protocol": rng.choice([None, "sip", "webrtc", "h323", "teams"]),
+            "call_direction": rng.choice([None, "dial_in", "dial_out", "non_dial"]),
+            "client_ip": rng.choice([None, "10.0.0.10", "10.0.0.99", "192.168.1.1"]),
+            "client_host": rng.choice([None, "node1.example.com", "node2.example.com"]),
+        }
+        assert [r.id for r in indexed.match(**attrs)] == [r.id for r in linear.match(**attrs)], attrs
+
+
+def test_sip_request_only_evaluates_sip_and_wildcard_rules():
+    rules = [
+        rule_table.CompiledRule.from_model(PolicyProxyRule(id=1, name="sip", regex=".*", priority=1, protocols=["sip"])),
+        rule_table.CompiledRule.from_model(PolicyProxyRule(id=2, name="webrtc", regex=".*", priority=2, protocols=["webrtc"])),
+        rule_table.CompiledRule.from_model(PolicyProxyRule(id=3, name="any", regex=".*", priority=3, protocols=[])),
+        rule_table.CompiledRule.from_model(PolicyProxyRule(id=4, name="src", regex=".*", priority=4, source_match="10.9.9.9")),
+    ]
+    table = rule_table.RuleTable(rules, version=0)
+    assert table.candidates("room-1", protocol="sip", client_ip="10.0.0.10") == [0, 2]
+    assert table.candidates("room-1", protocol="webrtc", client_ip="10.9.9.9") == [1, 2, 3]
@@ -0,0 +1,198 @@
+"""
+Run: pytest -v policy_router/tests/test_single_flight.py
+"""
+import asyncio
+import json
+import threading
+import time
+from unittest import mock
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from policy_router import single_flight, upstream
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_participant_policy_async
+
+
+def wait_for_coalesced(count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while single_flight.stats()["coalesced"] < count:
+        assert time.monotonic() < deadline, "followers never joined the in-flight call"
+        time.sleep(0.001)
+
+
+class TestSingleFlight:
+    def test_key_only_for_cached_rules_unless_enabled(self, settings, compiled):
+        params = QueryDict("local_alias=room-1&remote_alias=alice")
+        assert single_flight.key_for(compiled(), "service", params) is None
+        assert single_flight.key_for(compiled(upstream_cache_ttl=10), "service", params) is not None
+
+        settings.POLICY_UPSTREAM_SINGLE_FLIGHT = True
+        assert single_flight.key_for(compiled(), "service", params) == single_flight.key_for(
+            compiled(), "service", QueryDict("remote_alias=alice&local_alias=room-1")
+        )
+
+    def test_key_covers_every_parameter_and_caller_without_explicit_key_params(self, settings, compiled):
+        settings.POLICY_UPSTREAM_SINGLE_FLIGHT = True
+        alice = QueryDict("local_alias=room-1&remote_alias=alice")
+        bob = QueryDict("local_alias=room-1&remote_alias=bob")
+        assert single_flight.key_for(compiled(), "participant", alice) != single_flight.key_for(
+            compiled(), "participant", bob
+        )
+        assert single_flight.key_for(compiled(), "participant", alice, "Basic bm9kZTE6eA==") != (
+            single_flight.key_for(compiled(), "participant", alice, "Basic bm9kZTI6eA==")
+        )
+        # A rule that names its key parameters opts into sharing across the rest
+        rule = compiled(upstream_cache_key_params="local_alias")
+        assert single_flight.key_for(rule, "participant", alice) == single_flight.key_for(
+            rule, "participant", bob
+        )
+
+    def test_concurrent_threads_share_one_call(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "response"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight.do("k", fetch)))
+        leader.start()
+        assert started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(single_flight.do("k", fetch))) for _ in range(5)]
+        for t in followers:
+            t.start()
+        wait_for_coalesced(5)
+        release.set()
+        for t in [leader, *followers]:
+            t.join(5)
+
+        assert calls == [1]
+        assert results == ["response"] * 6
+        assert single_flight.stats() == {"leaders": 1, "coalesced": 5, "in_flight": 0}
+
+    def test_errors_are_shared_and_not_cached(self):
+        started, release = threading.Event(), threading.Event()
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise httpx.ConnectError("down")
+
+        errors = []
+
+        def call():
+            try:
+                single_flight.do("k", failing)
+            except httpx.ConnectError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        assert started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        wait_for_coalesced(1)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        assert len(errors) == 2
+        assert single_flight.do("k", lambda: "recovered") == "recovered"
+
+
+class TestAsyncSingleFlight:
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def scenario():
+            leader = asyncio.ensure_future(single_flight.ado("k", fetch))
+            await asyncio.sleep(0)  # the leader starts the call
+            follower = asyncio.ensure_future(single_flight.ado("k", fetch))
+            await asyncio.sleep(0)  # the follower joins it
+            leader.cancel()  # e.g. the leader's client disconnected
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        assert async_to_sync(scenario)() == "answer"
+        assert calls == [1]
+        assert single_flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.django_db
+class TestAsyncCoalescing:
+    def test_concurrent_async_requests_share_upstream_call(self, db, settings):
+        settings.POLICY_UPSTREAM_SINGLE_FLIGHT = True
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"status": "success", "action": "continue"})
+
+        PolicyProxyRule.objects.create(
+            name="vmr", regex=r"^vmr-\d+$", participant_target_url="https://policy.example.com"
+        )
+
+        def make_request():
+            return RequestFactory().get(
+                "/policy/v1/participant/properties",
+                {"local_alias": "vmr-1", "remote_alias": "user1"},
+            )
+
+        async def burst():
+            return await asyncio.gather(*(proxy_participant_policy_async(make_request()) for _ in range(10)))
+
+        with mock.patch.object(
+            upstream, "build_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        ):
+            responses = async_to_sync(burst)()
+
+        assert [r.status_code for r in responses] == [200] * 10
+        assert len(calls) == 1
+        assert single_flight.stats()["coalesced"] == 9
+
+    def test_participants_differing_in_remote_alias_are_not_merged(self, db, settings):
+        settings.POLICY_UPSTREAM_SINGLE_FLIGHT = True
+
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"status": "success", "for": request.url.params["remote_alias"]})
+
+        PolicyProxyRule.objects.create(
+            name="vmr", regex=r"^vmr-\d+$", participant_target_url="https://policy.example.com"
+        )
+
+        def make_request(remote_alias):
+            return RequestFactory().get(
+                "/policy/v1/participant/properties", {"local_alias": "vmr-1", "remote_alias": remote_alias}
+            )
+
+        async def burst():
+            return await asyncio.gather(
+                proxy_participant_policy_async(make_request("alice")),
+                proxy_participant_policy_async(make_request("bob")),
+            )
+
+        with mock.patch.object(
+            upstream, "build_async_client",
+            side_effect=lambda origin: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        ):
+            responses = async_to_sync(burst)()
+
+        assert [json.loads(r.content)["for"] for r in responses] == ["alice", "bob"]
+        assert single_flight.stats()["coalesced"] == 0
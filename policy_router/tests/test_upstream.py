@@ -0,0 +1,178 @@
+"""
+Run: pytest -v policy_router/tests/test_upstream.py
+"""
+import json
+from unittest import mock
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from policy_router import rule_table, upstream
+from policy_router.forms import PolicyProxyRuleForm
+from policy_router.models import PolicyProxyRule, PolicyRequestLog
+from policy_router.views import proxy_participant_policy, proxy_service_policy
+
+
+@pytest.mark.django_db
+class TestUpstreamPool:
+    def make_request(self, path="/policy/v1/service/configuration", local_alias="room-1"):
+        return RequestFactory().get(path, {"local_alias": local_alias}, REMOTE_ADDR="10.0.0.10")
+
+    def test_one_client_per_origin(self, db, upstream_calls, upstream_origins):
+        calls, built = upstream_calls, upstream_origins
+        PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            service_target_url="https://policy-a.example.com/",
+            participant_target_url="https://policy-a.example.com",
+        )
+
+        for _ in range(3):
+            assert proxy_service_policy(self.make_request()).status_code == 200
+        response = proxy_participant_policy(self.make_request("/policy/v1/participant/properties"))
+        assert json.loads(response.content)["host"] == "policy-a.example.com"
+
+        assert built == ["https://policy-a.example.com"]
+        assert len(calls) == 4
+        assert str(calls[0].url).startswith("https://policy-a.example.com/policy/v1/service/configuration?")
+
+    def test_rule_timeouts_override_settings(self, db, settings, upstream_calls):
+        calls = upstream_calls
+        settings.POLICY_UPSTREAM_CONNECT_TIMEOUT = 2.0
+        settings.POLICY_UPSTREAM_READ_TIMEOUT = 8.0
+        PolicyProxyRule.objects.create(
+            name="fast",
+            regex=r"^room-\d+$",
+            service_target_url="https://policy-a.example.com",
+            upstream_read_timeout=1.5,
+        )
+
+        proxy_service_policy(self.make_request())
+        timeout = calls[0].extensions["timeout"]
+        assert timeout["connect"] == 2.0
+        assert timeout["read"] == 1.5
+
+    def test_unused_origins_are_retired_on_rebuild(self, db, upstream_calls, upstream_origins):
+        built = upstream_origins
+        rule = PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            service_target_url="https://policy-a.example.com",
+        )
+        proxy_service_policy(self.make_request())
+        old_client = upstream.get_client("https://policy-a.example.com")
+
+        rule.service_target_url = "https://policy-b.example.com"
+        rule.save()
+        proxy_service_policy(self.make_request())
+        assert built == ["https://policy-a.example.com", "https://policy-b.example.com"]
+        assert "https://policy-a.example.com" not in upstream._clients
+        assert not old_client.is_closed  # may still be finishing a request
+
+        rule.regex = r"^room-\d{1,4}$"
+        rule.save()
+        rule_table.get_rule_table()
+        assert old_client.is_closed
+
+    def test_upstream_cookies_are_not_kept_between_requests(self, db):
+        PolicyProxyRule.objects.create(
+            name="room", regex=r"^room-\d+$", service_target_url="https://policy.example.com"
+        )
+        cookies = []
+
+        def handler(request):
+            cookies.append(request.headers.get("cookie") or "")
+            return httpx.Response(
+                200, json={"status": "success", "action": "continue"}, headers={"Set-Cookie": "session=abc"}
+            )
+
+        RealClient, RealAsyncClient = httpx.Client, httpx.AsyncClient
+        with mock.patch(
+            "policy_router.upstream.httpx.Client",
+            side_effect=lambda **kw: RealClient(transport=httpx.MockTransport(handler), **kw),
+        ):
+            proxy_service_policy(self.make_request())
+            proxy_service_policy(self.make_request())
+        assert cookies == ["", ""]
+        assert not upstream.get_client("https://policy.example.com").cookies
+
+        async def handle_async(request):
+            return handler(request)
+
+        async def two_calls():
+            rule = rule_table.get_rule_table().rules[0]
+            for _ in range(2):
+                await upstream.aget(rule, "https://policy.example.com/policy")
+
+        with mock.patch(
+            "policy_router.upstream.httpx.AsyncClient",
+            side_effect=lambda **kw: RealAsyncClient(transport=httpx.MockTransport(handle_async), **kw),
+        ):
+            async_to_sync(two_calls)()
+        assert cookies == [""] * 4
+
+    def test_http2_falls_back_without_h2(self, settings):
+        settings.POLICY_UPSTREAM_HTTP2 = True
+        with mock.patch("importlib.util.find_spec", return_value=None):
+            assert upstream._http2_enabled() is False
+
+    @pytest.mark.parametrize("field", ["upstream_connect_timeout", "upstream_read_timeout"])
+    def test_rule_timeouts_must_be_positive(self, db, field):
+        for value in ("0", "-1"):
+            assert field in PolicyProxyRuleForm(data=QueryDict(f"{field}={value}")).errors
+        assert field not in PolicyProxyRuleForm(data=QueryDict(f"{field}=2.5")).errors
+
+
+@pytest.mark.django_db
+class TestUpstreamRelay:
+    BODY = b'{"status":"success",  "action":"continue"}'
+
+    @pytest.fixture
+    def upstream_body(self):
+        """Serve a fixed body/content-type from every pooled client."""
+        served = {"content": self.BODY, "content_type": "application/json; charset=utf-8"}
+
+        def handler(request):
+            return httpx.Response(200, content=served["content"], headers={"content-type": served["content_type"]})
+
+        with mock.patch.object(
+            upstream, "build_client", side_effect=lambda origin: httpx.Client(transport=httpx.MockTransport(handler))
+        ):
+            yield served
+
+    def make_rule(self):
+        return PolicyProxyRule.objects.create(
+            name="room", regex=r"^room-\d+$", service_target_url="https://policy.example.com"
+        )
+
+    def make_request(self):
+        return RequestFactory().get("/policy/v1/service/configuration", {"local_alias": "room-1"})
+
+    def test_body_bytes_are_relayed_unparsed(self, db, upstream_body):
+        self.make_rule()
+        with mock.patch.object(httpx.Response, "json") as parse:
+            response = proxy_service_policy(self.make_request())
+        parse.assert_not_called()
+        assert response.content == self.BODY
+        assert response["Content-Type"] == "application/json; charset=utf-8"
+        assert response["Content-Length"] == str(len(self.BODY))
+
+    def test_invalid_json_wrapped_only_when_validating(self, db, settings, upstream_body):
+        self.make_rule()
+        upstream_body["content"] = b"<html>oops</html>"
+        upstream_body["content_type"] = "text/html"
+        assert proxy_service_policy(self.make_request()).content == b"<html>oops</html>"
+
+        settings.POLICY_UPSTREAM_VALIDATE_JSON = True
+        response = proxy_service_policy(self.make_request())
+        assert json.loads(response.content) == {"raw": "<html>oops</html>"}
+
+    def test_log_decodes_only_the_kept_prefix(self, db, settings, upstream_body):
+        settings.POLICY_LOG_MAX_BODY_CHARS = 10
+        self.make_rule()
+        upstream_body["content"] = '{"name": "Café Café Café"}'.encode()
+        proxy_service_policy(self.make_request())
+        assert PolicyRequestLog.objects.get().response_body == '{"name": "…[truncated]'
@@ -0,0 +1,116 @@
+"""
+Run: pytest -v policy_router/tests/test_usage.py
+"""
+from unittest import mock
+
+import pytest
+from django.test import RequestFactory, override_settings
+
+from policy_router import usage
+from policy_router.models import PolicyProxyRule
+from policy_router.views import proxy_service_policy
+
+
+@pytest.mark.django_db
+class TestRuleUsageAccounting:
+    def make_rule(self):
+        return PolicyProxyRule.objects.create(
+            name="room",
+            regex=r"^room-\d+$",
+            always_continue_service=True,
+            override_service_response={"action": "room"},
+        )
+
+    def test_record_match_skips_validation(self, db):
+        rule = self.make_rule()
+        with mock.patch.object(PolicyProxyRule, "full_clean") as full_clean:
+            usage.record_match(rule.pk)
+            usage.record_match(rule.pk)
+            usage.flush()
+        full_clean.assert_not_called()
+
+        rule.refresh_from_db()
+        assert rule.match_count == 2
+        assert rule.last_matched_at is not None
+
+    def test_counter_only_save_skips_validation(self, db):
+        rule = self.make_rule()
+        rule.match_count = 5
+        with mock.patch.object(PolicyProxyRule, "full_clean") as full_clean:
+            rule.save(update_fields=["match_count", "last_matched_at"])
+        full_clean.assert_not_called()
+
+        with mock.patch.object(PolicyProxyRule, "full_clean") as full_clean:
+            rule.save(update_fields=["priority"])
+        full_clean.assert_called_once()
+
+    def test_policy_request_does_not_validate(self, db):
+        self.make_rule()
+        request = RequestFactory().get(
+            "/policy/v1/service/configuration", {"local_alias": "room-1"}
+        )
+        with mock.patch.object(PolicyProxyRule, "full_clean") as full_clean:
+            response = proxy_service_policy(request)
+            usage.flush()
+        assert response.status_code == 200
+        full_clean.assert_not_called()
+        assert PolicyProxyRule.objects.get(name="room").match_count == 1
+
+    def test_increments_are_buffered_and_flushed_in_one_query(self, db, django_assert_num_queries):
+        a = self.make_rule()
+        b = PolicyProxyRule.objects.create(name="vmr", regex=r"^vmr-\d+$")
+
+        with django_assert_num_queries(0):
+            for _ in range(3):
+                usage.record_match(a.pk)
+            usage.record_match(b.pk)
+        assert usage.pending() == {a.pk: 3, b.pk: 1}
+
+        with django_assert_num_queries(1):
+            assert usage.flush() == 2
+        assert usage.pending() == {}
+
+        a.refresh_from_db()
+        b.refresh_from_db()
+        assert (a.match_count, b.match_count) == (3, 1)
+        assert a.last_matched_at is not None and b.last_matched_at is not None
+
+    def test_flush_adds_to_stored_count(self, db):
+        rule = self.make_rule()
+        PolicyProxyRule.objects.filter(pk=rule.pk).update(match_count=10)
+        usage.record_match(rule.pk)
+        usage.flush()
+        rule.refresh_from_db()
+        assert rule.match_count == 11
+
+    @override_settings(POLICY_USAGE_FLUSH_MAX_PENDING=3)
+    def test_flushes_when_pending_limit_reached(self, db):
+        rule = self.make_rule()
+        usage.record_match(rule.pk)
+        usage.record_match(rule.pk)
+        assert PolicyProxyRule.objects.get(pk=rule.pk).match_count == 0
+
+        usage.record_match(rule.pk)
+        assert usage.pending() == {}
+        assert PolicyProxyRule.objects.get(pk=rule.pk).match_count == 3
+
+    @override_settings(POLICY_USAGE_FLUSH_INTERVAL=0)
+    def test_zero_interval_writes_through(self, db):
+        rule = self.make_rule()
+        usage.record_match(rule.pk)
+        assert usage.pending() == {}
+        assert PolicyProxyRule.objects.get(pk=rule.pk).match_count == 1
+
+    def test_failed_flush_keeps_increments(self, db):
+        rule = self.make_rule()
+        usage.record_match(rule.pk)
+        with mock.patch.object(usage, "_apply", side_effect=RuntimeError("db down")):
+            assert usage.flush() == 0
+        assert usage.pending() == {rule.pk: 1}
+
+    def test_worker_exit_flushes_buffered_matches(self, db):
+        rule = self.make_rule()
+        usage.record_match(rule.pk)
+        usage.record_match(rule.pk)
+        usage._flush_at_exit()
+        assert PolicyProxyRule.objects.get(pk=rule.pk).match_count == 2
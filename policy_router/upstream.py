@@ -0,0 +1,257 @@
+"""
+Pooled upstream HTTP clients for the policy proxy.
+
+Each upstream origin (scheme://host:port) gets one long-lived ``httpx.Client``
+per worker process, so proxied calls reuse keep-alive (and optionally HTTP/2)
+connections instead of paying a TCP/TLS handshake every time.
+
+Pool limits and HTTP/2 come from settings; connect/read timeouts come from the
+rule, falling back to ``POLICY_UPSTREAM_CONNECT_TIMEOUT`` /
+``POLICY_UPSTREAM_READ_TIMEOUT``. When the compiled rule table is rebuilt,
+clients for origins no longer referenced by any rule are retired. Every call
+goes through the origin's circuit breaker (see circuit_breaker.py) and skips
+origins that active health checks have marked down (see health.py). Timeouts
+are shortened to what is left of the request deadline (see deadline.py).
+
+The async views use ``httpx.AsyncClient`` instances pooled the same way, but
+per event loop, since an async client cannot be shared across loops.
+"""
+import asyncio
+import http.cookiejar
+import importlib.util
+import logging
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+from django.dispatch import receiver
+
+from . import circuit_breaker, health
+from .deadline import DeadlineExceeded
+from .rule_table import rule_table_rebuilt
+
+logger = logging.getLogger(__name__)
+
+_clients = {}   # origin -> httpx.Client
+_retired = []   # clients dropped at the last rebuild, closed at the next one
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {origin: httpx.AsyncClient}
+_async_retired = []  # (loop, client) pairs, closed at the next rebuild
+_lock = threading.Lock()
+
+
+def origin_of(url):
+    """Return the scheme://host[:port] part of ``url`` (lower-cased)."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _http2_enabled():
+    if not getattr(settings, "POLICY_UPSTREAM_HTTP2", False):
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("POLICY_UPSTREAM_HTTP2 is on but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=getattr(settings, "POLICY_UPSTREAM_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=getattr(settings, "POLICY_UPSTREAM_MAX_KEEPALIVE", 20),
+        keepalive_expiry=getattr(settings, "POLICY_UPSTREAM_KEEPALIVE_EXPIRY", 30.0),
+    )
+
+
+class _NoCookieJar(http.cookiejar.CookieJar):
+    """Cookie jar that never stores anything.
+
+    Pooled clients are shared by every request of the worker, so a cookie an
+    upstream sets for one request must not be sent with the next one.
+    """
+
+    def extract_cookies(self, response, request):
+        pass
+
+    def set_cookie(self, cookie):
+        pass
+
+
+def build_client(origin):
+    """Create the pooled client for one upstream origin."""
+    return httpx.Client(http2=_http2_enabled(), limits=_limits(), cookies=_NoCookieJar())
+
+
+def build_async_client(origin):
+    """Create the pooled async client for one upstream origin."""
+    return httpx.AsyncClient(http2=_http2_enabled(), limits=_limits(), cookies=_NoCookieJar())
+
+
+def get_client(url):
+    """Return the shared client for ``url``'s origin, creating it on first use."""
+    origin = origin_of(url)
+    client = _clients.get(origin)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(origin)
+        if client is None:
+            client = _clients[origin] = build_client(origin)
+        return client
+
+
+def get_async_client(url):
+    """Return the shared async client for ``url``'s origin on the running loop."""
+    origin = origin_of(url)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(origin)
+        if client is None:
+            client = clients[origin] = build_async_client(origin)
+        return client
+
+
+def timeout_for(rule):
+    """httpx.Timeout for a compiled rule (per-rule values override settings)."""
+    connect = rule.connect_timeout
+    if connect is None:
+        connect = getattr(settings, "POLICY_UPSTREAM_CONNECT_TIMEOUT", 3.0)
+    read = rule.read_timeout
+    if read is None:
+        read = getattr(settings, "POLICY_UPSTREAM_READ_TIMEOUT", 10.0)
+    return httpx.Timeout(read, connect=connect)
+
+
+def get(rule, url, params=None, headers=None, deadline=None):
+    """GET ``url`` through the pooled client using the rule's auth and timeouts.
+
+    Raises CircuitOpenError without calling out if the origin's breaker is
+    open, or UpstreamDownError if health checks have marked it down. A timeout
+    at which ``deadline`` has run out raises DeadlineExceeded (see _timed_out).
+    """
+    origin = origin_of(url)
+    health.before_call(origin)
+    circuit_breaker.before_call(origin)
+    timeout = timeout_for(rule)
+    capped = deadline.cap_timeout(timeout) if deadline is not None else timeout
+    start = time.monotonic()
+    try:
+        resp = get_client(url).get(
+            url,
+            params=params,
+            headers=headers,
+            auth=rule.basic_auth,
+            timeout=capped,
+        )
+    except httpx.TimeoutException as e:
+        _timed_out(origin, e, deadline, time.monotonic() - start)
+    except BaseException:
+        circuit_breaker.record(origin, failed=True)
+        raise
+    circuit_breaker.record(origin, elapsed=time.monotonic() - start, status_code=resp.status_code)
+    return resp
+
+
+async def aget(rule, url, params=None, headers=None, deadline=None):
+    """Async GET through the pooled client for the running event loop."""
+    origin = origin_of(url)
+    health.before_call(origin)
+    circuit_breaker.before_call(origin)
+    timeout = timeout_for(rule)
+    capped = deadline.cap_timeout(timeout) if deadline is not None else timeout
+    start = time.monotonic()
+    try:
+        resp = await get_async_client(url).get(
+            url,
+            params=params,
+            headers=headers,
+            auth=rule.basic_auth,
+            timeout=capped,
+        )
+    except asyncio.CancelledError:
+        circuit_breaker.cancelled(origin)
+        raise
+    except httpx.TimeoutException as e:
+        _timed_out(origin, e, deadline, time.monotonic() - start)
+    except BaseException:
+        circuit_breaker.record(origin, failed=True)
+        raise
+    circuit_breaker.record(origin, elapsed=time.monotonic() - start, status_code=resp.status_code)
+    return resp
+
+
+# Timers may fire a little before the deadline's own clock says it is spent
+_DEADLINE_SLACK = 0.01
+
+
+def _timed_out(origin, error, deadline, elapsed):
+    """Re-raise a timeout, as DeadlineExceeded if the request's budget has run out.
+
+    The origin's breaker still records a failure when the call had a fair
+    share of the budget: at least the slow-call threshold or half the
+    deadline. Only a call that started with little budget left (after slow
+    auth or earlier attempts) is released instead, since it never had a chance.
+    """
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is None or remaining > _DEADLINE_SLACK:
+        circuit_breaker.record(origin, failed=True)
+        raise error
+    if elapsed >= min(circuit_breaker.slow_call_seconds(), deadline.seconds / 2):
+        circuit_breaker.record(origin, failed=True)
+    else:
+        circuit_breaker.cancelled(origin)
+    raise DeadlineExceeded(f"Request deadline reached waiting for {origin}") from error
+
+
+def close_all():
+    """Close every pooled client (tests, shutdown)."""
+    with _lock:
+        clients = list(_clients.values()) + _retired
+        async_clients = [
+            (loop, client) for loop, by_origin in _async_clients.items() for client in by_origin.values()
+        ] + _async_retired
+        _clients.clear()
+        _retired.clear()
+        _async_clients.clear()
+        _async_retired.clear()
+    for client in clients:
+        client.close()
+    for loop, client in async_clients:
+        _aclose_on(loop, client)
+
+
+def _aclose_on(loop, client):
+    """Close an async client from any thread, on the loop that owns it."""
+    # A loop that is not running (or already closed) can't drive aclose();
+    # its sockets are released when the client is garbage collected.
+    if loop.is_running() and not loop.is_closed():
+        loop.call_soon_threadsafe(lambda: loop.create_task(client.aclose()))
+
+
+@receiver(rule_table_rebuilt)
+def _retire_unused_clients(sender, table, **kwargs):
+    """Drop clients whose origin no longer appears in the rule table."""
+    origins = {
+        origin_of(url)
+        for rule in table.rules
+        for url in rule.service_target_urls + rule.participant_target_urls
+    }
+    with _lock:
+        # Clients retired last time have had a whole rule-table generation to
+        # finish any in-flight request, so they can be closed now.
+        to_close = list(_retired)
+        async_to_close = list(_async_retired)
+        _retired.clear()
+        _async_retired.clear()
+        for origin in [o for o in _clients if o not in origins]:
+            _retired.append(_clients.pop(origin))
+        for loop, by_origin in list(_async_clients.items()):
+            for origin in [o for o in by_origin if o not in origins]:
+                _async_retired.append((loop, by_origin.pop(origin)))
+    for client in to_close:
+        client.close()
+    for loop, client in async_to_close:
+        _aclose_on(loop, client)
@@ -1,21 +1,31 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
 
 app_name = "policy_router"
 
+# Native async policy views for ASGI deployments (uvicorn etc.)
+if getattr(settings, "POLICY_ASYNC_VIEWS", False):
+    service_policy_view = views.proxy_service_policy_async
+    participant_policy_view = views.proxy_participant_policy_async
+else:
+    service_policy_view = views.proxy_service_policy
+    participant_policy_view = views.proxy_participant_policy
+
 urlpatterns = [
     # Proxy endpoints
     path(
         "policy/v1/service/configuration",
-        views.proxy_service_policy,
+        service_policy_view,
         name="proxy_service_policy",
     ),
     path(
         "policy/v1/participant/properties",
-        views.proxy_participant_policy,
+        participant_policy_view,
         name="proxy_participant_policy",
     ),
+    path("metrics", views.metrics_view, name="metrics"),
 
     # Rule management
     path("rules/", views.rule_list, name="rule_list"),
@@ -32,7 +42,7 @@ urlpatterns = [
 
     # Logs
     path("logs/", views.log_list, name="log_list"),
-    path("logs/export/", views.export_logs_txt, name="export_logs_txt"),
+    path("logs/export/", views.export_logs, name="export_logs"),
 
 
     # Auth
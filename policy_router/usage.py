@@ -0,0 +1,191 @@
+"""
+Hot-path usage accounting for policy rules.
+
+Matched requests only need ``match_count``/``last_matched_at`` bumped, so this
+never instantiates the model or runs the overlap validation that
+``PolicyProxyRule.full_clean`` does for admin/UI edits and CSV imports.
+
+Increments are buffered in memory per worker, keyed by rule id, and applied
+in one ``UPDATE ... CASE`` statement by a background flusher every
+``POLICY_USAGE_FLUSH_INTERVAL`` seconds, whenever
+``POLICY_USAGE_FLUSH_MAX_PENDING`` increments are waiting, and at shutdown.
+Counts are added to the stored value (``F()``), so concurrent workers never
+overwrite each other. An interval of 0 writes every match straight through.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5.0  # seconds
+DEFAULT_FLUSH_MAX_PENDING = 1000
+FLUSH_BATCH_SIZE = 500  # rule ids per UPDATE statement
+
+_pending = {}  # rule_id -> [count, last_matched_at]
+_pending_total = 0
+_lock = threading.Lock()
+_flusher = None
+_flusher_pid = None
+_stop = threading.Event()
+
+
+def _flush_interval():
+    return getattr(settings, "POLICY_USAGE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+
+
+def record_match(rule_id, when=None):
+    """Count a match for ``rule_id``; buffered unless the interval is 0."""
+    global _pending_total
+
+    when = when or timezone.now()
+    interval = _flush_interval()
+    if interval <= 0:
+        _apply({rule_id: [1, when]})
+        return
+
+    _ensure_flusher(interval)
+    with _lock:
+        entry = _pending.get(rule_id)
+        if entry is None:
+            _pending[rule_id] = [1, when]
+        else:
+            entry[0] += 1
+            entry[1] = max(entry[1], when)
+        _pending_total += 1
+        full = _pending_total >= getattr(
+            settings, "POLICY_USAGE_FLUSH_MAX_PENDING", DEFAULT_FLUSH_MAX_PENDING
+        )
+
+    if full:
+        flush()
+
+
+async def arecord_match(rule_id, when=None):
+    """Async record_match; only the write-through and count-triggered paths touch the DB."""
+    interval = _flush_interval()
+    limit = getattr(settings, "POLICY_USAGE_FLUSH_MAX_PENDING", DEFAULT_FLUSH_MAX_PENDING)
+    if interval <= 0 or _pending_total + 1 >= limit:
+        await sync_to_async(record_match)(rule_id, when)
+    else:
+        record_match(rule_id, when)
+
+
+def pending():
+    """Return a copy of the buffered increments as {rule_id: count}."""
+    with _lock:
+        return {rule_id: entry[0] for rule_id, entry in _pending.items()}
+
+
+def flush():
+    """Write all buffered increments to the database. Returns rules updated."""
+    global _pending, _pending_total
+
+    with _lock:
+        batch, _pending, _pending_total = _pending, {}, 0
+    if not batch:
+        return 0
+
+    try:
+        _apply(batch)
+    except Exception:
+        logger.exception(f"Failed to flush usage counters for {len(batch)} rules; will retry")
+        _requeue(batch)
+        return 0
+    return len(batch)
+
+
+def reset():
+    """Stop the flusher and drop buffered increments (tests, forked workers)."""
+    global _pending, _pending_total, _flusher, _flusher_pid
+
+    _stop.set()
+    if _flusher is not None and _flusher.is_alive() and _flusher is not threading.current_thread():
+        _flusher.join(timeout=1.0)
+    with _lock:
+        _pending, _pending_total = {}, 0
+    _flusher = None
+    _flusher_pid = None
+    _stop.clear()
+
+
+# -----------------------------
+# Internals
+# -----------------------------
+def _apply(batch):
+    from .models import PolicyProxyRule
+
+    items = list(batch.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        chunk = items[start:start + FLUSH_BATCH_SIZE]
+        PolicyProxyRule.objects.filter(pk__in=[rule_id for rule_id, _ in chunk]).update(
+            match_count=F("match_count") + Case(
+                *[When(pk=rule_id, then=Value(count)) for rule_id, (count, _) in chunk],
+                default=Value(0),
+                output_field=PositiveIntegerField(),
+            ),
+            last_matched_at=Case(
+                *[When(pk=rule_id, then=Value(ts)) for rule_id, (_, ts) in chunk],
+                default=F("last_matched_at"),
+                output_field=DateTimeField(),
+            ),
+        )
+
+
+def _requeue(batch):
+    global _pending_total
+
+    with _lock:
+        for rule_id, (count, ts) in batch.items():
+            entry = _pending.get(rule_id)
+            if entry is None:
+                _pending[rule_id] = [count, ts]
+            else:
+                entry[0] += count
+                entry[1] = max(entry[1], ts)
+            _pending_total += count
+
+
+def _ensure_flusher(interval):
+    """Start the background flusher once per process (and again after fork)."""
+    global _flusher, _flusher_pid, _pending, _pending_total
+
+    pid = os.getpid()
+    if _flusher_pid == pid and _flusher is not None and _flusher.is_alive():
+        return
+
+    with _lock:
+        if _flusher_pid == pid and _flusher is not None and _flusher.is_alive():
+            return
+        if _flusher_pid is not None and _flusher_pid != pid:
+            # Forked from a parent that had already buffered: its counts are
+            # the parent's to flush, not ours.
+            _pending, _pending_total = {}, 0
+        _flusher = threading.Thread(
+            target=_run_flusher, args=(interval,), name="policy-usage-flusher", daemon=True
+        )
+        _flusher_pid = pid
+        _flusher.start()
+
+
+def _run_flusher(interval):
+    while not _stop.wait(interval):
+        close_old_connections()
+        try:
+            flush()
+        finally:
+            close_old_connections()
+
+
+@atexit.register
+def _flush_at_exit():
+    _stop.set()
+    if _flusher_pid == os.getpid():
+        flush()
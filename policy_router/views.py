@@ -5,8 +5,10 @@ import csv
 import io
 import base64
 import logging
+import time
 from collections import defaultdict
 from datetime import datetime
+from urllib.parse import urlencode
 from django.conf import settings
 from django.http import JsonResponse, HttpResponseNotAllowed
 from django.shortcuts import render, redirect, get_object_or_404, render
@@ -14,27 +16,41 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods, require_POST
 from django.urls import reverse
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils.dateparse import parse_datetime
 from django.utils import timezone
-from .models import PolicyProxyRule, PolicyRequestLog
+from django.utils.crypto import constant_time_compare
+from .models import PolicyProxyRule, PolicyRequestLog, UpstreamHealth
 from .forms import PolicyProxyRuleForm
+from . import log_export
+from . import log_pagination
+from . import log_sink
+from .log_sink import get_log_sink
+from .rule_table import FALLBACK_RESPONSES, aget_rule_table, bump_rule_table_version, get_rule_table
+from . import upstream as upstream_pool
+from . import balancer
+from . import health
+from . import hedging
+from . import metrics
+from . import response_cache
+from . import single_flight
+from .circuit_breaker import CircuitOpenError
+from .deadline import Deadline, DeadlineExceeded
+from . import usage
 from django.views.decorators.csrf import csrf_exempt
-from policy_router.auth import basic_auth_django_user
-from django.contrib.auth import authenticate
-from django.http import HttpResponse, JsonResponse
+from policy_router.auth import acached_authenticate, basic_auth_django_user, cached_authenticate
+from asgiref.sync import iscoroutinefunction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils.encoding import smart_str
 from django.db import transaction
 
 # Setup console logging
 logger = logging.getLogger(__name__)
 
-def _increment_rule_usage(rule: PolicyProxyRule):
-    """Increment usage metrics for a rule."""
-    rule.match_count = (rule.match_count or 0) + 1
-    rule.last_matched_at = timezone.now()
-    rule.save(update_fields=["match_count", "last_matched_at"])
+def _increment_rule_usage(rule):
+    """Increment usage metrics for a (compiled) rule, skipping model validation."""
+    usage.record_match(rule.id)
 
 def _get_client_ip(request):
     if (client_ip := request.headers.get("X-Client-Ip")): return client_ip # Return Azure X header as client IP, if exists
@@ -53,48 +69,103 @@ def _build_safe_headers(request):
         if k.lower() not in {"host", "connection", "content-length", "accept-encoding"}
     }
 
+def _caller_identity(request):
+    """Credentials forwarded upstream with the request; part of cache and coalescing keys."""
+    return request.META.get("HTTP_AUTHORIZATION")
+
 def maybe_protected(view_func):
     if settings.ENABLE_WEB_AUTH:
         return login_required(view_func)
     return view_func
 
+def _basic_auth_challenge(message):
+    response = HttpResponse(message, status=401)
+    response["WWW-Authenticate"] = 'Basic realm="Policy API"'
+    return response
+
+def _basic_auth_credentials(request):
+    """Return (username, password) from the Authorization header, or an error response."""
+    auth_header = request.META.get("HTTP_AUTHORIZATION")
+    if not auth_header or not auth_header.lower().startswith("basic "):
+        return _basic_auth_challenge("Unauthorized")
+
+    try:
+        encoded = auth_header.split(" ")[1]
+        decoded = base64.b64decode(encoded).decode("utf-8")
+        username, password = decoded.split(":", 1)
+    except Exception:
+        return HttpResponse("Invalid authentication header", status=400)
+    return username, password
+
 def maybe_basic_auth_protected(view_func):
-    """Enforce HTTP Basic Auth on policy endpoints if enabled."""
+    """Enforce HTTP Basic Auth on policy endpoints if enabled (sync or async views)."""
     from functools import wraps
 
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _awrapped(request, *args, **kwargs):
+            request.policy_started_at = time.monotonic()  # the request deadline counts from here
+            if not getattr(settings, "ENABLE_POLICY_AUTH", False):
+                return await view_func(request, *args, **kwargs)
+
+            credentials = _basic_auth_credentials(request)
+            if isinstance(credentials, HttpResponse):
+                return credentials
+
+            username, password = credentials
+            user = await acached_authenticate(request.META["HTTP_AUTHORIZATION"], username, password)
+            if user is None:
+                return _basic_auth_challenge("Invalid credentials")
+
+            request.user = user
+            return await view_func(request, *args, **kwargs)
+
+        return _awrapped
+
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
+        request.policy_started_at = time.monotonic()  # the request deadline counts from here
         if not getattr(settings, "ENABLE_POLICY_AUTH", False):
             return view_func(request, *args, **kwargs)
 
-        auth_header = request.META.get("HTTP_AUTHORIZATION")
-        if not auth_header or not auth_header.lower().startswith("basic "):
-            response = HttpResponse("Unauthorized", status=401)
-            response["WWW-Authenticate"] = 'Basic realm="Policy API"'
-            return response
+        credentials = _basic_auth_credentials(request)
+        if isinstance(credentials, HttpResponse):
+            return credentials
 
-        try:
-            encoded = auth_header.split(" ")[1]
-            decoded = base64.b64decode(encoded).decode("utf-8")
-            username, password = decoded.split(":", 1)
-        except Exception:
-            return HttpResponse("Invalid authentication header", status=400)
-
-        user = authenticate(username=username, password=password)
+        username, password = credentials
+        user = cached_authenticate(request.META["HTTP_AUTHORIZATION"], username, password)
         if user is None:
-            response = HttpResponse("Invalid credentials", status=401)
-            response["WWW-Authenticate"] = 'Basic realm="Policy API"'
-            return response
+            return _basic_auth_challenge("Invalid credentials")
 
         request.user = user
         return view_func(request, *args, **kwargs)
 
     return _wrapped
 
+def _truncate_body(text):
+    limit = getattr(settings, "POLICY_LOG_MAX_BODY_CHARS", 4096)
+    if isinstance(text, bytes):
+        if limit and len(text) > limit:
+            # A multi-byte character cut in half is dropped
+            return text[:limit].decode("utf-8", "ignore") + "…[truncated]"
+        return text.decode("utf-8", "replace")
+    if text and limit and len(text) > limit:
+        return text[:limit] + "…[truncated]"
+    return text
+
 def _log_request(rule, request, response=None, is_override=False, override_response=None):
-    """Log inbound policy requests to DB"""
-    from .models import PolicyRequestLog
+    """Hand a compact record of an inbound policy request to the log sink.
 
+    The sink (see policy_router.log_sink) decides when the row reaches the
+    DB; by default the INSERT happens on a writer thread, off the request path.
+    """
+    get_log_sink().emit(_log_record(rule, request, response, is_override, override_response))
+
+async def _alog_request(rule, request, response=None, is_override=False, override_response=None):
+    """Async variant of _log_request; only hops to a thread if the sink may block."""
+    await log_sink.aemit(_log_record(rule, request, response, is_override, override_response))
+
+def _log_record(rule, request, response=None, is_override=False, override_response=None):
     client_ip = _get_client_ip(request)
     host = request.META.get("HTTP_HOST", "")
     source_host = client_ip or host or None
@@ -102,51 +173,54 @@ def _log_request(rule, request, response=None, is_override=False, override_respo
     # Capture request params for GET requests
     req_params = request.GET.dict() if request.method == "GET" else {}
     if is_override:
-        resp_content = override_response 
+        # Compiled rules pass their pre-encoded body text
+        resp_content = (
+            override_response if isinstance(override_response, str) else json.dumps(override_response)
+        )
     elif response is not None:
-        try:
-            resp_content = response.json()
-        except Exception:
-            resp_content = {"raw": getattr(response, "text", "")} 
+        # Raw upstream bytes; _truncate_body decodes only what the log keeps
+        resp_content = getattr(response, "content", b"")
     else:
         resp_content = None
 
-    return PolicyRequestLog.objects.create(
-        rule=rule,
-        request_path=request.path,
-        request_method=request.method,
-        request_params=req_params,
-        response_body=resp_content,
-        response_status=getattr(response, "status_code", 200),
-        is_override=is_override,
-        source_host=source_host,
-    )
+    return {
+        "rule_id": rule.id if rule else None,
+        "request_path": request.path,
+        "request_method": request.method,
+        "request_params": req_params,
+        "response_body": _truncate_body(resp_content),
+        "response_status": getattr(response, "status_code", 200),
+        "is_override": is_override,
+        "source_host": source_host,
+        "created_at": timezone.now(),
+        **PolicyRequestLog.structured_fields(req_params),
+    }
 
 
 @maybe_protected
 @require_http_methods(["GET"])
-def export_logs_txt(request):
+def export_logs(request):
     """
-    Export PolicyRequestLog entries to a plain .log text file.
-    Each line includes timestamp, rule, method, path, status, and source host.
+    Stream the PolicyRequestLog entries matching the log list filters.
+    ``format`` is txt (one line per request), csv or ndjson; ``gzip=1``
+    compresses the download.
     """
-    response = HttpResponse(content_type="text/plain; charset=utf-8")
-    response["Content-Disposition"] = 'attachment; filename="policy_logs.log"'
-
-    logs = PolicyRequestLog.objects.select_related("rule").order_by("-created_at")
-
-    for log in logs:
-        rule_name = log.rule.name if log.rule else "N/A"
-        line = (
-            f"[{log.created_at.strftime('%Y-%m-%d %H:%M:%S')}] "
-            f"{log.request_method} {log.request_path} "
-            f"({rule_name}) "
-            f"status={log.response_status} "
-            f"override={log.is_override} "
-            f"source={log.source_host or 'unknown'}\n"
-        )
-        response.write(line)
-
+    fmt = request.GET.get("format", "txt")
+    if fmt not in log_export.FORMATS:
+        return HttpResponse(f"Unknown export format {fmt!r}", status=400)
+    gzip = request.GET.get("gzip") in ("1", "true", "on")
+
+    logs, _ = _filter_logs(request.GET)
+    blocks = log_export.stream(logs, fmt, gzip=gzip)
+    if isinstance(request, ASGIRequest):
+        blocks = log_export.astream(blocks)
+
+    content_type, extension = log_export.FORMATS[fmt]
+    filename = f"policy_logs.{extension}"
+    if gzip:
+        content_type, filename = "application/gzip", f"{filename}.gz"
+    response = StreamingHttpResponse(blocks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response
 
 # -----------------------------
@@ -181,6 +255,16 @@ def export_rules_csv(request):
         "override_service_response",
         "always_continue_participant",
         "override_participant_response",
+        "upstream_connect_timeout",
+        "upstream_read_timeout",
+        "upstream_deadline",
+        "service_additional_urls",
+        "participant_additional_urls",
+        "upstream_strategy",
+        "upstream_hedge_percentile",
+        "upstream_fallback",
+        "upstream_cache_ttl",
+        "upstream_cache_key_params",
     ])
 
     for rule in PolicyProxyRule.objects.all().order_by("priority"):
@@ -200,6 +284,16 @@ def export_rules_csv(request):
             json.dumps(rule.override_service_response or {}),
             smart_str(rule.always_continue_participant),
             json.dumps(rule.override_participant_response or {}),
+            smart_str(rule.upstream_connect_timeout if rule.upstream_connect_timeout is not None else ""),
+            smart_str(rule.upstream_read_timeout if rule.upstream_read_timeout is not None else ""),
+            smart_str(rule.upstream_deadline if rule.upstream_deadline is not None else ""),
+            json.dumps(rule.service_additional_urls or []),
+            json.dumps(rule.participant_additional_urls or []),
+            smart_str(rule.upstream_strategy),
+            smart_str(rule.upstream_hedge_percentile if rule.upstream_hedge_percentile is not None else ""),
+            smart_str(rule.upstream_fallback),
+            smart_str(rule.upstream_cache_ttl if rule.upstream_cache_ttl is not None else ""),
+            smart_str(rule.upstream_cache_key_params or ""),
         ])
 
     return response
@@ -254,6 +348,9 @@ def import_rules_csv(request):
                 except Exception:
                     return default
 
+            def parse_float(v):
+                return float(v) if v not in (None, "") else None
+
             try:
                 protocols = parse_json(row.get("protocols"), [])
                 call_dirs = parse_json(row.get("call_directions"), [])
@@ -275,6 +372,18 @@ def import_rules_csv(request):
                     "override_service_response": override_service,
                     "always_continue_participant": str(row.get("always_continue_participant","False")).lower() in ("true","1","yes"),
                     "override_participant_response": override_part,
+                    "upstream_connect_timeout": parse_float(row.get("upstream_connect_timeout")),
+                    "upstream_read_timeout": parse_float(row.get("upstream_read_timeout")),
+                    "upstream_deadline": parse_float(row.get("upstream_deadline")),
+                    "service_additional_urls": parse_json(row.get("service_additional_urls"), []),
+                    "participant_additional_urls": parse_json(row.get("participant_additional_urls"), []),
+                    "upstream_strategy": row.get("upstream_strategy") or "failover",
+                    "upstream_hedge_percentile": (
+                        int(row["upstream_hedge_percentile"]) if row.get("upstream_hedge_percentile") else None
+                    ),
+                    "upstream_fallback": row.get("upstream_fallback") or "error",
+                    "upstream_cache_ttl": int(row["upstream_cache_ttl"]) if row.get("upstream_cache_ttl") else None,
+                    "upstream_cache_key_params": row.get("upstream_cache_key_params") or None,
                 }
 
                 obj, created_flag = PolicyProxyRule.objects.update_or_create(name=name, defaults=defaults)
@@ -403,191 +512,310 @@ def rule_tester(request):
 # -----------------------------
 # Policy Views
 # -----------------------------
-@csrf_exempt
-@maybe_basic_auth_protected
-def proxy_service_policy(request):
-    """Proxy for /policy/v1/service/configuration (always GET)."""
-    logger.info("Received a service/configuration request")
-    logger.debug(f"Incoming headers: {request.headers._store} ")    
+POLICY_PATHS = {
+    "service": "service/configuration",
+    "participant": "participant/properties",
+}
 
-    if request.method != "GET":
-        return HttpResponseNotAllowed(["GET"])
-
-    local_alias = request.GET.get("local_alias")
-    req_protocol = request.GET.get("protocol")
-    req_call_direction = request.GET.get("call_direction")
+def _policy_request_attrs(request):
+    """Extract the attributes rules are matched on."""
     client_ip = _get_client_ip(request)
     logger.debug(f"client_ip is: {client_ip}")
-    client_host = request.META.get("HTTP_HOST", "").split(":")[0].lower() if request.META.get("HTTP_HOST") else None
+    http_host = request.META.get("HTTP_HOST")
+    client_host = http_host.split(":")[0].lower() if http_host else None
     logger.debug(f"HTTP host is: {client_host}")
-    
-    rules = PolicyProxyRule.objects.filter(is_active=True).order_by("priority", "-updated_at")
+    return {
+        "local_alias": request.GET.get("local_alias"),
+        "protocol": request.GET.get("protocol"),
+        "call_direction": request.GET.get("call_direction"),
+        "client_ip": client_ip,
+        "client_host": client_host,
+    }
 
-    for rule in rules:
+class PreEncodedJsonResponse(JsonResponse):
+    """JsonResponse for a body that is already JSON-encoded (override rules)."""
+
+    def __init__(self, static, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        # Skip JsonResponse's json.dumps(); the compiled rule holds the bytes.
+        HttpResponse.__init__(self, content=static.body, **kwargs)
+        self["Content-Length"] = static.content_length
+
+def _relay_upstream(resp):
+    """Return the upstream body bytes to Pexip as-is (no decode / re-encode).
+
+    With POLICY_UPSTREAM_VALIDATE_JSON on, a body that isn't valid JSON is
+    wrapped as {"raw": ...} instead, as the proxy always used to do.
+    """
+    logger.info(f"Upstream returned status code {resp.status_code}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Response content: {resp.content}")
+
+    if getattr(settings, "POLICY_UPSTREAM_VALIDATE_JSON", False):
         try:
-            # Match alias first
-            if not re.search(rule.regex, local_alias or ""):
-                continue
+            json.loads(resp.content)
+        except ValueError:
+            return JsonResponse({"raw": resp.text}, status=resp.status_code)
 
-            # Match protocol and call_direction
-            if rule.protocols and req_protocol and req_protocol not in rule.protocols:
-                continue
-            if rule.call_directions and req_call_direction and req_call_direction not in rule.call_directions:
-                continue
+    response = HttpResponse(
+        resp.content,
+        status=resp.status_code,
+        content_type=resp.headers.get("content-type", "application/json"),
+    )
+    response["Content-Length"] = str(len(resp.content))
+    return response
 
-            # Match source IP/host (NEW: safely skip instead of blocking)
-            if rule.source_match:
-                src = rule.source_match.strip().lower()
-                if not (
-                    client_ip == src
-                    or client_host == src
-                    or (src in (client_ip or ""))
-                    or (src in (client_host or ""))
-                ):
-                    continue  # Only skip, do NOT break/return
-
-            # --- Reached this point: full match ---
-            _increment_rule_usage(rule)
-
-            # --- Override check ---
-            if rule.always_continue_service:
-                response_json = rule.override_service_response or {
-                    "status": "success",
-                    "action": "continue",
-                }
-                logger.info(f"Rule is an override, returning: {response_json}")
-                _log_request(rule, request, None, is_override=True, override_response=response_json)
-                return JsonResponse(response_json)
-
-            # --- Upstream proxy ---
-            if rule.service_target_url:
-                upstream = rule.service_target_url.rstrip("/")
-                logger.info(f"Sending to upstream URL: {upstream}")
-                try:
-                    resp = httpx.get(
-                        upstream + request.path,
-                        params=request.GET,
-                        headers=_build_safe_headers(request),
-                        auth=(
-                            (rule.basic_auth_username, rule.basic_auth_password)
-                            if rule.basic_auth_username and rule.basic_auth_password
-                            else None
-                        ),
-                        timeout=10.0,
-                    )
-                    _log_request(rule, request, resp)
-
-                    try:
-                        logger.info(f"Upstream returned status code {resp.status_code}")
-                        logger.debug(f"Response content: {resp.content}")
-                        return JsonResponse(resp.json(), status=resp.status_code)
-
-                    except ValueError:
-                        return JsonResponse({"raw": resp.text}, status=resp.status_code)
-
-                except httpx.RequestError as e:
-                    return JsonResponse({"error": f"Upstream request failed: {e}"}, status=502)
-
-        except re.error as e:
-            logger.error(f"Regex error in rule {rule.name}: {e}")
+def _fetch_upstream(rule, kind, request, deadline):
+    """Call the rule's upstream targets in balancer order until one answers."""
+    def call(target):
+        logger.info(f"Sending to upstream URL: {target}")
+        try:
+            with balancer.track(target):
+                resp = upstream_pool.get(
+                    rule,
+                    target + request.path,
+                    params=request.GET,
+                    headers=_build_safe_headers(request),
+                    deadline=deadline,
+                )
+        except BaseException as e:
+            metrics.upstream_result(target, error=e)
+            raise
+        metrics.upstream_result(target, resp.status_code)
+        return resp
+
+    targets = balancer.order(rule, kind)
+    if rule.hedge_percentile:
+        resp = hedging.fetch(rule, targets, call, deadline)
+        response_cache.store(rule, kind, request.GET, resp, _caller_identity(request))
+        return resp
+
+    error = None
+    for target in targets:
+        deadline.check()
+        try:
+            resp = call(target)
+        except (httpx.RequestError, CircuitOpenError) as e:
+            logger.warning(f"Upstream {target} failed: {e}")
+            error = e
             continue
+        response_cache.store(rule, kind, request.GET, resp, _caller_identity(request))
+        return resp
+    raise error
+
+async def _afetch_upstream(rule, kind, request, deadline):
+    """Async _fetch_upstream."""
+    async def call(target):
+        logger.info(f"Sending to upstream URL: {target}")
+        try:
+            with balancer.track(target):
+                resp = await upstream_pool.aget(
+                    rule,
+                    target + request.path,
+                    params=request.GET,
+                    headers=_build_safe_headers(request),
+                    deadline=deadline,
+                )
+        except BaseException as e:
+            metrics.upstream_result(target, error=e)
+            raise
+        metrics.upstream_result(target, resp.status_code)
+        return resp
+
+    targets = balancer.order(rule, kind)
+    if rule.hedge_percentile:
+        resp = await hedging.afetch(rule, targets, call, deadline)
+        response_cache.store(rule, kind, request.GET, resp, _caller_identity(request))
+        return resp
+
+    error = None
+    for target in targets:
+        deadline.check()
+        try:
+            resp = await call(target)
+        except (httpx.RequestError, CircuitOpenError) as e:
+            logger.warning(f"Upstream {target} failed: {e}")
+            error = e
+            continue
+        response_cache.store(rule, kind, request.GET, resp, _caller_identity(request))
+        return resp
+    raise error
+
+def _upstream_unavailable(rule, error):
+    """Log that no upstream target answered; return the rule's fallback answer, if any."""
+    logger.warning(f"No upstream available for rule {rule.name} (fallback: {rule.fallback}): {error}")
+    return FALLBACK_RESPONSES.get(rule.fallback)
 
+def _upstream_error(error):
+    """502 (or 504 when the request deadline ran out) for rules without a fallback answer."""
+    status = 504 if isinstance(error, DeadlineExceeded) else 502
+    return JsonResponse({"error": f"Upstream request failed: {error}"}, status=status)
+
+def _no_matching_rule():
     # Only reached if no matching rule after full loop
     logger.warning("No matching rule, returning 404")
     return JsonResponse({"error": "No matching rule"}, status=404)
 
+def _proxy_policy(request, kind):
+    """Match the request against the compiled rules and answer or proxy it."""
+    logger.info(f"Received a {POLICY_PATHS[kind]} request")
+    logger.debug(f"Incoming headers: {request.headers._store} ")
+
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    health.ensure_checker()  # background upstream probes, started by the first request
+    request_deadline = Deadline.for_request(request)
+    timer = metrics.RequestTimer(kind, request)
+    attrs = _policy_request_attrs(request)
+    # Alias, protocol, call_direction and source filters are applied by the
+    # compiled rule table; a rule without an override or target falls through.
+    for rule in get_rule_table().match(**attrs):
+        # --- Reached this point: full match ---
+        _increment_rule_usage(rule)
+
+        # --- Override check ---
+        static = rule.override_for(kind)
+        if static is not None:
+            logger.info(f"Rule is an override, returning: {static.text}")
+            with timer.phase("log"):
+                _log_request(rule, request, None, is_override=True, override_response=static.text)
+            return timer.finish(PreEncodedJsonResponse(static), "override", attrs, rule)
+
+        # --- Upstream proxy ---
+        if rule.target_urls(kind):
+            resp = response_cache.lookup(rule, kind, request.GET, _caller_identity(request))
+            if resp is not None:
+                logger.info(f"Using cached upstream response for rule {rule.name}")
+            else:
+                deadline = request_deadline.for_rule(rule)
+                try:
+                    # Concurrent identical requests share one upstream call
+                    with timer.phase("upstream"):
+                        resp = single_flight.do(
+                            single_flight.key_for(rule, kind, request.GET, _caller_identity(request)),
+                            lambda: _fetch_upstream(rule, kind, request, deadline),
+                            deadline,
+                        )
+                except (httpx.RequestError, CircuitOpenError) as e:
+                    static = _upstream_unavailable(rule, e)
+                    # Later rules would only hit the same spent deadline
+                    if rule.fallback == "next" and not isinstance(e, DeadlineExceeded):
+                        continue
+                    if static is None:
+                        return timer.finish(_upstream_error(e), "error", attrs, rule)
+                    with timer.phase("log"):
+                        _log_request(rule, request, None, is_override=True, override_response=static.text)
+                    return timer.finish(PreEncodedJsonResponse(static), "fallback", attrs, rule)
+            with timer.phase("log"):
+                _log_request(rule, request, resp)
+            return timer.finish(_relay_upstream(resp), "proxy", attrs, rule)
+
+    return timer.finish(_no_matching_rule(), "no_match", attrs)
+
+async def _aproxy_policy(request, kind):
+    """Async twin of _proxy_policy: never holds a thread while upstream is slow."""
+    logger.info(f"Received a {POLICY_PATHS[kind]} request")
+    logger.debug(f"Incoming headers: {request.headers._store} ")
+
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    health.ensure_checker()  # background upstream probes, started by the first request
+    request_deadline = Deadline.for_request(request)
+    timer = metrics.RequestTimer(kind, request)
+    attrs = _policy_request_attrs(request)
+    table = await aget_rule_table()
+    for rule in table.match(**attrs):
+        # --- Reached this point: full match ---
+        await usage.arecord_match(rule.id)
+
+        # --- Override check ---
+        static = rule.override_for(kind)
+        if static is not None:
+            logger.info(f"Rule is an override, returning: {static.text}")
+            with timer.phase("log"):
+                await _alog_request(rule, request, None, is_override=True, override_response=static.text)
+            return timer.finish(PreEncodedJsonResponse(static), "override", attrs, rule)
+
+        # --- Upstream proxy ---
+        if rule.target_urls(kind):
+            resp = response_cache.lookup(rule, kind, request.GET, _caller_identity(request))
+            if resp is not None:
+                logger.info(f"Using cached upstream response for rule {rule.name}")
+            else:
+                deadline = request_deadline.for_rule(rule)
+                try:
+                    with timer.phase("upstream"):
+                        resp = await single_flight.ado(
+                            single_flight.key_for(rule, kind, request.GET, _caller_identity(request)),
+                            lambda: _afetch_upstream(rule, kind, request, deadline),
+                            deadline,
+                        )
+                except (httpx.RequestError, CircuitOpenError) as e:
+                    static = _upstream_unavailable(rule, e)
+                    # Later rules would only hit the same spent deadline
+                    if rule.fallback == "next" and not isinstance(e, DeadlineExceeded):
+                        continue
+                    if static is None:
+                        return timer.finish(_upstream_error(e), "error", attrs, rule)
+                    with timer.phase("log"):
+                        await _alog_request(rule, request, None, is_override=True, override_response=static.text)
+                    return timer.finish(PreEncodedJsonResponse(static), "fallback", attrs, rule)
+            with timer.phase("log"):
+                await _alog_request(rule, request, resp)
+            return timer.finish(_relay_upstream(resp), "proxy", attrs, rule)
+
+    return timer.finish(_no_matching_rule(), "no_match", attrs)
+
+
+@csrf_exempt
+@maybe_basic_auth_protected
+def proxy_service_policy(request):
+    """Proxy for /policy/v1/service/configuration (always GET)."""
+    return _proxy_policy(request, "service")
+
 
 @csrf_exempt
 @maybe_basic_auth_protected
 def proxy_participant_policy(request):
     """Proxy for /policy/v1/participant/properties (always GET)."""
-    logger.info("Received a participant/properties request")
-    logger.debug(f"Incoming headers: {request.headers._store} ")
+    return _proxy_policy(request, "participant")
 
-    if request.method != "GET":
-        return HttpResponseNotAllowed(["GET"])
 
-    local_alias = request.GET.get("local_alias")
-    req_protocol = request.GET.get("protocol")
-    req_call_direction = request.GET.get("call_direction")
-    client_ip = _get_client_ip(request)
-    logger.debug(f"client_ip is: {client_ip}")
-    client_host = request.get_host().split(":")[0] if "HTTP_HOST" in request.META else None
-    logger.debug(f"HTTP host is: {client_host}")
-    
-    rules = PolicyProxyRule.objects.filter(is_active=True).order_by("priority", "-updated_at")
+@csrf_exempt
+@maybe_basic_auth_protected
+async def proxy_service_policy_async(request):
+    """Async proxy for /policy/v1/service/configuration (POLICY_ASYNC_VIEWS)."""
+    return await _aproxy_policy(request, "service")
 
-    for rule in rules:
-        try:
-            # Match alias first
-            if not re.search(rule.regex, local_alias or ""):
-                continue
 
-            # Match protocol and call_direction
-            if rule.protocols and req_protocol and req_protocol not in rule.protocols:
-                continue
-            if rule.call_directions and req_call_direction and req_call_direction not in rule.call_directions:
-                continue
+@csrf_exempt
+@maybe_basic_auth_protected
+async def proxy_participant_policy_async(request):
+    """Async proxy for /policy/v1/participant/properties (POLICY_ASYNC_VIEWS)."""
+    return await _aproxy_policy(request, "participant")
 
-            # Match source IP/host (NEW)
-            if rule.source_match:
-                src = rule.source_match.strip().lower()
-                if not (
-                    client_ip == src
-                    or client_host == src
-                    or (src in (client_ip or ""))
-                    or (src in (client_host or ""))
-                ):
-                    continue  # Skip gracefully
-
-            # --- Reached this point: full match ---
-            _increment_rule_usage(rule)
-
-            # --- Override check ---
-            if rule.always_continue_participant:
-                response_json = rule.override_participant_response or {
-                    "status": "success",
-                    "action": "continue",
-                }
-                logger.info(f"Rule is an override, returning: {response_json}")
-                _log_request(rule, request, None, is_override=True, override_response=response_json)
-                return JsonResponse(response_json)
-
-            # --- Upstream proxy ---
-            if rule.participant_target_url:
-                upstream = rule.participant_target_url.rstrip("/")
-                logger.info(f"Sending to upstream URL: {upstream}")
-                try:
-                    resp = httpx.get(
-                        upstream + request.path,
-                        params=request.GET,
-                        headers=_build_safe_headers(request),
-                        auth=(
-                            (rule.basic_auth_username, rule.basic_auth_password)
-                            if rule.basic_auth_username and rule.basic_auth_password
-                            else None
-                        ),
-                        timeout=10.0,
-                    )
-                    _log_request(rule, request, resp)
-
-                    try:
-                        logger.info(f"Upstream returned status code {resp.status_code}")
-                        logger.debug(f"Response content: {resp.content}")
-                        return JsonResponse(resp.json(), status=resp.status_code)
-
-                    except ValueError:
-                        return JsonResponse({"raw": resp.text}, status=resp.status_code)
-
-                except httpx.RequestError as e:
-                    return JsonResponse({"error": f"Upstream request failed: {e}"}, status=502)
-
-        except re.error as e:
-            logger.error(f"Regex error in rule {rule.name}: {e}")
-            continue
 
-    logger.warning("No matching rule, returning 404")
-    return JsonResponse({"error": "No matching rule"}, status=404)
+def _metrics_allowed(request):
+    """A scraper with the POLICY_METRICS_TOKEN bearer token, or a web UI user."""
+    token = getattr(settings, "POLICY_METRICS_TOKEN", None)
+    auth_header = request.META.get("HTTP_AUTHORIZATION", "")
+    if token and auth_header.lower().startswith("bearer "):
+        return constant_time_compare(auth_header[7:].strip(), token)
+    return not settings.ENABLE_WEB_AUTH or request.user.is_authenticated
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus metrics for the policy endpoints (every worker with POLICY_METRICS_DIR)."""
+    if not metrics.enabled():
+        return HttpResponse(status=404)
+    if not _metrics_allowed(request):
+        response = HttpResponse("Unauthorized", status=401)
+        response["WWW-Authenticate"] = 'Bearer realm="Policy metrics"'
+        return response
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 # -----------------------------
@@ -671,6 +899,15 @@ def rule_list(request):
                     duplicate_map.setdefault(r2.id, set()).add(r1.name)
                     break
 
+    # --- Upstream health (latest active check per origin) ---
+    health_by_origin = {h.origin: h for h in UpstreamHealth.objects.all()}
+    for rule in rules:
+        for kind in ("service", "participant"):
+            targets = [getattr(rule, f"{kind}_target_url")] + list(getattr(rule, f"{kind}_additional_urls") or [])
+            setattr(rule, f"{kind}_targets", [
+                (url, health_by_origin.get(upstream_pool.origin_of(url))) for url in targets if url
+            ])
+
     return render(request, "policy_router/rule_list.html", {
         "rules": rules,
         "protocol_choices": PolicyProxyRule.PROTOCOL_CHOICES,
@@ -773,6 +1010,7 @@ def reorder_rules(request):
         new_order = data.get("order", [])
         for i, rule_id in enumerate(new_order, start=1):
             PolicyProxyRule.objects.filter(id=rule_id).update(priority=i)
+        bump_rule_table_version()  # queryset.update() sends no signals
         return JsonResponse({"status": "ok", "message": "Rules reordered"})
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=400)
@@ -793,6 +1031,7 @@ def rule_reorder(request):
         with transaction.atomic():
             for index, rule_id in enumerate(order):
                 PolicyProxyRule.objects.filter(id=rule_id).update(priority=index + 1)
+            bump_rule_table_version()  # queryset.update() sends no signals
 
         return JsonResponse({"status": "ok", "refresh": True})
     except Exception as e:
@@ -848,22 +1087,22 @@ def rule_check_duplicates(request):
 # -----------------------------
 # Logs
 # -----------------------------
-@maybe_protected
-def log_list(request):
-    logs = PolicyRequestLog.objects.select_related("rule").order_by("-created_at")
+def _filter_logs(params):
+    """Apply the log list filters in ``params`` (a QueryDict); returns (queryset, filters)."""
+    logs = PolicyRequestLog.objects.select_related("rule").order_by("-created_at", "-pk")
 
-    local_alias = request.GET.get("local_alias")
-    rule_id = request.GET.get("rule")
-    start_datetime = request.GET.get("start_datetime")
-    end_datetime = request.GET.get("end_datetime")
-    source_host = request.GET.get("source_host")  # 👈 new filter
+    local_alias = params.get("local_alias")
+    rule_id = params.get("rule")
+    start_datetime = params.get("start_datetime")
+    end_datetime = params.get("end_datetime")
+    source_host = params.get("source_host")  # 👈 new filter
 
-    protocols = request.GET.getlist("protocols")
-    call_directions = request.GET.getlist("call_directions")
+    protocols = params.getlist("protocols")
+    call_directions = params.getlist("call_directions")
 
     # --- Apply filters ---
     if local_alias:
-        logs = logs.filter(request_path__icontains=local_alias)
+        logs = logs.filter(local_alias=local_alias.strip())
 
     if rule_id:
         logs = logs.filter(rule_id=rule_id)
@@ -880,6 +1119,8 @@ def log_list(request):
     if start_datetime:
         try:
             start_dt = datetime.fromisoformat(start_datetime)
+            if timezone.is_naive(start_dt):
+                start_dt = timezone.make_aware(start_dt)
             logs = logs.filter(created_at__gte=start_dt)
         except ValueError:
             pass
@@ -887,36 +1128,54 @@ def log_list(request):
     if end_datetime:
         try:
             end_dt = datetime.fromisoformat(end_datetime)
+            if timezone.is_naive(end_dt):
+                end_dt = timezone.make_aware(end_dt)
             logs = logs.filter(created_at__lte=end_dt)
         except ValueError:
             pass
 
-    # --- Distinct list of sources for dropdown ---
-    distinct_sources = (
-        PolicyRequestLog.objects.exclude(source_host__isnull=True)
-        .exclude(source_host__exact="")
-        .values_list("source_host", flat=True)
-        .distinct()
-        .order_by("source_host")
+    return logs, {
+        "local_alias": local_alias or "",
+        "rule": rule_id or "",
+        "protocols": protocols,
+        "call_directions": call_directions,
+        "start_datetime": start_datetime or "",
+        "end_datetime": end_datetime or "",
+        "source_host": source_host or "",  # 👈 added
+    }
+
+@maybe_protected
+def log_list(request):
+    logs, filters = _filter_logs(request.GET)
+
+    # --- Sources for the dropdown: from recent logs, not a scan of the whole table ---
+    distinct_sources = log_pagination.recent_sources(PolicyRequestLog)
+    if filters["source_host"] and filters["source_host"] not in distinct_sources:
+        distinct_sources = sorted([*distinct_sources, filters["source_host"]])
+
+    # Keyset pages: cost doesn't grow with how far back the page is
+    page_obj = log_pagination.paginate(
+        logs, after=request.GET.get("after"), before=request.GET.get("before")
     )
+    filter_query = request.GET.copy()
+    for name in ("after", "before", "page"):
+        filter_query.pop(name, None)
+    filter_query = filter_query.urlencode()
 
-    paginator = Paginator(logs, 50)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    def page_url(**cursor):
+        query = "&".join(part for part in (filter_query, urlencode(cursor)) if part)
+        return f"?{query}" if query else "?"
 
     return render(request, "policy_router/log_list.html", {
         "page_obj": page_obj,
+        "log_count": log_pagination.approximate_count(logs, filtered=any(filters.values())),
+        "newest_url": page_url() if page_obj.has_previous else None,
+        "previous_url": page_url(before=page_obj.previous_cursor) if page_obj.has_previous else None,
+        "next_url": page_url(after=page_obj.next_cursor) if page_obj.has_next else None,
         "rules": PolicyProxyRule.objects.all(),
         "protocol_choices": PolicyProxyRule.PROTOCOL_CHOICES,
         "call_direction_choices": PolicyProxyRule.CALL_DIRECTION_CHOICES,
         "distinct_sources": distinct_sources,  # 👈 added
-        "filters": {
-            "local_alias": local_alias or "",
-            "rule": rule_id or "",
-            "protocols": protocols,
-            "call_directions": call_directions,
-            "start_datetime": start_datetime or "",
-            "end_datetime": end_datetime or "",
-            "source_host": source_host or "",  # 👈 added
-        }
+        "filters": filters,
+        "filter_query": filter_query,  # export links download what is shown
     })
\ No newline at end of file